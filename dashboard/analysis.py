@@ -0,0 +1,258 @@
+"""
+Análisis vectorizado de los streams de una actividad con NumPy.
+
+Todo se calcula con ventanas deslizantes sobre sumas acumuladas y búsquedas
+binarias (`np.searchsorted`), sin bucles por muestra en Python:
+- mejores esfuerzos por distancia (400 m ... media maratón) y por duración,
+- tiempo en zonas de frecuencia cardiaca y de potencia,
+- potencia normalizada y desnivel positivo con la altitud suavizada.
+
+Los resultados se guardan por actividad en `ActivityAnalysis` (ver `get_analysis`)
+junto con la FC máxima y el FTP con los que se calcularon las zonas.
+"""
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .models import ActivityAnalysis, ActivityStream
+from .streams import load_streams
+
+# Sube al cambiar los cálculos: invalida los análisis guardados
+ANALYSIS_VERSION = 1
+
+BEST_EFFORT_DISTANCES = [
+    ('400m', 400.0),
+    ('1k', 1000.0),
+    ('5k', 5000.0),
+    ('10k', 10000.0),
+    ('Half-Marathon', 21097.5),
+]
+BEST_EFFORT_DURATIONS = [
+    ('5s', 5),
+    ('1min', 60),
+    ('5min', 300),
+    ('20min', 1200),
+    ('1h', 3600),
+]
+
+# Límites de zona como fracción de la FC máxima y del FTP
+HEARTRATE_ZONES = [0.0, 0.6, 0.7, 0.8, 0.9]
+POWER_ZONES = [0.0, 0.55, 0.75, 0.9, 1.05, 1.2, 1.5]
+
+# Pausas más largas que esto no cuentan como tiempo en zona
+MAX_SAMPLE_GAP = 10
+NORMALIZED_POWER_WINDOW = 30
+ELEVATION_SMOOTHING_WINDOW = 7
+
+
+def analyze_streams(streams, max_heartrate=None, ftp=None):
+    """Calcula todas las métricas de un dict `{canal: array}` de `load_streams`."""
+    time = streams.get('time')
+    if time is None or len(time) < 2:
+        return {}
+
+    time = time.astype(np.float64)
+    results = {}
+
+    distance = _samples(time, streams.get('distance'))
+    if distance is not None:
+        results['best_efforts'] = best_efforts_by_distance(*distance)
+
+    watts = streams.get('watts')
+    velocity = streams.get('velocity_smooth')
+    if _has_samples(watts):
+        watts_1hz = resample_1hz(time, watts)
+        results['best_power'] = best_average_by_duration(watts_1hz)
+        results['normalized_power'] = normalized_power(watts_1hz)
+        results['power_zones'] = time_in_zones(
+            time, watts, ftp or getattr(settings, 'STRAVA_FTP', 200), POWER_ZONES
+        )
+    if _has_samples(velocity):
+        results['best_speed'] = best_average_by_duration(resample_1hz(time, velocity))
+
+    heartrate = streams.get('heartrate')
+    if _has_samples(heartrate):
+        results['heartrate_zones'] = time_in_zones(
+            time, heartrate, max_heartrate or getattr(settings, 'STRAVA_MAX_HEARTRATE', 190), HEARTRATE_ZONES
+        )
+
+    altitude = _samples(time, streams.get('altitude'))
+    if altitude is not None:
+        results['smoothed_elevation_gain'] = smoothed_elevation_gain(altitude[1])
+
+    return results
+
+
+def _has_samples(values):
+    return values is not None and not np.isnan(values.astype(np.float64)).all()
+
+
+def _samples(time, values):
+    """`(time, values)` en float64 sin las muestras sin dato (NaN), o `None` si no queda ninguna."""
+    if values is None:
+        return None
+    values = values.astype(np.float64)
+    valid = ~np.isnan(values)
+    if not valid.any():
+        return None
+    return time[valid], values[valid]
+
+
+def resample_1hz(time, values):
+    """
+    Interpola un canal a una muestra por segundo (los streams pueden tener
+    huecos de tiempo y muestras sin dato, que se interpolan desde sus vecinas).
+    """
+    time, values = _samples(time, values)
+    grid = np.arange(time[0], time[-1] + 1)
+    return np.interp(grid, time, values)
+
+
+def best_efforts_by_distance(time, distance):
+    """
+    Menor tiempo para cubrir cada distancia estándar.
+    Para cada muestra inicial se busca con `searchsorted` la primera muestra que
+    completa la distancia; el mínimo de esas diferencias es el mejor esfuerzo.
+    """
+    # searchsorted necesita una serie ordenada (el GPS puede retroceder unos centímetros)
+    distance = np.maximum.accumulate(distance)
+    efforts = {}
+    for label, meters in BEST_EFFORT_DISTANCES:
+        if distance[-1] - distance[0] < meters:
+            continue
+        end = np.searchsorted(distance, distance + meters, side='left')
+        valid = end < len(distance)
+        elapsed = time[end[valid]] - time[valid]
+        best = int(np.argmin(elapsed))
+        efforts[label] = {
+            'elapsed_time': float(elapsed[best]),
+            'start_time': float(time[valid][best]),
+        }
+    return efforts
+
+
+def best_average_by_duration(values_1hz):
+    """Mejor media móvil de cada duración estándar sobre una serie a 1 Hz."""
+    cumulative = np.concatenate(([0.0], np.cumsum(values_1hz)))
+    best = {}
+    for label, seconds in BEST_EFFORT_DURATIONS:
+        if len(values_1hz) < seconds:
+            continue
+        window_sums = cumulative[seconds:] - cumulative[:-seconds]
+        best[label] = float(window_sums.max() / seconds)
+    return best
+
+
+def normalized_power(watts_1hz):
+    """Potencia normalizada: media de 30 s elevada a la cuarta, promediada y raíz cuarta."""
+    if len(watts_1hz) < NORMALIZED_POWER_WINDOW:
+        return None
+    cumulative = np.concatenate(([0.0], np.cumsum(watts_1hz)))
+    rolling = (cumulative[NORMALIZED_POWER_WINDOW:] - cumulative[:-NORMALIZED_POWER_WINDOW]) / NORMALIZED_POWER_WINDOW
+    return float(np.mean(rolling ** 4) ** 0.25)
+
+
+def time_in_zones(time, values, reference, zones):
+    """
+    Segundos en cada zona. Cada muestra cuenta el tiempo hasta la siguiente
+    (acotado a `MAX_SAMPLE_GAP` para no contar las pausas); las muestras sin
+    dato no cuentan en ninguna.
+    """
+    values = values.astype(np.float64)
+    valid = ~np.isnan(values)
+    dt = np.where(valid, np.clip(np.diff(time, append=time[-1]), 0, MAX_SAMPLE_GAP), 0.0)
+    edges = np.array(zones) * reference
+    zone_index = np.searchsorted(edges, np.where(valid, values, 0.0), side='right') - 1
+    seconds = np.bincount(zone_index, weights=dt, minlength=len(zones))
+    return [
+        {
+            'zone': i + 1,
+            'min': round(float(edges[i])),
+            'max': round(float(edges[i + 1])) if i + 1 < len(edges) else None,
+            'seconds': float(seconds[i]),
+        }
+        for i in range(len(zones))
+    ]
+
+
+def smoothed_elevation_gain(altitude):
+    """Desnivel positivo tras suavizar la altitud con una media móvil (filtra el ruido del GPS/barómetro)."""
+    if len(altitude) < ELEVATION_SMOOTHING_WINDOW:
+        return float(np.clip(np.diff(altitude), 0, None).sum())
+    kernel = np.ones(ELEVATION_SMOOTHING_WINDOW) / ELEVATION_SMOOTHING_WINDOW
+    smoothed = np.convolve(altitude, kernel, mode='valid')
+    return float(np.clip(np.diff(smoothed), 0, None).sum())
+
+
+def format_duration(seconds):
+    """Segundos -> 'H:MM:SS' o 'M:SS' para las plantillas."""
+    seconds = int(round(seconds or 0))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+def display_analysis(results):
+    """Prepara los resultados para `activity_detail.html` (duraciones ya formateadas)."""
+    if not results or set(results) == {'references'}:
+        return None
+    return {
+        'best_efforts': [
+            {'label': label, 'time': format_duration(effort['elapsed_time'])}
+            for label, effort in results.get('best_efforts', {}).items()
+        ],
+        'best_power': [
+            {'label': label, 'watts': watts} for label, watts in results.get('best_power', {}).items()
+        ],
+        'heartrate_zones': [
+            {**zone, 'time': format_duration(zone['seconds'])} for zone in results.get('heartrate_zones', [])
+        ],
+        'power_zones': [
+            {**zone, 'time': format_duration(zone['seconds'])} for zone in results.get('power_zones', [])
+        ],
+        'normalized_power': results.get('normalized_power'),
+        'smoothed_elevation_gain': results.get('smoothed_elevation_gain'),
+    }
+
+
+# --- Caché por actividad ---
+
+def analysis_references():
+    """FC máxima y FTP actuales (`STRAVA_MAX_HEARTRATE`, `STRAVA_FTP`): los límites de las zonas."""
+    return {
+        'max_heartrate': getattr(settings, 'STRAVA_MAX_HEARTRATE', 190),
+        'ftp': getattr(settings, 'STRAVA_FTP', 200),
+    }
+
+
+def get_analysis(activity, force=False):
+    """
+    Devuelve el análisis de la actividad, calculándolo solo si no existe, si es
+    de una versión anterior, si los streams se descargaron después o si la FC
+    máxima o el FTP cambiaron desde entonces (`results['references']`).
+    Devuelve `None` si la actividad no tiene streams.
+    """
+    stream_info = ActivityStream.objects.filter(
+        activity_id=activity.id
+    ).values('sample_count', 'fetched_at').first()
+    if not stream_info or not stream_info['sample_count']:
+        return None
+
+    references = analysis_references()
+    cached = ActivityAnalysis.objects.filter(activity_id=activity.id).first()
+    if (
+        cached and not force
+        and cached.version == ANALYSIS_VERSION
+        and cached.computed_at >= stream_info['fetched_at']
+        and cached.results.get('references') == references
+    ):
+        return cached.results
+
+    results = {**analyze_streams(load_streams(activity.id), **references), 'references': references}
+    ActivityAnalysis.objects.update_or_create(
+        activity_id=activity.id,
+        defaults={'results': results, 'version': ANALYSIS_VERSION, 'computed_at': timezone.now()},
+    )
+    return results
@@ -0,0 +1,264 @@
+"""
+API JSON de solo lectura (`/api/v1/`) con los mismos datos que el dashboard.
+
+Todas las respuestas dependen únicamente de los datos del atleta, que solo
+cambian cuando la ingesta incrementa su `data_generation`. El ETag (fuerte)
+se calcula a partir de la generación, la URL con sus parámetros, el día y la
+codificación de la respuesta, así que una petición con `If-None-Match` (o
+`If-Modified-Since`, contra `Athlete.data_updated_at`) se contesta con un 304
+tras una sola consulta por clave primaria, sin construir la respuesta.
+
+Las respuestas se comprimen con brotli si el cliente lo acepta y el paquete
+`brotli` (opcional) está instalado, o con gzip. Cada codificación es una
+representación distinta y lleva su propio ETag.
+"""
+import hashlib
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from functools import wraps
+
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+from django.views.decorators.http import condition
+
+from . import rollups
+from .analysis import get_analysis
+from .cache import cached
+from .models import Activity, Athlete, AthleteStreak
+from .pagination import InvalidCursor, paginate_keyset
+from .routes import find_same_route
+
+try:
+    import brotli
+except ImportError:  # Opcional: sin él se usa gzip
+    brotli = None
+
+API_VERSION = 'v1'
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+# --- Validación condicional y compresión ---
+
+def negotiate_encoding(request):
+    """Codificación de la respuesta según `Accept-Encoding`: 'br', 'gzip' o `None`."""
+    accepted = {}
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, _, params = part.partition(';')
+        quality = 1.0
+        params = params.strip().replace(' ', '')
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in (('br', 'gzip') if brotli else ('gzip',)):
+        if accepted.get(encoding, 0) > 0:
+            return encoding
+    return None
+
+
+def data_version(request):
+    """
+    `(data_generation, data_updated_at)` del atleta leídos de la DB: el de
+    `request.athlete` puede venir de la caché de atletas y llegar unos segundos
+    tarde. Se calcula una vez por petición.
+    """
+    if not hasattr(request, '_data_version'):
+        request._data_version = Athlete.objects.values_list(
+            'data_generation', 'data_updated_at'
+        ).get(id=request.athlete.id)
+        # Las claves de `cached` deben usar la misma generación que el ETag
+        request.athlete.data_generation = request._data_version[0]
+    return request._data_version
+
+
+def _today():
+    return timezone.now().date()
+
+
+def api_etag(request, *args, **kwargs):
+    generation, _ = data_version(request)
+    # Los resúmenes dependen del día (semana y mes en curso, racha)
+    key = repr((API_VERSION, request.athlete.id, generation, _today(), request.path, sorted(request.GET.lists())))
+    digest = hashlib.sha1(key.encode()).hexdigest()[:32]
+    encoding = negotiate_encoding(request)
+    return f'{digest}-{encoding}' if encoding else digest
+
+
+def api_last_modified(request, *args, **kwargs):
+    _, updated_at = data_version(request)
+    start_of_day = datetime.combine(_today(), time.min, tzinfo=dt_timezone.utc)
+    return max(updated_at, start_of_day) if updated_at else start_of_day
+
+
+def compress_response(response, encoding):
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if encoding is None or response.streaming or response.status_code == 304 or response.has_header('Content-Encoding'):
+        return response
+    content = brotli.compress(response.content) if encoding == 'br' else compress_string(response.content)
+    response.content = content
+    response['Content-Length'] = str(len(content))
+    response['Content-Encoding'] = encoding
+    return response
+
+
+def api_view(view):
+    """
+    Endpoint de la API: exige sesión, responde 304 si el cliente ya tiene la
+    versión actual y comprime la respuesta. El navegador debe revalidar siempre
+    (`no-cache`), lo que con el ETag cuesta un 304.
+    """
+    conditional = condition(etag_func=api_etag, last_modified_func=api_last_modified)(view)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.athlete is None:
+            return JsonResponse({'error': 'Not authenticated'}, status=401)
+        response = conditional(request, *args, **kwargs)
+        response['Cache-Control'] = 'private, no-cache'
+        return compress_response(response, negotiate_encoding(request))
+    return wrapper
+
+
+# --- Serialización ---
+
+def activity_summary(activity):
+    return {
+        'id': activity.id,
+        'name': activity.name,
+        'type': activity.type,
+        'sport_type': activity.sport_type,
+        'start_date_local': activity.start_date_local.isoformat(),
+        'distance': activity.distance,
+        'moving_time': activity.moving_time,
+        'elapsed_time': activity.elapsed_time,
+        'total_elevation_gain': activity.total_elevation_gain,
+        'average_speed': activity.average_speed,
+        'max_speed': activity.max_speed,
+        'average_heartrate': activity.average_heartrate,
+        'max_heartrate': activity.max_heartrate,
+        'start_latlng': activity.start_latlng,
+    }
+
+
+def _since(request, default_days=365):
+    try:
+        return datetime.strptime(request.GET['since'], '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        return _today() - timedelta(days=default_days)
+
+
+# --- Endpoints ---
+
+@api_view
+def summary(request):
+    """Totales de hoy, la semana y el mes en curso, racha y actividades por tipo."""
+    athlete = request.athlete
+    today = _today()
+
+    def build():
+        streak = AthleteStreak.objects.filter(athlete=athlete).first()
+        return {
+            'date': today.isoformat(),
+            'periods': rollups.summarize_periods(
+                athlete,
+                {'today': today, 'this_week': today - timedelta(days=today.weekday()), 'this_month': today.replace(day=1)},
+                end_day=today,
+            ),
+            'streak': {
+                'current': streak.current_streak_on(today),
+                'longest': streak.longest_streak,
+                'total_days': streak.total_days,
+            } if streak else None,
+            'types': list(rollups.type_distribution(athlete)),
+        }
+
+    return JsonResponse(cached(athlete, 'api:summary', build, today))
+
+
+@api_view
+def weekly(request):
+    """Totales por semana ISO desde `?since=YYYY-MM-DD` (por defecto, el último año)."""
+    athlete = request.athlete
+    since = _since(request)
+
+    def build():
+        return {'since': since.isoformat(), 'weeks': [
+            {key: row[key] or 0 for key in ('year', 'week', 'count', 'distance', 'elevation', 'time')}
+            for row in rollups.weekly_summary(athlete, since)
+        ]}
+
+    return JsonResponse(cached(athlete, 'api:weekly', build, since))
+
+
+@api_view
+def monthly(request):
+    """Totales por mes desde `?since=YYYY-MM-DD` (por defecto, el último año)."""
+    athlete = request.athlete
+    since = _since(request)
+
+    def build():
+        return {'since': since.isoformat(), 'months': [
+            {'month': row['month_key'], **{key: row[key] or 0 for key in ('count', 'distance', 'elevation', 'time')}}
+            for row in rollups.monthly_summary(athlete, since)
+        ]}
+
+    return JsonResponse(cached(athlete, 'api:monthly', build, since))
+
+
+@api_view
+def activities(request):
+    """Actividades de la más reciente a la más antigua, por cursor (`?cursor=`, `?type=`, `?limit=`)."""
+    athlete = request.athlete
+    selected_type = request.GET.get('type')
+    cursor = request.GET.get('cursor')
+    try:
+        limit = min(max(int(request.GET.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer'}, status=400)
+
+    def build():
+        queryset = Activity.objects.filter(athlete=athlete)
+        if selected_type:
+            queryset = queryset.filter(type=selected_type)
+        page = paginate_keyset(queryset, cursor, limit)
+        return {
+            'activities': [activity_summary(activity) for activity in page['object_list']],
+            'next_cursor': page['next_cursor'],
+            'previous_cursor': page['previous_cursor'],
+        }
+
+    try:
+        return JsonResponse(cached(athlete, 'api:activities', build, selected_type, cursor, limit))
+    except InvalidCursor:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+
+
+@api_view
+def activity(request, activity_id):
+    """Detalle de una actividad con las de la misma ruta y el análisis de sus streams."""
+    athlete = request.athlete
+
+    def build():
+        activity = Activity.objects.filter(id=activity_id, athlete=athlete).first()
+        if activity is None:
+            return None
+        same_route = find_same_route(activity)
+        return {
+            **activity_summary(activity),
+            'timezone': activity.timezone,
+            'end_latlng': activity.end_latlng,
+            'same_route': [
+                {**activity_summary(match), 'route_deviation': round(match.route_deviation, 1)}
+                for match in same_route
+            ] if same_route is not None else None,
+            'analysis': get_analysis(activity),
+        }
+
+    payload = cached(athlete, 'api:activity', build, activity_id)
+    if payload is None:
+        return JsonResponse({'error': 'Not found'}, status=404)
+    return JsonResponse(payload)
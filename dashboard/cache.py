@@ -0,0 +1,129 @@
+"""
+Caché versionada por atleta para los contextos de las vistas del dashboard.
+
+Cada clave incluye el `data_generation` del atleta, que la ingesta incrementa
+cuando escribe actividades. Tras una sincronización las claves nuevas ya no
+coinciden con las viejas, así que no hace falta invalidar nada: las entradas
+antiguas se quedan sin leer hasta que las expulse el backend (LRU/TTL).
+
+El propio atleta de la sesión también se cachea (`get_athlete`, lo usa
+`AthleteMiddleware`) con un TTL corto, sin los tokens OAuth. Se expulsa al
+cambiar su generación o sus tokens; con la caché en memoria local, que no
+comparten los procesos, el TTL acota cuánto tarda en verse un cambio hecho
+por el worker.
+
+El backend se elige en `settings.CACHES` (memoria local, fichero o Redis).
+Los contadores de aciertos y fallos (`manage.py cache_stats`) solo se llevan
+con un backend compartido entre procesos: con la memoria local cada proceso
+tendría los suyos y el comando, que corre en otro, no vería ninguno.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Athlete
+
+ATHLETE_KEY = 'dashboard:athlete:{}'
+HITS_KEY = 'dashboard:stats:hits'
+MISSES_KEY = 'dashboard:stats:misses'
+
+_MISSING = object()
+
+
+def get_cache():
+    return caches[getattr(settings, 'DASHBOARD_CACHE_ALIAS', 'default')]
+
+
+def stats_enabled(cache=None):
+    """Si el backend es compartido entre procesos y por tanto se cuentan aciertos y fallos."""
+    return not isinstance(cache or get_cache(), (LocMemCache, DummyCache))
+
+
+def make_key(athlete, name, *parts):
+    """`dashboard:<vista>:<atleta>:<generación>:<hash de los parámetros>`."""
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()[:16]
+    return f"dashboard:{name}:{athlete.id}:{athlete.data_generation}:{digest}"
+
+
+def cached(athlete, name, builder, *parts):
+    """
+    Devuelve el valor cacheado para (`athlete`, `name`, `parts`) o lo calcula
+    con `builder()` y lo guarda. `parts` debe incluir todo lo que cambie el
+    resultado además de los datos del atleta (página, filtro, fecha, ...).
+    """
+    cache = get_cache()
+    key = make_key(athlete, name, *parts)
+
+    counted = stats_enabled(cache)
+
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        if counted:
+            _incr(cache, HITS_KEY)
+        return value
+
+    if counted:
+        _incr(cache, MISSES_KEY)
+    value = builder()
+    cache.set(key, value)
+    return value
+
+
+def bump_generation(athlete):
+    """Marca como obsoletas todas las entradas cacheadas del atleta."""
+    Athlete.objects.filter(id=athlete.id).update(
+        data_generation=F('data_generation') + 1, data_updated_at=timezone.now(),
+    )
+    athlete.data_generation, athlete.data_updated_at = Athlete.objects.values_list(
+        'data_generation', 'data_updated_at'
+    ).get(id=athlete.id)
+    evict_athlete(athlete.id)
+
+
+def get_athlete(athlete_id):
+    """
+    Atleta por ID desde la caché o la DB (`None` si no existe). Los tokens se
+    difieren: no se guardan en la caché y leerlos vuelve a consultar la DB.
+    """
+    cache = get_cache()
+    key = ATHLETE_KEY.format(athlete_id)
+    athlete = cache.get(key)
+    if athlete is None:
+        athlete = Athlete.objects.defer('access_token', 'refresh_token').filter(id=athlete_id).first()
+        if athlete is not None:
+            cache.set(key, athlete, settings.STRAVA_ATHLETE_CACHE_TIMEOUT)
+    return athlete
+
+
+def evict_athlete(athlete_id):
+    get_cache().delete(ATHLETE_KEY.format(athlete_id))
+
+
+def get_stats():
+    cache = get_cache()
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else 0.0,
+    }
+
+
+def reset_stats():
+    get_cache().delete_many([HITS_KEY, MISSES_KEY])
+
+
+def _incr(cache, key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Primera vez o expulsada: se crea sin TTL, que no expire con las entradas
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
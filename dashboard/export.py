@@ -0,0 +1,216 @@
+"""
+Exportación del historial de actividades de un atleta en streaming.
+
+Las filas salen de `values_list(...).iterator(chunk_size=...)`: solo las
+columnas pedidas, sin instanciar modelos, y en bloques de `chunk_size` filas,
+así que la memoria no depende del número de actividades. Cada escritor
+convierte un bloque en bytes y los va entregando (a un `StreamingHttpResponse`
+o a un fichero).
+
+Formatos:
+- `csv`: cabecera con los nombres de los campos; fechas en ISO 8601.
+- `ndjson`: un objeto JSON por línea.
+- `columnar`: binario compacto por bloques de columnas (ver `write_columnar`),
+  que se lee con `read_columnar` o directamente con NumPy.
+"""
+import csv
+import io
+import json
+import struct
+from datetime import date
+from itertools import islice
+
+import numpy as np
+
+from .models import Activity
+
+DEFAULT_FIELDS = [
+    'id', 'name', 'type', 'sport_type', 'start_date', 'start_date_local', 'timezone', 'calculated_day',
+    'distance', 'moving_time', 'elapsed_time', 'total_elevation_gain', 'average_speed', 'max_speed',
+    'has_heartrate', 'average_heartrate', 'max_heartrate',
+    'start_lat', 'start_lng', 'end_lat', 'end_lng',
+]
+CHUNK_SIZE = 2000
+
+FORMATS = {
+    # formato: (content type, extensión)
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'columnar': ('application/octet-stream', 'sacol'),
+}
+
+# Tipo de cada columna en el formato columnar según el campo del modelo
+COLUMN_KINDS = {
+    'BigIntegerField': 'int',
+    'IntegerField': 'int',
+    'FloatField': 'float',
+    'BooleanField': 'bool',
+    'DateTimeField': 'datetime',
+    'DateField': 'date',
+    'CharField': 'str',
+    'TextField': 'str',
+}
+DTYPES = {'int': '<i8', 'float': '<f8', 'bool': '<u1', 'datetime': '<i8', 'date': '<i4'}
+EPOCH_DAY = date(1970, 1, 1)
+
+MAGIC = b'SACOL1\n'
+
+
+def column_kind(field):
+    return COLUMN_KINDS[Activity._meta.get_field(field).get_internal_type()]
+
+
+def validate_fields(fields):
+    """Lista de campos pedida (`None`: los de `DEFAULT_FIELDS`). Lanza `ValueError` si alguno no se exporta."""
+    if not fields:
+        return list(DEFAULT_FIELDS)
+    unknown = [field for field in fields if field not in DEFAULT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return list(fields)
+
+
+def iter_blocks(athlete, fields, chunk_size=CHUNK_SIZE):
+    """Bloques (listas de tuplas) de como mucho `chunk_size` filas, en orden cronológico."""
+    rows = Activity.objects.filter(athlete=athlete).order_by('start_date', 'id').values_list(*fields).iterator(
+        chunk_size=chunk_size
+    )
+    while True:
+        block = list(islice(rows, chunk_size))
+        if not block:
+            return
+        yield block
+
+
+def export_activities(athlete, export_format, fields=None, chunk_size=CHUNK_SIZE):
+    """Generador de bytes con la exportación de las actividades del atleta."""
+    fields = validate_fields(fields)
+    writer = WRITERS[export_format]
+    return writer(fields, iter_blocks(athlete, fields, chunk_size))
+
+
+# --- Escritores ---
+
+def _text(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def write_csv(fields, blocks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for block in blocks:
+        writer.writerows([_text(value) for value in row] for row in block)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # Solo la cabecera: no había actividades
+        yield buffer.getvalue().encode()
+
+
+def write_ndjson(fields, blocks):
+    for block in blocks:
+        yield ''.join(
+            json.dumps(dict(zip(fields, row)), default=_text, separators=(',', ':')) + '\n' for row in block
+        ).encode()
+
+
+def write_columnar(fields, blocks):
+    """
+    Formato columnar:
+
+        MAGIC
+        uint32 longitud + esquema JSON `{"fields": [{"name", "kind"}]}`
+        bloques: uint32 filas (n) y, por cada campo, uint32 longitud + columna
+        uint32 0 (fin)
+
+    Cada columna empieza con un bitmap de validez (`np.packbits` en orden
+    'little', 1 = no nulo) y sigue con los valores en little-endian: int64
+    (`int`), float64 (`float`), uint8 (`bool`), segundos Unix en int64
+    (`datetime`), días desde 1970-01-01 en int32 (`date`), o para `str` n+1
+    offsets uint32 y los bytes UTF-8 concatenados. Los nulos valen 0.
+    """
+    kinds = [column_kind(field) for field in fields]
+    schema = json.dumps({'fields': [{'name': f, 'kind': k} for f, k in zip(fields, kinds)]}).encode()
+    yield MAGIC + struct.pack('<I', len(schema)) + schema
+
+    for block in blocks:
+        parts = [struct.pack('<I', len(block))]
+        for kind, values in zip(kinds, zip(*block)):
+            column = _encode_column(kind, values)
+            parts.append(struct.pack('<I', len(column)))
+            parts.append(column)
+        yield b''.join(parts)
+    yield struct.pack('<I', 0)
+
+
+def _encode_column(kind, values):
+    valid = np.fromiter((value is not None for value in values), dtype=bool, count=len(values))
+    bitmap = np.packbits(valid, bitorder='little').tobytes()
+
+    if kind == 'str':
+        encoded = [value.encode() if value is not None else b'' for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype='<u4')
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        return bitmap + offsets.tobytes() + b''.join(encoded)
+
+    if kind == 'datetime':
+        values = [int(value.timestamp()) if value is not None else 0 for value in values]
+    elif kind == 'date':
+        values = [(value - EPOCH_DAY).days if value is not None else 0 for value in values]
+    else:
+        values = [value if value is not None else 0 for value in values]
+    return bitmap + np.array(values, dtype=DTYPES[kind]).tobytes()
+
+
+WRITERS = {'csv': write_csv, 'ndjson': write_ndjson, 'columnar': write_columnar}
+
+
+# --- Lectura del formato columnar ---
+
+def read_columnar(stream):
+    """
+    Lee un fichero columnar. Genera un dict `{campo: array}` por bloque; los
+    `datetime` se devuelven como `datetime64[s]`, los `date` como
+    `datetime64[D]` y los `str` como arrays de objetos. Los nulos quedan
+    enmascarados (`np.ma.MaskedArray`).
+    """
+    if stream.read(len(MAGIC)) != MAGIC:
+        raise ValueError('Not a columnar activity export')
+    schema = json.loads(stream.read(_read_uint32(stream)))
+    fields = schema['fields']
+
+    while True:
+        rows = _read_uint32(stream)
+        if not rows:
+            return
+        block = {}
+        for field in fields:
+            column = stream.read(_read_uint32(stream))
+            block[field['name']] = _decode_column(field['kind'], column, rows)
+        yield block
+
+
+def _read_uint32(stream):
+    return struct.unpack('<I', stream.read(4))[0]
+
+
+def _decode_column(kind, column, rows):
+    bitmap_size = (rows + 7) // 8
+    valid = np.unpackbits(np.frombuffer(column[:bitmap_size], dtype=np.uint8), count=rows, bitorder='little').astype(bool)
+    data = column[bitmap_size:]
+
+    if kind == 'str':
+        offsets = np.frombuffer(data[:4 * (rows + 1)], dtype='<u4')
+        text = data[4 * (rows + 1):]
+        values = np.array([text[start:end].decode() for start, end in zip(offsets[:-1], offsets[1:])], dtype=object)
+    else:
+        values = np.frombuffer(data, dtype=DTYPES[kind])
+        if kind == 'datetime':
+            values = values.astype('datetime64[s]')
+        elif kind == 'date':
+            values = values.astype('datetime64[D]')
+        elif kind == 'bool':
+            values = values.astype(bool)
+    return np.ma.MaskedArray(values, mask=~valid)
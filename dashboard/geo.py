@@ -0,0 +1,106 @@
+"""
+Consultas geográficas sobre los puntos de inicio de las actividades.
+
+Cada actividad guarda su inicio como `start_lat`/`start_lng` y una celda de
+una rejilla fija de `GRID_SIZE` grados (`start_cell`, indexada junto al atleta).
+Una búsqueda por radio se traduce en un rango de celdas por fila de la rejilla
+que cubre la caja envolvente del círculo; solo las actividades de esas celdas
+se leen de la DB y a ellas se les aplica la distancia exacta (haversine).
+"""
+import math
+
+from django.db.models import Q
+
+from .models import Activity
+
+EARTH_RADIUS_KM = 6371.0088
+
+# ~11 km de lado en el ecuador: una búsqueda de pocos km toca pocas celdas
+GRID_SIZE = 0.1
+GRID_COLUMNS = int(round(360 / GRID_SIZE))
+GRID_ROWS = int(round(180 / GRID_SIZE))
+
+
+def parse_latlng(value):
+    """`[lat, lng]` de la API -> `(lat, lng)` en float, o `(None, None)` si falta."""
+    if not value or len(value) != 2:
+        return None, None
+    return float(value[0]), float(value[1])
+
+
+def _row(lat):
+    return min(max(int(math.floor((lat + 90) / GRID_SIZE)), 0), GRID_ROWS - 1)
+
+
+def _column(lng):
+    return int(math.floor((lng + 180) / GRID_SIZE)) % GRID_COLUMNS
+
+
+def grid_cell(lat, lng):
+    """Celda de la rejilla que contiene el punto (`None` si no hay coordenadas)."""
+    if lat is None or lng is None:
+        return None
+    return _row(lat) * GRID_COLUMNS + _column(lng)
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Distancia ortodrómica en km entre dos puntos en grados."""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(lat, lng, radius_km):
+    """Caja `(min_lat, max_lat, min_lng, max_lng)` que contiene el círculo."""
+    delta_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat, max_lat = lat - delta_lat, lat + delta_lat
+    if min_lat <= -90 or max_lat >= 90:
+        # El círculo incluye un polo: todas las longitudes
+        return max(min_lat, -90), min(max_lat, 90), -180, 180
+    # Longitud máxima del círculo: en el punto tangente al meridiano, algo más cerca del polo que `lat`
+    ratio = math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(lat))
+    if ratio >= 1:
+        return min_lat, max_lat, -180, 180
+    delta_lng = math.degrees(math.asin(ratio))
+    return min_lat, max_lat, lng - delta_lng, lng + delta_lng
+
+
+def cell_ranges(min_lat, max_lat, min_lng, max_lng):
+    """Rangos `(primera, última)` de celdas que cubren la caja, uno por fila (y tramo de longitud)."""
+    if max_lng - min_lng >= 360:
+        column_spans = [(0, GRID_COLUMNS - 1)]
+    else:
+        first, last = _column(min_lng), _column(max_lng)
+        # La caja cruza el antimeridiano: dos tramos de columnas
+        column_spans = [(first, last)] if first <= last else [(first, GRID_COLUMNS - 1), (0, last)]
+
+    return [
+        (row * GRID_COLUMNS + first, row * GRID_COLUMNS + last)
+        for row in range(_row(min_lat), _row(max_lat) + 1)
+        for first, last in column_spans
+    ]
+
+
+def nearby_activities(athlete, lat, lng, radius_km, limit=None):
+    """
+    Actividades del atleta que empiezan a menos de `radius_km` del punto,
+    ordenadas por distancia. Devuelve una lista de `(distance_km, activity)`.
+    """
+    cells = Q()
+    for first, last in cell_ranges(*bounding_box(lat, lng, radius_km)):
+        cells |= Q(start_cell__range=(first, last))
+
+    candidates = Activity.objects.filter(cells, athlete=athlete).only(
+        'id', 'name', 'type', 'distance', 'start_date_local', 'start_lat', 'start_lng',
+    )
+
+    matches = []
+    for activity in candidates:
+        distance = haversine_km(lat, lng, activity.start_lat, activity.start_lng)
+        if distance <= radius_km:
+            matches.append((distance, activity))
+    matches.sort(key=lambda match: match[0])
+    return matches[:limit] if limit else matches
@@ -0,0 +1,337 @@
+"""
+Mapa de calor personal en teselas XYZ pre-renderizadas.
+
+Las polilíneas del atleta se rasterizan con NumPy en coordenadas de píxel de
+Web Mercator para cada nivel de zoom: cada píxel cuenta cuántas actividades
+pasan por él. Por cada tesela se guardan en disco los conteos (`.npz`) y el
+PNG coloreado, así que servir una tesela es leer un fichero.
+
+El renderizado es incremental: solo se rasterizan las actividades nuevas y se
+reescriben las teselas que tocan. `ActivityTrack.heatmap_hash` recuerda qué
+versión de la polilínea está dibujada; si una polilínea cambia o se borra una
+actividad, las teselas del atleta se reconstruyen desde cero.
+
+Cada versión del mapa tiene su propio directorio. Un renderizado escribe la
+versión siguiente en un directorio provisional propio (partiendo de enlaces
+duros a las teselas de la actual, que se sustituyen en lugar de modificarse)
+y solo al terminar la publica: un UPDATE condicionado a la versión de la que
+partió (compare-and-swap) sube `Heatmap.version` y el directorio pasa a
+`v{n}`. Las teselas que se sirven nunca están a medias y, si dos procesos
+renderizan a la vez el mismo atleta (p. ej. el worker y `sync_strava_data`),
+solo publica el primero; el otro descarta su trabajo y las actividades que
+solo él dibujó quedan pendientes para el siguiente renderizado.
+"""
+import io
+import math
+import os
+import shutil
+import struct
+import uuid
+import zlib
+from contextlib import nullcontext
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max, Min
+from django.utils import timezone
+
+from .models import ActivityTrack, Heatmap
+from .polyline import decode
+
+TILE_SIZE = 256
+
+# Pasadas por un píxel a partir de las cuales el color se satura
+SATURATION = 20
+# Paleta: (posición, R, G, B, A) sobre la intensidad logarítmica 0-1
+COLORMAP = np.array([
+    (0.0, 180, 20, 0, 120),
+    (0.4, 255, 90, 0, 200),
+    (0.75, 255, 210, 0, 240),
+    (1.0, 255, 255, 255, 255),
+])
+# Un segmento larguísimo (un salto del GPS) no debe generar millones de muestras
+MAX_SEGMENT_PIXELS = 4096
+CHUNK_SIZE = 200
+
+
+def zoom_levels():
+    return range(settings.STRAVA_HEATMAP_MIN_ZOOM, settings.STRAVA_HEATMAP_MAX_ZOOM + 1)
+
+
+def athlete_dir(athlete_id):
+    return Path(settings.STRAVA_HEATMAP_DIR) / str(athlete_id)
+
+
+def version_dir(athlete_id, version):
+    return athlete_dir(athlete_id) / f'v{version}'
+
+
+def tile_path(athlete_id, version, zoom, x, y, suffix='.png'):
+    return _tile_file(version_dir(athlete_id, version), zoom, x, y, suffix)
+
+
+def _tile_file(root, zoom, x, y, suffix='.png'):
+    return root / str(zoom) / str(x) / f'{y}{suffix}'
+
+
+def staging_dir(athlete_id, version):
+    """Directorio provisional (único por renderizado) donde se escribe la versión `version`."""
+    return athlete_dir(athlete_id) / f'.v{version}-{uuid.uuid4().hex}'
+
+
+# --- Rasterizado ---
+
+def to_pixels(points, zoom):
+    """`[lat, lng]` -> coordenadas de píxel globales (x, y) de Web Mercator en `zoom`."""
+    scale = TILE_SIZE * 2 ** zoom
+    lat = np.radians(np.clip(points[:, 0], -85.0511, 85.0511))
+    x = (points[:, 1] + 180) / 360 * scale
+    y = (1 - np.log(np.tan(lat) + 1 / np.cos(lat)) / math.pi) / 2 * scale
+    return x, y
+
+
+def line_pixels(points, zoom):
+    """
+    Píxeles (claves `x * ancho + y`, sin repetir) por los que pasa la línea.
+    Cada segmento se muestrea a menos de un píxel de distancia para no dejar huecos.
+    """
+    x, y = to_pixels(points, zoom)
+    dx, dy = np.diff(x), np.diff(y)
+    steps = np.clip(np.ceil(np.maximum(np.abs(dx), np.abs(dy))), 1, MAX_SEGMENT_PIXELS).astype(np.int64)
+
+    segment = np.repeat(np.arange(len(steps)), steps)
+    offsets = np.concatenate(([0], np.cumsum(steps)[:-1]))
+    fraction = (np.arange(steps.sum()) - np.repeat(offsets, steps)) / steps[segment]
+    xs = np.concatenate((x[:-1][segment] + dx[segment] * fraction, x[-1:]))
+    ys = np.concatenate((y[:-1][segment] + dy[segment] * fraction, y[-1:]))
+
+    width = TILE_SIZE * 2 ** zoom
+    xs = np.clip(xs.astype(np.int64), 0, width - 1)
+    ys = np.clip(ys.astype(np.int64), 0, width - 1)
+    return np.unique(xs * width + ys)
+
+
+def pixel_counts(polylines, zoom):
+    """Píxeles distintos tocados por las polilíneas y cuántas actividades pasan por cada uno."""
+    keys = [line_pixels(points, zoom) for points in polylines if len(points) >= 2]
+    if not keys:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.unique(np.concatenate(keys), return_counts=True)
+
+
+def merge_counts(a, b):
+    """Suma dos resultados de `pixel_counts`."""
+    pixels, inverse = np.unique(np.concatenate((a[0], b[0])), return_inverse=True)
+    return pixels, np.bincount(inverse, weights=np.concatenate((a[1], b[1]))).astype(np.int64)
+
+
+def split_tiles(pixels, counts, zoom):
+    """Reparte los conteos por tesela: `{(x, y): array uint16 (256, 256)}`."""
+    width = TILE_SIZE * 2 ** zoom
+    px, py = pixels // width, pixels % width
+    tile_x, tile_y = px // TILE_SIZE, py // TILE_SIZE
+
+    # Agrupar los píxeles por tesela
+    order = np.lexsort((tile_y, tile_x))
+    px, py, tile_x, tile_y, counts = px[order], py[order], tile_x[order], tile_y[order], counts[order]
+    boundaries = np.flatnonzero((np.diff(tile_x) != 0) | (np.diff(tile_y) != 0)) + 1
+
+    tiles = {}
+    for start, end in zip(np.concatenate(([0], boundaries)), np.concatenate((boundaries, [len(px)]))):
+        if start == end:
+            continue
+        density = np.zeros((TILE_SIZE, TILE_SIZE), dtype=np.uint16)
+        # Filas = y, columnas = x
+        density[py[start:end] % TILE_SIZE, px[start:end] % TILE_SIZE] = np.minimum(counts[start:end], 0xffff)
+        tiles[int(tile_x[start]), int(tile_y[start])] = density
+    return tiles
+
+
+# --- PNG ---
+
+def _build_palette():
+    # Color de cada conteo 0..SATURATION (intensidad logarítmica); el 0 es transparente
+    intensity = np.log1p(np.arange(SATURATION + 1)) / math.log1p(SATURATION)
+    palette = np.stack([np.interp(intensity, COLORMAP[:, 0], COLORMAP[:, channel]) for channel in range(1, 5)], axis=-1)
+    palette[0] = 0
+    return palette.astype(np.uint8)
+
+
+PALETTE = _build_palette()
+
+
+def colorize(density):
+    """Conteos -> imagen RGBA (transparente donde no hay actividades)."""
+    return PALETTE[np.minimum(density, SATURATION)]
+
+
+def _png_chunk(tag, data):
+    return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+
+def encode_png(rgba):
+    """Array RGBA (alto, ancho, 4) uint8 -> bytes PNG (sin filtros, comprimido con zlib)."""
+    height, width, _ = rgba.shape
+    # Cada fila va precedida del tipo de filtro (0 = ninguno)
+    rows = np.concatenate((np.zeros((height, 1), dtype=np.uint8), rgba.reshape(height, -1)), axis=1)
+    return b''.join((
+        b'\x89PNG\r\n\x1a\n',
+        _png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)),
+        _png_chunk(b'IDAT', zlib.compress(rows.tobytes(), 6)),
+        _png_chunk(b'IEND', b''),
+    ))
+
+
+EMPTY_TILE = encode_png(np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8))
+
+
+# --- Teselas en disco ---
+
+def _replace(path, content):
+    # Fichero nuevo + rename: las versiones anteriores comparten el inodo del enlace duro
+    partial = path.with_name(path.name + '.partial')
+    partial.write_bytes(content)
+    os.replace(partial, path)
+
+
+def _write_tile(root, zoom, x, y, delta):
+    """Suma `delta` a los conteos guardados de la tesela y regenera su PNG."""
+    density_path = _tile_file(root, zoom, x, y, '.npz')
+    density = delta.astype(np.uint32)
+    if density_path.exists():
+        with np.load(density_path) as stored:
+            density += stored['density']
+    density = np.minimum(density, np.iinfo(np.uint16).max).astype(np.uint16)
+
+    density_path.parent.mkdir(parents=True, exist_ok=True)
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, density=density)
+    _replace(density_path, buffer.getvalue())
+    _replace(_tile_file(root, zoom, x, y), encode_png(colorize(density)))
+
+
+def _link_or_copy(source, destination):
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+def _remove_other_versions(athlete_id, version):
+    """
+    Borra las versiones anteriores y los directorios provisionales de versiones
+    hasta `version` (ya no pueden publicarse); los de versiones posteriores son
+    de renderizados en curso.
+    """
+    keep = version_dir(athlete_id, version)
+    for path in athlete_dir(athlete_id).iterdir():
+        if path == keep:
+            continue
+        name = path.name.lstrip('.').split('-')[0]
+        if name[1:].isdigit() and int(name[1:]) > version:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def render_heatmap(athlete, full=False, write_lock=None):
+    """
+    Dibuja en las teselas las actividades del atleta que aún no lo están.
+    Con `full` (o si alguna polilínea cambió o se borró) reconstruye todas.
+    Devuelve `(actividades dibujadas, teselas escritas)`; `(0, 0)` también si
+    otro proceso publicó antes una versión nueva.
+
+    El rasterizado y los ficheros no toman `write_lock` (el de
+    `sync_strava_data --workers`); solo la publicación en la DB.
+    """
+    write_lock = write_lock or nullcontext()
+    with write_lock:
+        heatmap, _ = Heatmap.objects.get_or_create(athlete=athlete)
+    tracks = ActivityTrack.objects.filter(activity__athlete=athlete, point_count__gte=2)
+
+    # Una polilínea dibujada que cambió, o menos dibujadas que en el último renderizado (borradas)
+    stale = tracks.exclude(heatmap_hash='').exclude(heatmap_hash=F('source_hash')).exists()
+    drawn = tracks.filter(heatmap_hash=F('source_hash')).count()
+    current = version_dir(athlete.id, heatmap.version)
+    rebuild = full or stale or drawn < heatmap.activity_count or not current.is_dir()
+    if rebuild:
+        drawn = 0
+        pending = tracks
+    else:
+        pending = tracks.exclude(heatmap_hash=F('source_hash'))
+    pending = list(pending.values_list('activity_id', 'activity__summary_polyline'))
+    total = drawn + len(pending)
+    if not pending and total == heatmap.activity_count and heatmap.rendered_at is not None:
+        return 0, 0
+
+    # La versión nueva se escribe en un directorio provisional propio de este renderizado
+    staging = staging_dir(athlete.id, heatmap.version + 1)
+    try:
+        written = _render_tiles(staging, None if rebuild else current, pending)
+        if written is None or not _publish(athlete, heatmap, staging, tracks, pending, total, write_lock):
+            return 0, 0
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    _remove_other_versions(athlete.id, heatmap.version)
+    return len(pending), written
+
+
+def _render_tiles(staging, current, pending):
+    """
+    Escribe en `staging` las teselas de `current` más las actividades `pending`.
+    Devuelve las teselas escritas, o `None` si `current` desapareció mientras se copiaba.
+    """
+    if current is not None:
+        try:
+            shutil.copytree(current, staging, copy_function=_link_or_copy)
+        except (FileNotFoundError, shutil.Error):
+            # Otro renderizado publicó y borró la versión de la que partíamos
+            return None
+    staging.mkdir(parents=True, exist_ok=True)
+
+    # Conteos de todas las actividades pendientes por zoom; así cada tesela se escribe una sola vez
+    empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+    counts = {zoom: empty for zoom in zoom_levels()}
+    for start in range(0, len(pending), CHUNK_SIZE):
+        polylines = [decode(polyline) for _, polyline in pending[start:start + CHUNK_SIZE]]
+        for zoom in counts:
+            counts[zoom] = merge_counts(counts[zoom], pixel_counts(polylines, zoom))
+
+    written = 0
+    for zoom, (pixels, pixel_totals) in counts.items():
+        for (x, y), delta in split_tiles(pixels, pixel_totals, zoom).items():
+            _write_tile(staging, zoom, x, y, delta)
+            written += 1
+    return written
+
+
+def _publish(athlete, heatmap, staging, tracks, pending, total, write_lock):
+    """
+    Publica `staging` como la versión siguiente a `heatmap.version` si nadie lo
+    hizo antes (compare-and-swap sobre la versión). Devuelve si se publicó.
+    """
+    version = heatmap.version + 1
+    bounds = tracks.aggregate(
+        min_lat=Min('min_lat'), min_lng=Min('min_lng'), max_lat=Max('max_lat'), max_lng=Max('max_lng'),
+    )
+    with write_lock, transaction.atomic():
+        rendered_at = timezone.now()
+        claimed = Heatmap.objects.filter(athlete=athlete, version=heatmap.version).update(
+            version=version, activity_count=total, rendered_at=rendered_at, **bounds,
+        )
+        if not claimed:
+            return False
+        ActivityTrack.objects.filter(
+            activity_id__in=[activity_id for activity_id, _ in pending]
+        ).update(heatmap_hash=F('source_hash'))
+        # Antes del commit: quien lea la versión nueva ya encuentra su directorio
+        target = version_dir(athlete.id, version)
+        shutil.rmtree(target, ignore_errors=True)
+        os.rename(staging, target)
+
+    for field, value in bounds.items():
+        setattr(heatmap, field, value)
+    heatmap.version, heatmap.activity_count, heatmap.rendered_at = version, total, rendered_at
+    return True
@@ -0,0 +1,232 @@
+"""
+Pipeline de ingesta por lotes para actividades de Strava.
+
+Convierte cada lote de actividades (una página de la API o un tamaño de lote
+configurable) en una sola transacción con un único INSERT ... ON CONFLICT
+DO UPDATE sobre el ID de Strava, en lugar de un `update_or_create` por fila.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import transaction
+
+from .cache import bump_generation
+from .geo import grid_cell, parse_latlng
+from .models import Activity
+from .rollups import active_days, refresh_rollups
+from .streaks import update_streak
+from .routes import refresh_routes
+from .tracks import refresh_tracks
+from .training import activity_load, refresh_training_load
+from .yearly import patch_yearly_progress
+
+# Campos que la ingesta escribe (todos menos la PK)
+ACTIVITY_FIELDS = [
+    'athlete_id',
+    'name',
+    'distance',
+    'moving_time',
+    'elapsed_time',
+    'total_elevation_gain',
+    'type',
+    'sport_type',
+    'average_speed',
+    'max_speed',
+    'has_heartrate',
+    'average_heartrate',
+    'max_heartrate',
+    'start_date',
+    'start_date_local',
+    'timezone',
+    'summary_polyline',
+    'start_lat',
+    'start_lng',
+    'end_lat',
+    'end_lng',
+    'start_cell',
+    'calculated_day',
+    'training_load',
+]
+
+# Subconjunto que depende del mapa de la actividad (lo que actualiza `sync_maps`)
+MAP_FIELDS = ['summary_polyline', 'start_lat', 'start_lng', 'end_lat', 'end_lng', 'start_cell']
+
+DEFAULT_BATCH_SIZE = 50
+
+
+def parse_strava_datetime(value):
+    """Convierte una fecha ISO de Strava ('2024-01-01T10:00:00Z') a datetime UTC."""
+    return datetime.strptime(value, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=dt_timezone.utc)
+
+
+def activity_values(athlete, item):
+    """
+    Traduce un `SummaryActivity` de la API a un dict de valores del modelo.
+    Calcula `calculated_day` y la carga de entrenamiento aquí porque
+    `bulk_create` no pasa por `Activity.save()`.
+    """
+    start_date_local = parse_strava_datetime(item['start_date_local'])
+
+    values = {
+        'athlete_id': athlete.id,
+        'name': item['name'],
+        'distance': item['distance'],
+        'moving_time': item['moving_time'],
+        'elapsed_time': item['elapsed_time'],
+        'total_elevation_gain': item['total_elevation_gain'],
+        'type': item['type'],
+        'sport_type': item['sport_type'],
+        'average_speed': item['average_speed'],
+        'max_speed': item['max_speed'],
+        'has_heartrate': item.get('has_heartrate', False),
+        'average_heartrate': item.get('average_heartrate'),
+        'max_heartrate': item.get('max_heartrate'),
+        'start_date': parse_strava_datetime(item['start_date']),
+        'start_date_local': start_date_local,
+        'timezone': item['timezone'],
+        **map_values(item),
+        'calculated_day': start_date_local.date(),
+    }
+    values['training_load'] = activity_load(values)
+    return values
+
+
+def map_values(item):
+    """
+    Campos de mapa (`MAP_FIELDS`) de una actividad de la API. Sin GPS la
+    polilínea queda vacía: `NULL` solo significa que aún no se descargaron
+    los datos de mapa (ver `maps.sync_maps`).
+    """
+    start_lat, start_lng = parse_latlng(item.get('start_latlng'))
+    end_lat, end_lng = parse_latlng(item.get('end_latlng'))
+    return {
+        'summary_polyline': (item.get('map') or {}).get('summary_polyline') or '',
+        'start_lat': start_lat,
+        'start_lng': start_lng,
+        'end_lat': end_lat,
+        'end_lng': end_lng,
+        'start_cell': grid_cell(start_lat, start_lng),
+    }
+
+
+def new_stats():
+    """Contadores de una sincronización: filas insertadas, actualizadas y sin cambios."""
+    return {'inserted': 0, 'updated': 0, 'unchanged': 0}
+
+
+def merge_stats(total, partial):
+    for key in total:
+        total[key] += partial.get(key, 0)
+    return total
+
+
+def bulk_upsert_activities(athlete, items, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Inserta o actualiza un conjunto de actividades de la API en lotes.
+
+    Cada lote se procesa en una transacción: un SELECT de las filas existentes
+    (solo columnas, sin instanciar modelos) para clasificar cada actividad y un
+    único upsert para las nuevas y las modificadas. Las que no cambiaron no se
+    escriben. Los agregados diarios (`DailyRollup`) de los días tocados y la
+    racha del atleta se actualizan en la misma transacción; la serie de carga
+    de entrenamiento, una vez al final desde el día más antiguo tocado.
+
+    Devuelve un dict con las claves `inserted`, `updated` y `unchanged`.
+    """
+    stats = new_stats()
+    items = list(items)
+    touched_days = set()
+
+    for start in range(0, len(items), batch_size):
+        batch = items[start:start + batch_size]
+        merge_stats(stats, _upsert_batch(athlete, batch, touched_days))
+
+    if touched_days:
+        # Una sola vez por sincronización: cada lote la recalcularía desde su día más antiguo
+        refresh_training_load(athlete.id, min(touched_days))
+
+    if stats['inserted'] or stats['updated']:
+        # Las vistas cacheadas del atleta quedan obsoletas
+        bump_generation(athlete)
+
+    return stats
+
+
+def _upsert_batch(athlete, batch, all_touched_days):
+    stats = new_stats()
+
+    # Si la API repite una actividad dentro del lote nos quedamos con la última
+    incoming = {item['id']: activity_values(athlete, item) for item in batch}
+
+    with transaction.atomic():
+        existing = {
+            row['id']: row
+            for row in Activity.objects.filter(id__in=incoming.keys()).values('id', *ACTIVITY_FIELDS)
+        }
+
+        to_write = []
+        touched_days = set()
+        changed_polylines = {}
+        for activity_id, values in incoming.items():
+            current = existing.get(activity_id)
+            if current is None:
+                stats['inserted'] += 1
+            elif any(current[field] != values[field] for field in ACTIVITY_FIELDS):
+                stats['updated'] += 1
+                touched_days.add(current['calculated_day'])
+            else:
+                stats['unchanged'] += 1
+                continue
+            touched_days.add(values['calculated_day'])
+            to_write.append(Activity(id=activity_id, **values))
+            previous_polyline = current['summary_polyline'] if current else None
+            if previous_polyline != values['summary_polyline']:
+                changed_polylines[activity_id] = values['summary_polyline']
+
+        if to_write:
+            Activity.objects.bulk_create(
+                to_write,
+                update_conflicts=True,
+                unique_fields=['id'],
+                update_fields=ACTIVITY_FIELDS,
+            )
+
+        # Trazados simplificados del mapa y huellas de ruta, solo para las polilíneas que cambiaron
+        if changed_polylines:
+            refresh_tracks(changed_polylines)
+            refresh_routes(athlete.id, changed_polylines)
+
+        _refresh_days(athlete.id, touched_days)
+
+    all_touched_days.update(touched_days)
+    return stats
+
+
+def delete_activities(athlete, activity_ids):
+    """
+    Borra actividades del atleta (p. ej. un evento `delete` del webhook) junto
+    con sus trazados y huellas, y mantiene los agregados diarios y la racha de
+    los días afectados en la misma transacción. Devuelve cuántas se borraron.
+    """
+    with transaction.atomic():
+        rows = list(
+            Activity.objects.filter(athlete=athlete, id__in=activity_ids).values_list('id', 'calculated_day')
+        )
+        if not rows:
+            return 0
+        Activity.objects.filter(id__in=[activity_id for activity_id, _ in rows]).delete()
+        touched_days = {day for _, day in rows}
+        _refresh_days(athlete.id, touched_days)
+        refresh_training_load(athlete.id, min(touched_days))
+
+    # El mapa de calor detecta el borrado en su siguiente renderizado (ver heatmap.render_heatmap)
+    bump_generation(athlete)
+    return len(rows)
+
+
+def _refresh_days(athlete_id, touched_days):
+    """Recalcula los agregados diarios de los días afectados, su progreso anual y la racha."""
+    active_before = active_days(athlete_id, touched_days)
+    refresh_rollups(athlete_id, touched_days)
+    patch_yearly_progress(athlete_id, touched_days)
+    active_after = active_days(athlete_id, touched_days)
+    update_streak(athlete_id, active_after - active_before, active_before - active_after)
@@ -0,0 +1,183 @@
+"""
+Cola de sincronizaciones respaldada por la DB.
+
+Las vistas solo encolan un `SyncJob` y responden al momento; el trabajo lo hace
+`manage.py run_sync_worker` en otro proceso. Hay dos tipos de trabajo: la
+sincronización completa del atleta y los eventos del webhook (una actividad
+creada, modificada o borrada, o el atleta desautorizado; ver webhooks.py).
+Restricciones únicas parciales garantizan como mucho una sincronización
+pendiente o en curso por atleta y un evento pendiente por actividad: encolar
+otra vez devuelve el existente. Los workers reclaman trabajos con un UPDATE
+condicional (compare-and-swap), así que pueden ejecutarse varios a la vez sin
+bloqueos de fila, también en SQLite.
+"""
+import os
+import socket
+import traceback
+from datetime import timedelta
+
+import requests
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .ingest import delete_activities
+from .models import SyncJob
+from .tokens import ensure_fresh_token
+
+# Un trabajo en curso sin progreso durante este tiempo se da por perdido (worker caído).
+# Debe superar la ventana de 15 minutos del límite de Strava, que puede pausar una página.
+STALE_AFTER = timedelta(minutes=30)
+MAX_ATTEMPTS = 3
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def active_job(athlete):
+    return SyncJob.objects.filter(athlete=athlete, kind=SyncJob.SYNC, status__in=SyncJob.ACTIVE_STATUSES).first()
+
+
+def enqueue_sync(athlete):
+    """Encola una sincronización del atleta. Devuelve `(job, created)`."""
+    try:
+        with transaction.atomic():
+            return SyncJob.objects.create(athlete=athlete), True
+    except IntegrityError:
+        # Ya hay una pendiente o en curso (restricción `one_active_sync_per_athlete`)
+        job = active_job(athlete)
+        if job is None:
+            # Terminó entre el INSERT y la consulta: volver a intentarlo
+            return enqueue_sync(athlete)
+        return job, False
+
+
+def enqueue_event(athlete_id, kind, activity_id=None):
+    """Encola un evento del webhook. Devuelve `(job, created)`."""
+    try:
+        with transaction.atomic():
+            return SyncJob.objects.create(athlete_id=athlete_id, kind=kind, activity_id=activity_id), True
+    except IntegrityError:
+        # Ya hay uno pendiente para la actividad (restricción `one_queued_event_per_activity`)
+        job = SyncJob.objects.filter(kind=kind, activity_id=activity_id, status=SyncJob.QUEUED).first()
+        if job is None:
+            # Lo reclamó un worker entre el INSERT y la consulta: volver a intentarlo
+            return enqueue_event(athlete_id, kind, activity_id)
+        return job, False
+
+
+def claim_next_job(worker=None):
+    """Reclama el trabajo pendiente más antiguo o devuelve `None` si no hay."""
+    worker = worker or worker_name()
+    for job_id in SyncJob.objects.filter(status=SyncJob.QUEUED).order_by('created_at').values_list('id', flat=True)[:10]:
+        now = timezone.now()
+        claimed = SyncJob.objects.filter(id=job_id, status=SyncJob.QUEUED).update(
+            status=SyncJob.RUNNING, worker=worker, started_at=now, heartbeat_at=now,
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return SyncJob.objects.select_related('athlete').get(id=job_id)
+    return None
+
+
+def requeue_stale_jobs(stale_after=STALE_AFTER):
+    """
+    Devuelve a la cola los trabajos cuyo worker dejó de dar señales y marca como
+    fallidos los que ya agotaron sus intentos. Devuelve cuántos se recuperaron.
+
+    Se devuelven de uno en uno: si mientras tanto llegó otro evento de la misma
+    actividad ya está en la cola (`one_queued_event_per_activity`) y ese hará
+    el trabajo, así que el perdido se da por terminado en lugar de encolarlo.
+    """
+    cutoff = timezone.now() - stale_after
+    stale = SyncJob.objects.filter(status=SyncJob.RUNNING, heartbeat_at__lt=cutoff)
+    stale.filter(attempts__gte=MAX_ATTEMPTS).update(
+        status=SyncJob.FAILED, error='Worker stopped responding', finished_at=timezone.now(),
+    )
+
+    recovered = 0
+    for job_id in stale.filter(attempts__lt=MAX_ATTEMPTS).values_list('id', flat=True):
+        try:
+            with transaction.atomic():
+                # Condicional por si otro worker lo recuperó a la vez
+                recovered += SyncJob.objects.filter(id=job_id, status=SyncJob.RUNNING).update(
+                    status=SyncJob.QUEUED, worker='',
+                )
+        except IntegrityError:
+            SyncJob.objects.filter(id=job_id, status=SyncJob.RUNNING).update(
+                status=SyncJob.DONE, error='Superseded by a newer queued event', finished_at=timezone.now(),
+            )
+    return recovered
+
+
+def report_progress(job, page, stats):
+    """Guarda el progreso de un trabajo en curso (también sirve de heartbeat)."""
+    SyncJob.objects.filter(id=job.id).update(
+        pages=page, heartbeat_at=timezone.now(), **stats,
+    )
+
+
+def run_job(job):
+    """Ejecuta un trabajo reclamado y deja su estado final en la DB."""
+    # Importación tardía: las vistas y los webhooks importan este módulo para encolar
+    from .heatmap import render_heatmap
+    from .views import fetch_and_sync_activities
+    from .webhooks import apply_activity, forget_athlete
+
+    athlete = job.athlete
+    try:
+        if job.kind == SyncJob.DEAUTHORIZE:
+            # El trabajo se borra junto con el atleta: no queda fila donde guardar el estado
+            forget_athlete(athlete)
+            job.status, job.finished_at = SyncJob.DONE, timezone.now()
+            return job
+
+        if job.kind == SyncJob.DELETE:
+            stats = {'deleted': delete_activities(athlete, [job.activity_id])}
+        else:
+            athlete = ensure_fresh_token(athlete)
+            if job.kind == SyncJob.ACTIVITY:
+                stats = apply_activity(athlete, job.activity_id)
+            else:
+                stats = fetch_and_sync_activities(
+                    athlete, athlete.access_token,
+                    progress=lambda page, stats: report_progress(job, page, stats),
+                )
+        if stats.get('inserted') or stats.get('updated') or stats.get('deleted'):
+            render_heatmap(athlete)
+    except requests.exceptions.HTTPError as e:
+        status = e.response.status_code if e.response is not None else 'Unknown'
+        _finish(job, SyncJob.FAILED, error=f"Strava API error {status}")
+    except Exception:
+        _finish(job, SyncJob.FAILED, error=traceback.format_exc(limit=5))
+    else:
+        _finish(job, SyncJob.DONE, **stats)
+    job.refresh_from_db()
+    return job
+
+
+def _finish(job, status, **fields):
+    SyncJob.objects.filter(id=job.id).update(status=status, finished_at=timezone.now(), **fields)
+
+
+def job_payload(job):
+    """Estado de un trabajo para el endpoint JSON de la página."""
+    if job is None:
+        return {'status': None}
+    payload = {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'pages': job.pages,
+        'inserted': job.inserted,
+        'updated': job.updated,
+        'unchanged': job.unchanged,
+        'deleted': job.deleted,
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+    if job.status == SyncJob.FAILED:
+        # Solo la última línea: el traceback completo queda en la DB
+        payload['error'] = job.error.strip().splitlines()[-1] if job.error.strip() else 'Sync failed'
+    return payload
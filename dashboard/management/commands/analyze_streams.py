@@ -0,0 +1,27 @@
+import time
+from django.core.management.base import BaseCommand
+from dashboard.analysis import get_analysis
+from dashboard.models import Activity
+
+
+class Command(BaseCommand):
+    help = 'Calcula (o recalcula) el análisis de streams de las actividades: mejores esfuerzos, zonas y NP.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--athlete', type=int, help='Procesar solo este atleta (Strava ID).')
+        parser.add_argument('--force', action='store_true', help='Recalcular aunque el análisis esté al día.')
+
+    def handle(self, *args, **options):
+        activities = Activity.objects.filter(stream__sample_count__gt=0).only('id')
+        if options['athlete'] is not None:
+            activities = activities.filter(athlete_id=options['athlete'])
+
+        started = time.monotonic()
+        count = 0
+        for activity in activities.iterator(chunk_size=500):
+            get_analysis(activity, force=options['force'])
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Analyzed {count} activities in {time.monotonic() - started:.1f}s."
+        ))
@@ -0,0 +1,134 @@
+"""
+Mide la base de datos configurada (SQLite o PostgreSQL, ver STRAVA_DB_ENGINE
+en settings.py) con un atleta sintético: el ritmo de la ingesta por lotes
+(`bulk_upsert_activities`) y la latencia de las vistas del dashboard y de la
+API, con la caché fría (generación nueva en cada petición) y caliente. El
+atleta y sus datos se borran al terminar salvo con --keep.
+
+python manage.py benchmark_db
+python manage.py benchmark_db --activities 5000 --repeat 10
+STRAVA_DB_ENGINE=postgresql python manage.py benchmark_db
+
+Para comparar los dos backends se ejecuta una vez con cada uno; PostgreSQL
+debe estar levantado como servicio local y migrado (`python manage.py migrate`).
+"""
+import statistics
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+from django.utils import timezone
+from dashboard.cache import bump_generation
+from dashboard.ingest import bulk_upsert_activities
+from dashboard.models import Athlete
+
+ACTIVITY_TYPES = ['Run', 'Ride', 'Swim', 'Walk', 'Hike']
+
+DASHBOARD_URLS = [
+    'index', 'activities', 'weekly_view', 'monthly_view', 'training_view', 'year_over_year',
+    'api_summary', 'api_weekly', 'api_monthly', 'api_activities',
+]
+
+
+def synthetic_activities(athlete_id, count, now):
+    """`count` actividades con la forma de la API, una cada ~20 horas hacia atrás desde `now`."""
+    items = []
+    for i in range(count):
+        start = (now - timedelta(hours=20 * i)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        latlng = [19.0 + (i * 37 % 100) / 100, -99.5 + (i * 61 % 100) / 100]
+        items.append({
+            'id': athlete_id * 1000000 + i,
+            'name': f'Benchmark {i}',
+            'distance': 3000.0 + (i * 7919) % 40000,
+            'moving_time': 1200 + (i * 131) % 7200,
+            'elapsed_time': 1500 + (i * 131) % 7200,
+            'total_elevation_gain': float((i * 17) % 600),
+            'type': ACTIVITY_TYPES[i % len(ACTIVITY_TYPES)],
+            'sport_type': ACTIVITY_TYPES[i % len(ACTIVITY_TYPES)],
+            'average_speed': 2.5 + (i % 50) / 10,
+            'max_speed': 5.0 + (i % 50) / 10,
+            'has_heartrate': i % 3 != 0,
+            'average_heartrate': 120.0 + i % 40 if i % 3 else None,
+            'start_date': start,
+            'start_date_local': start,
+            'timezone': '(GMT-06:00) America/Mexico_City',
+            'map': {'summary_polyline': None},
+            'start_latlng': latlng,
+            'end_latlng': latlng,
+        })
+    return items
+
+
+class Command(BaseCommand):
+    help = 'Mide la ingesta y la latencia del dashboard sobre la base de datos configurada.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--activities', type=int, default=2000, help='Actividades del atleta sintético.')
+        parser.add_argument('--page-size', type=int, default=200,
+                            help='Actividades por llamada a la ingesta (una página de la API).')
+        parser.add_argument('--repeat', type=int, default=5, help='Peticiones por vista y modo de caché.')
+        parser.add_argument('--athlete-id', type=int, default=999999, help='ID del atleta sintético.')
+        parser.add_argument('--keep', action='store_true', help='No borrar el atleta sintético al terminar.')
+
+    def handle(self, *args, **options):
+        athlete_id = options['athlete_id']
+        if Athlete.objects.filter(id=athlete_id).exists():
+            raise CommandError(f"Athlete {athlete_id} already exists; pass another --athlete-id")
+
+        database = settings.DATABASES['default']
+        self.stdout.write(f"Backend: {connection.vendor} ({database['NAME']}), "
+                          f"CONN_MAX_AGE={database.get('CONN_MAX_AGE', 0)}")
+
+        athlete = Athlete.objects.create(
+            id=athlete_id, firstname='Benchmark', lastname='Athlete',
+            access_token='benchmark', refresh_token='benchmark', expires_at=2 ** 31 - 1,
+        )
+        try:
+            items = synthetic_activities(athlete_id, options['activities'], timezone.now().replace(microsecond=0))
+            self.benchmark_sync(athlete, items, max(1, options['page_size']))
+            self.benchmark_views(athlete, max(1, options['repeat']))
+        finally:
+            if not options['keep']:
+                athlete.delete()
+
+    def benchmark_sync(self, athlete, items, page_size):
+        """Historial completo por páginas, una resincronización sin cambios y una con todo modificado."""
+        for label, pages in [
+            ('initial import', items),
+            ('resync, unchanged', items),
+            ('resync, all updated', [{**item, 'name': item['name'] + ' (edited)'} for item in items]),
+        ]:
+            started = time.perf_counter()
+            for start in range(0, len(pages), page_size):
+                bulk_upsert_activities(athlete, pages[start:start + page_size])
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(
+                f"sync {label}: {len(pages)} activities in {elapsed:.2f} s ({len(pages) / elapsed:,.0f}/s)"
+            ))
+
+    def benchmark_views(self, athlete, repeat):
+        factory = RequestFactory()
+        for name in DASHBOARD_URLS:
+            path = reverse(name)
+            view = resolve(path).func
+            timings = {'cold': [], 'warm': []}
+            for _ in range(repeat):
+                for mode in ('cold', 'warm'):
+                    if mode == 'cold':
+                        bump_generation(athlete)
+                    request = factory.get(path)
+                    request.athlete = athlete
+                    request.session = {}
+                    started = time.perf_counter()
+                    response = view(request)
+                    timings[mode].append(time.perf_counter() - started)
+                    if response.status_code != 200:
+                        raise CommandError(f"{path} returned {response.status_code}")
+            self.stdout.write(
+                f"{path}: cold median {statistics.median(timings['cold']) * 1000:.1f} ms, "
+                f"warm median {statistics.median(timings['warm']) * 1000:.1f} ms"
+            )
@@ -0,0 +1,79 @@
+"""
+Mide el decodificador FIT (dashboard/fit.py) sobre ficheros reales o, sin
+argumentos, sobre un FIT sintético de varias horas a 1 Hz:
+
+python manage.py benchmark_fit
+python manage.py benchmark_fit --hours 8 --repeat 10
+python manage.py benchmark_fit /path/to/activity.fit
+
+"""
+import os
+import statistics
+import struct
+import tempfile
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from dashboard.fit import FitError, encode_fit, read_fit
+
+
+def synthetic_samples(hours):
+    """Muestras de una salida de `hours` horas a 1 Hz con todos los canales."""
+    return [
+        {
+            'time': second,
+            'lat': 19.4 + second * 1e-5,
+            'lng': -99.1 + (second % 600) * 1e-5,
+            'altitude': 2240 + (second % 300) / 10,
+            'heartrate': 120 + second % 40,
+            'cadence': 85 + second % 5,
+            'distance': second * 7.5,
+            'watts': 180 + second % 60,
+        }
+        for second in range(int(hours * 3600))
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Mide el tiempo de decodificación de ficheros FIT.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help='Ficheros .fit (por defecto, uno sintético).')
+        parser.add_argument('--hours', type=float, default=4, help='Duración del FIT sintético.')
+        parser.add_argument('--repeat', type=int, default=5, help='Decodificaciones por fichero.')
+
+    def handle(self, *args, **options):
+        paths = options['paths']
+        synthetic = None
+        if not paths:
+            start = datetime(2024, 1, 1, 7, tzinfo=dt_timezone.utc)
+            with tempfile.NamedTemporaryFile(suffix='.fit', delete=False) as f:
+                f.write(encode_fit(synthetic_samples(options['hours']), start))
+            synthetic = f.name
+            paths = [synthetic]
+
+        try:
+            for path in paths:
+                self.benchmark(path, max(1, options['repeat']))
+        finally:
+            if synthetic:
+                os.unlink(synthetic)
+
+    def benchmark(self, path, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            try:
+                decoded = read_fit(path)
+            except (OSError, struct.error, FitError) as e:
+                raise CommandError(f"Cannot decode {path}: {e}")
+            timings.append(time.perf_counter() - started)
+
+        samples = len(decoded[1]['time']) if decoded else 0
+        best = min(timings)
+        self.stdout.write(self.style.SUCCESS(
+            f"{os.path.basename(path)}: {os.path.getsize(path) / 1024:.0f} KB, {samples} samples, "
+            f"best {best * 1000:.1f} ms, median {statistics.median(timings) * 1000:.1f} ms "
+            f"({samples / best:,.0f} samples/s)"
+        ))
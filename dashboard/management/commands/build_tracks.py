@@ -0,0 +1,25 @@
+import time
+from django.core.management.base import BaseCommand
+from dashboard.models import Activity
+from dashboard.routes import backfill_routes
+from dashboard.tracks import backfill_tracks
+
+
+class Command(BaseCommand):
+    help = 'Precalcula los trazados simplificados del mapa y las huellas de ruta de las actividades que aún no los tienen.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--athlete', type=int, help='Procesar solo este atleta (Strava ID).')
+
+    def handle(self, *args, **options):
+        activities = Activity.objects.all()
+        if options['athlete'] is not None:
+            activities = activities.filter(athlete_id=options['athlete'])
+
+        started = time.monotonic()
+        tracks = backfill_tracks(activities)
+        routes = backfill_routes(activities)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Built {tracks} tracks and {routes} route fingerprints in {time.monotonic() - started:.1f}s."
+        ))
@@ -0,0 +1,35 @@
+"""
+Aciertos y fallos de la caché de vistas del dashboard. Necesita un backend
+compartido entre procesos (STRAVA_CACHE_BACKEND=file o redis): con la memoria
+local los contadores estarían en los procesos del servidor web, no en este.
+
+python manage.py cache_stats
+python manage.py cache_stats --reset
+
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from dashboard.cache import get_stats, reset_stats, stats_enabled
+
+
+class Command(BaseCommand):
+    help = 'Muestra los aciertos y fallos de la caché de vistas del dashboard.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Pone los contadores a cero.')
+
+    def handle(self, *args, **options):
+        if not stats_enabled():
+            raise CommandError(
+                f"The '{settings.STRAVA_CACHE_BACKEND}' cache backend is local to each process, so this "
+                "command cannot see the web server's counters (and none are kept). "
+                "Set STRAVA_CACHE_BACKEND=file or redis to collect them."
+            )
+
+        stats = get_stats()
+        self.stdout.write(
+            f"Hits: {stats['hits']}  Misses: {stats['misses']}  Hit ratio: {stats['hit_ratio']:.1%}"
+        )
+        if options['reset']:
+            reset_stats()
+            self.stdout.write(self.style.SUCCESS("Counters reset."))
@@ -0,0 +1,45 @@
+"""
+Exporta el historial de actividades de un atleta (ver dashboard/export.py):
+
+python manage.py export_activities --athlete 123 --format csv --output activities.csv
+python manage.py export_activities --athlete 123 --format columnar --fields id,start_date,distance,moving_time > runs.sacol
+
+"""
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from dashboard.export import CHUNK_SIZE, FORMATS, export_activities
+from dashboard.models import Athlete
+
+
+class Command(BaseCommand):
+    help = 'Exporta las actividades de un atleta en CSV, NDJSON o formato columnar.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--athlete', type=int, required=True, help='Atleta a exportar (Strava ID).')
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--fields', help='Campos separados por comas (por defecto, todos los exportables).')
+        parser.add_argument('--output', help='Fichero de salida (por defecto, la salida estándar).')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Filas leídas de la DB por bloque.')
+
+    def handle(self, *args, **options):
+        athlete = Athlete.objects.filter(id=options['athlete']).first()
+        if athlete is None:
+            raise CommandError(f"Athlete {options['athlete']} not found.")
+
+        fields = [field for field in (options['fields'] or '').split(',') if field]
+        try:
+            stream = export_activities(athlete, options['format'], fields, options['chunk_size'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            written = 0
+            for chunk in stream:
+                output.write(chunk)
+                written += len(chunk)
+        finally:
+            if options['output']:
+                output.close()
+        if options['output']:
+            self.stdout.write(self.style.SUCCESS(f"Wrote {written} bytes to {options['output']}."))
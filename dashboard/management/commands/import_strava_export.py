@@ -0,0 +1,61 @@
+"""
+Importa la exportación de cuenta de Strava (zip) sin usar la API:
+
+python manage.py import_strava_export export_12345678.zip --athlete 12345678 --workers 4
+python manage.py import_strava_export export_12345678.zip --athlete 12345678 --timezone America/Mexico_City
+
+"""
+import zipfile
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.core.management.base import BaseCommand, CommandError
+from dashboard.heatmap import render_heatmap
+from dashboard.ingest import DEFAULT_BATCH_SIZE
+from dashboard.models import Athlete
+from dashboard.strava_export import import_strava_export
+
+
+class Command(BaseCommand):
+    help = 'Importa actividades y streams desde el zip de exportación de cuenta de Strava.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archive', help='Ruta al zip de la exportación.')
+        parser.add_argument('--athlete', type=int, required=True, help='Atleta dueño de la exportación (Strava ID).')
+        parser.add_argument('--workers', type=int, default=1, help='Procesos que leen los GPX/TCX/FIT en paralelo.')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Actividades por lote.')
+        parser.add_argument('--timezone', help='Zona horaria de las horas locales (por defecto, TIME_ZONE).')
+        parser.add_argument('--overwrite', action='store_true',
+                            help='Sobrescribir actividades y streams que ya existen (p. ej. sincronizados desde la API).')
+
+    def handle(self, *args, **options):
+        athlete = Athlete.objects.filter(id=options['athlete']).first()
+        if athlete is None:
+            raise CommandError(f"Athlete {options['athlete']} not found.")
+        try:
+            zone = ZoneInfo(options['timezone']) if options['timezone'] else None
+        except (ZoneInfoNotFoundError, ValueError):
+            raise CommandError(f"Unknown time zone: {options['timezone']}")
+
+        def progress(stats):
+            self.stdout.write(
+                f"{stats['inserted']} inserted, {stats['updated']} updated, "
+                f"{stats['skipped']} skipped, {stats['streams']} streams..."
+            )
+
+        try:
+            stats = import_strava_export(
+                athlete, options['archive'], workers=max(1, options['workers']),
+                batch_size=options['batch_size'], zone=zone, overwrite=options['overwrite'], on_batch=progress,
+            )
+        except (OSError, zipfile.BadZipFile, KeyError) as e:
+            raise CommandError(f"Cannot read {options['archive']}: {e}")
+
+        for error in stats['errors']:
+            self.stderr.write(f"Skipped file {error}")
+        if stats['inserted'] or stats['updated']:
+            render_heatmap(athlete)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {athlete.firstname}: {stats['inserted']} inserted, {stats['updated']} updated, "
+            f"{stats['unchanged']} unchanged, {stats['skipped']} skipped, "
+            f"{stats['streams']} streams saved, {stats['failed']} unreadable files"
+        ))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from dashboard.models import Athlete
+from dashboard.rollups import rebuild_rollups
+from dashboard.streaks import recompute_streak
+from dashboard.yearly import rebuild_yearly_progress
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye desde cero los agregados diarios (DailyRollup), las rachas y el progreso anual de los atletas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--athlete', type=int, help='Reconstruir solo este atleta (Strava ID).')
+
+    def handle(self, *args, **options):
+        created = rebuild_rollups(options['athlete'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {created} daily rollup rows."))
+
+        athletes = Athlete.objects.all()
+        if options['athlete'] is not None:
+            athletes = athletes.filter(id=options['athlete'])
+        for athlete_id in athletes.values_list('id', flat=True):
+            recompute_streak(athlete_id)
+            rebuild_yearly_progress(athlete_id)
+        self.stdout.write(self.style.SUCCESS(f"Recomputed streaks and yearly progress for {len(athletes)} athletes."))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from dashboard.cache import bump_generation
+from dashboard.models import Athlete
+from dashboard.rollups import rebuild_rollups
+from dashboard.training import rebuild_training_load, recompute_activity_loads
+
+
+class Command(BaseCommand):
+    help = ('Recalcula la carga de entrenamiento de las actividades y la serie fitness/fatigue/form '
+            '(tras migrar o al cambiar STRAVA_MAX_HEARTRATE / STRAVA_RESTING_HEARTRATE).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--athlete', type=int, help='Recalcular solo este atleta (Strava ID).')
+
+    def handle(self, *args, **options):
+        athletes = Athlete.objects.all()
+        if options['athlete'] is not None:
+            athletes = athletes.filter(id=options['athlete'])
+
+        for athlete in athletes:
+            changed = recompute_activity_loads(athlete.id)
+            if changed:
+                # Los agregados diarios suman la carga de cada actividad
+                rebuild_rollups(athlete.id)
+            days = rebuild_training_load(athlete.id)
+            bump_generation(athlete)
+            self.stdout.write(self.style.SUCCESS(
+                f"{athlete.firstname}: {changed} activity loads updated, {days} days of training load."
+            ))
@@ -0,0 +1,24 @@
+"""
+CronJobs (solo si no está corriendo `run_sync_worker`, que ya lo hace):
+
+# Renovar por adelantado los tokens de Strava que caducan en la próxima media hora
+*/10 * * * * /path/to/venv/bin/python /path/to/project/manage.py refresh_tokens >> /path/to/project/logs/refresh_tokens.log 2>&1
+
+"""
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from dashboard.tokens import REFRESH_AHEAD, refresh_expiring_tokens
+
+
+class Command(BaseCommand):
+    help = 'Renueva los tokens de Strava que están a punto de caducar.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=int(REFRESH_AHEAD.total_seconds() // 60),
+                            help='Renovar los que caducan en menos de estos minutos.')
+
+    def handle(self, *args, **options):
+        refreshed, failed = refresh_expiring_tokens(timedelta(minutes=options['ahead']))
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {refreshed} tokens."))
+        if failed:
+            self.stderr.write(f"Could not refresh athletes: {', '.join(map(str, failed))}")
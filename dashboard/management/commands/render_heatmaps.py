@@ -0,0 +1,32 @@
+"""
+CronJobs:
+
+# Después de la sincronización diaria; solo redibuja las teselas de las actividades nuevas
+30 2 * * * /path/to/venv/bin/python /path/to/project/manage.py render_heatmaps >> /path/to/project/logs/render_heatmaps.log 2>&1
+
+"""
+import time
+from django.core.management.base import BaseCommand
+from dashboard.heatmap import render_heatmap
+from dashboard.models import Athlete
+
+
+class Command(BaseCommand):
+    help = 'Renderiza las teselas del mapa de calor de las actividades nuevas de cada atleta.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--athlete', type=int, help='Procesar solo este atleta (Strava ID).')
+        parser.add_argument('--full', action='store_true', help='Borrar y reconstruir todas las teselas.')
+
+    def handle(self, *args, **options):
+        athletes = Athlete.objects.all()
+        if options['athlete'] is not None:
+            athletes = athletes.filter(id=options['athlete'])
+
+        for athlete in athletes:
+            started = time.monotonic()
+            activities, tiles = render_heatmap(athlete, full=options['full'])
+            self.stdout.write(self.style.SUCCESS(
+                f"{athlete.firstname}: drew {activities} activities into {tiles} tiles "
+                f"in {time.monotonic() - started:.1f}s."
+            ))
@@ -0,0 +1,64 @@
+"""
+Worker de la cola de sincronizaciones (dashboard/jobs.py).
+
+Se deja corriendo junto al servidor web, p. ej. con systemd o supervisor:
+/path/to/venv/bin/python /path/to/project/manage.py run_sync_worker
+
+También renueva cada pocos minutos los tokens de Strava que están a punto de
+caducar (ver dashboard/tokens.py), así que con el worker en marcha no hace
+falta el cron de `refresh_tokens`.
+
+"""
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from dashboard.jobs import claim_next_job, requeue_stale_jobs, run_job, worker_name
+from dashboard.tokens import refresh_expiring_tokens
+
+# Cada cuántos segundos se renuevan los tokens que caducan pronto (muy por debajo de `REFRESH_AHEAD`)
+TOKEN_REFRESH_INTERVAL = 5 * 60
+
+
+class Command(BaseCommand):
+    help = 'Procesa las sincronizaciones encoladas desde el dashboard.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Procesar los trabajos pendientes y salir.')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Segundos de espera cuando la cola está vacía.')
+
+    def handle(self, *args, **options):
+        worker = worker_name()
+        self.stdout.write(self.style.NOTICE(f"Sync worker {worker} started."))
+        next_token_refresh = 0
+
+        while True:
+            # Conexiones caídas o demasiado viejas en un proceso de larga duración
+            close_old_connections()
+
+            if time.monotonic() >= next_token_refresh:
+                refreshed, failed = refresh_expiring_tokens()
+                if refreshed or failed:
+                    self.stdout.write(f"Refreshed {refreshed} tokens ({len(failed)} failed).")
+                next_token_refresh = time.monotonic() + TOKEN_REFRESH_INTERVAL
+
+            recovered = requeue_stale_jobs()
+            if recovered:
+                self.stdout.write(self.style.WARNING(f"Requeued {recovered} stale jobs."))
+
+            job = claim_next_job(worker)
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+
+            started = time.monotonic()
+            self.stdout.write(f"Job {job.id}: {job} (attempt {job.attempts})...")
+            job = run_job(job)
+            style = self.style.SUCCESS if job.status == job.DONE else self.style.ERROR
+            self.stdout.write(style(
+                f"Job {job.id}: {job.status} in {time.monotonic() - started:.1f}s "
+                f"({job.inserted} inserted, {job.updated} updated){': ' + job.error.strip().splitlines()[-1] if job.error else ''}"
+            ))
+
+        self.stdout.write(self.style.NOTICE('Sync worker finished.'))
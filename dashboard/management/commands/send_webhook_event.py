@@ -0,0 +1,71 @@
+"""
+Envía al endpoint del webhook eventos con el mismo formato que los de Strava,
+para probar la ingesta por eventos en local sin una suscripción real:
+
+python manage.py send_webhook_event handshake
+python manage.py send_webhook_event create --athlete 123 --activity 456
+python manage.py send_webhook_event update --athlete 123 --activity 456 --title "Morning Run"
+python manage.py send_webhook_event delete --athlete 123 --activity 456
+python manage.py send_webhook_event deauthorize --athlete 123
+
+Los eventos solo se encolan: los procesa `run_sync_worker`.
+"""
+import secrets
+import time
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Envía un evento de prueba del webhook de Strava al servidor local.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('event', choices=['handshake', 'create', 'update', 'delete', 'deauthorize'])
+        parser.add_argument('--url', default='http://127.0.0.1:8000/webhook/', help='URL del endpoint del webhook.')
+        parser.add_argument('--athlete', type=int, help='Atleta dueño del evento (Strava ID).')
+        parser.add_argument('--activity', type=int, help='Actividad del evento (Strava ID).')
+        parser.add_argument('--title', help='Nuevo título (solo en `update`).')
+
+    def handle(self, *args, **options):
+        if options['event'] == 'handshake':
+            return self.handshake(options['url'])
+
+        if options['athlete'] is None:
+            raise CommandError('--athlete is required.')
+        if options['event'] != 'deauthorize' and options['activity'] is None:
+            raise CommandError('--activity is required for activity events.')
+
+        response = requests.post(options['url'], json=self.build_event(options), timeout=10)
+        self.stdout.write(f"{response.status_code} {response.text}")
+        if response.status_code != 200:
+            raise CommandError('The webhook did not accept the event.')
+
+    def handshake(self, url):
+        """Lo que hace Strava al crear la suscripción: el endpoint debe repetir el challenge."""
+        challenge = secrets.token_urlsafe(16)
+        response = requests.get(url, params={
+            'hub.mode': 'subscribe',
+            'hub.challenge': challenge,
+            'hub.verify_token': settings.STRAVA_WEBHOOK_VERIFY_TOKEN,
+        }, timeout=10)
+        if response.status_code != 200 or response.json().get('hub.challenge') != challenge:
+            raise CommandError(f"Handshake failed: {response.status_code} {response.text}")
+        self.stdout.write(self.style.SUCCESS('Handshake OK.'))
+
+    def build_event(self, options):
+        event = {
+            'object_type': 'activity',
+            'object_id': options['activity'],
+            'aspect_type': options['event'],
+            'owner_id': options['athlete'],
+            'subscription_id': int(settings.STRAVA_WEBHOOK_SUBSCRIPTION_ID or 1),
+            'event_time': int(time.time()),
+            'updates': {},
+        }
+        if options['event'] == 'update' and options['title']:
+            event['updates'] = {'title': options['title']}
+        elif options['event'] == 'deauthorize':
+            event.update(object_type='athlete', object_id=options['athlete'], aspect_type='update',
+                         updates={'authorized': 'false'})
+        return event
@@ -5,70 +5,50 @@ CronJobs:
 # Asegúrate de usar la ruta completa al entorno y manage.py
 0 3 * * * /path/to/venv/bin/python /path/to/project/manage.py sync_maps >> /path/to/project/logs/sync_maps.log 2>&1
 
+# Por defecto es incremental (ver dashboard/maps.py); para volver a revisar todas las actividades:
+/path/to/venv/bin/python /path/to/project/manage.py sync_maps --full
+
 """
 from django.core.management.base import BaseCommand
-from dashboard.models import Activity, Athlete
-from dashboard.views import get_session, refresh_strava_token
-from django.conf import settings
-from datetime import datetime
-import json
-from django.utils import timezone
+from dashboard.models import Athlete
+from dashboard.tokens import refresh_strava_token
+from dashboard.strava_api import get_client
+from dashboard.heatmap import render_heatmap
+from dashboard.maps import sync_maps
+from datetime import timedelta
+import requests
 
 class Command(BaseCommand):
-    help = 'Syncs map data (polyline) for all existing activities'
+    help = 'Syncs map data (polyline, start/end points) of the activities changed since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--athlete', type=int, help='Procesar solo este atleta (Strava ID).')
+        parser.add_argument('--full', action='store_true', help='Revisar todas las actividades, no solo desde el checkpoint.')
+        parser.add_argument('--overlap-days', type=int, default=1,
+                            help='Días antes del checkpoint que se vuelven a revisar (ediciones recientes).')
 
     def handle(self, *args, **options):
         athletes = Athlete.objects.all()
-        for athlete in athletes:
-            if athlete.is_token_expired():
-                athlete = refresh_strava_token(athlete)
-            
-            self.stdout.write(f"Syncing activities for {athlete.firstname}...")
-            
-            access_token = athlete.access_token
-            activities_url = f"{settings.STRAVA_API_URL}/athlete/activities"
-            page = 1
-            updated_count = 0
+        if options['athlete'] is not None:
+            athletes = athletes.filter(id=options['athlete'])
 
-            with get_session() as s:
-                while True:
-                    params = {
-                        'page': page,
-                        'per_page': 50,
-                    }
-                    headers = {'Authorization': f'Bearer {access_token}'}
-                    response = s.get(activities_url, headers=headers, params=params)
-                    
-                    if response.status_code != 200:
-                        self.stderr.write(f"Error fetching page {page}: {response.text}")
-                        break
-                        
-                    strava_activities = response.json()
-                    if not strava_activities:
-                        break
+        for athlete in athletes:
+            self.stdout.write(f"Syncing map data for {athlete.firstname}...")
+            try:
+                if athlete.is_token_expired():
+                    athlete = refresh_strava_token(athlete)
+                stats = sync_maps(
+                    athlete, get_client(), full=options['full'], overlap=timedelta(days=options['overlap_days']),
+                )
+            except requests.exceptions.RequestException as e:
+                # Las páginas ya procesadas quedan en el checkpoint: la próxima ejecución sigue desde ahí
+                self.stderr.write(f"Error fetching activities for {athlete.firstname}: {e}")
+                continue
 
-                    for item in strava_activities:
-                        activity_id = item['id']
-                        try:
-                            activity = Activity.objects.get(id=activity_id)
-                            
-                            # Extraer datos de mapa
-                            map_data = item.get('map', {})
-                            summary_polyline = map_data.get('summary_polyline')
-                            start_latlng = item.get('start_latlng')
-                            end_latlng = item.get('end_latlng')
-                            
-                            activity.summary_polyline = summary_polyline
-                            activity.start_latlng = json.dumps(start_latlng) if start_latlng else None
-                            activity.end_latlng = json.dumps(end_latlng) if end_latlng else None
-                            activity.save()
-                            updated_count += 1
-                        except Activity.DoesNotExist:
-                            # Si no existe, la creamos (opcional, pero fetch_and_sync_activities ya lo hace)
-                            continue
-                    
-                    page += 1
-                    if len(strava_activities) < 50:
-                        break
-            
-            self.stdout.write(self.style.SUCCESS(f"Successfully updated {updated_count} activities for {athlete.firstname}"))
+            if stats['polylines']:
+                render_heatmap(athlete)
+            self.stdout.write(self.style.SUCCESS(
+                f"{athlete.firstname}: {stats['pages']} pages, {stats['updated']} updated "
+                f"({stats['polylines']} new polylines), {stats['unchanged']} unchanged, "
+                f"{stats['missing']} not yet synced"
+            ))
@@ -5,52 +5,136 @@ CronJobs:
 # Asegúrate de usar la ruta completa al entorno y manage.py
 0 2 * * * /path/to/venv/bin/python /path/to/project/manage.py sync_strava_data >> /path/to/project/logs/sync_strava_data.log 2>&1
 
+# Con varios atletas se pueden sincronizar en paralelo:
+0 2 * * * /path/to/venv/bin/python /path/to/project/manage.py sync_strava_data --workers 4 >> /path/to/project/logs/sync_strava_data.log 2>&1
+
 """
 # Crear la estructura de directorios: dashboard/management/commands/
 from django.core.management.base import BaseCommand
 from django.conf import settings
+from django.db import connection
 from dashboard.models import Athlete
-from dashboard.views import fetch_and_sync_activities, refresh_strava_token
+from dashboard.views import fetch_and_sync_activities
+from dashboard.tokens import refresh_strava_token
+from dashboard.ingest import DEFAULT_BATCH_SIZE
+from dashboard.heatmap import render_heatmap
+from concurrent.futures import ThreadPoolExecutor
 import requests
+import threading
+import time
 from django.db.models import Max
 
 class Command(BaseCommand):
     help = 'Sincroniza las actividades de Strava para todos los atletas.'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help='Actividades por transacción al escribir en la DB.'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Número de atletas a sincronizar en paralelo.'
+        )
+
     def handle(self, *args, **options):
         self.stdout.write(self.style.NOTICE('Starting Strava data synchronization...'))
-        
+
         # Iterar sobre todos los atletas con tokens de acceso
-        athletes = Athlete.objects.all()
-        
+        athletes = list(Athlete.objects.all())
+
         if not athletes:
             self.stdout.write(self.style.WARNING("No athletes found in the database."))
             return
 
-        for athlete in athletes:
-            self.stdout.write(self.style.NOTICE(f"Processing athlete: {athlete.id} ({athlete.firstname} {athlete.lastname})"))
-
-            try:
-                # 1. Refrescar el token si es necesario
-                if athlete.is_token_expired():
-                    self.stdout.write(self.style.WARNING("Token is expired, refreshing..."))
-                    athlete = refresh_strava_token(athlete)
-                
-                # 2. Sincronizar actividades
-                new_count = fetch_and_sync_activities(athlete, athlete.access_token)
-                
-                self.stdout.write(self.style.SUCCESS(
-                    f"Successfully synced {new_count} new activities for {athlete.firstname}."
-                ))
-                
-            except requests.exceptions.RequestException as e:
-                self.stdout.write(self.style.ERROR(
-                    f"API Error for {athlete.firstname}: {e.response.status_code if e.response else 'Unknown'}."
-                    "Skipping this athlete."
-                ))
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(
-                    f"Unexpected error for {athlete.firstname}: {e}. Skipping this athlete."
-                ))
-
-        self.stdout.write(self.style.NOTICE('Strava data synchronization finished.'))
\ No newline at end of file
+        self.batch_size = options['batch_size']
+        # El límite de peticiones de Strava lo reparte el cliente compartido (`strava_api.get_client`)
+        # SQLite admite un solo escritor: las escrituras de todos los hilos pasan por este lock
+        self.write_lock = threading.Lock()
+        self.output_lock = threading.Lock()
+
+        workers = max(1, options['workers'])
+        if workers == 1:
+            results = [self.sync_athlete(athlete) for athlete in athletes]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(self.sync_athlete_in_thread, athletes))
+
+        self.write_summary(results)
+        self.stdout.write(self.style.NOTICE('Strava data synchronization finished.'))
+
+    def log(self, message):
+        with self.output_lock:
+            self.stdout.write(message)
+
+    def sync_athlete_in_thread(self, athlete):
+        try:
+            return self.sync_athlete(athlete)
+        finally:
+            # Cada hilo abre su propia conexión a la DB; la cerramos al terminar
+            connection.close()
+
+    def sync_athlete(self, athlete):
+        """Sincroniza un atleta y devuelve una fila para el resumen final."""
+        self.log(self.style.NOTICE(f"Processing athlete: {athlete.id} ({athlete.firstname} {athlete.lastname})"))
+        result = {'athlete': athlete, 'status': 'ok', 'stats': None, 'elapsed': 0.0}
+        started = time.monotonic()
+
+        try:
+            # 1. Refrescar el token si es necesario
+            if athlete.is_token_expired():
+                self.log(self.style.WARNING(f"Token is expired for {athlete.firstname}, refreshing..."))
+                # La petición a Strava va sin el lock: solo lo toma el UPDATE de los tokens
+                athlete = refresh_strava_token(athlete, write_lock=self.write_lock)
+
+            # 2. Sincronizar actividades
+            stats = fetch_and_sync_activities(
+                athlete, athlete.access_token,
+                batch_size=self.batch_size,
+                write_lock=self.write_lock,
+            )
+            result['stats'] = stats
+
+            # 3. Dibujar las actividades nuevas o modificadas en el mapa de calor
+            # (el rasterizado va sin el lock: solo lo toma la publicación de la versión nueva)
+            if stats['inserted'] or stats['updated']:
+                render_heatmap(athlete, write_lock=self.write_lock)
+
+            result['elapsed'] = time.monotonic() - started
+            processed = sum(stats.values())
+
+            self.log(self.style.SUCCESS(
+                f"Synced {athlete.firstname}: {stats['inserted']} inserted, {stats['updated']} updated, "
+                f"{stats['unchanged']} unchanged in {result['elapsed']:.1f}s "
+                f"({processed / result['elapsed'] if result['elapsed'] else 0:.0f} activities/s)."
+            ))
+
+        except requests.exceptions.RequestException as e:
+            result['status'] = f"API error {e.response.status_code if e.response is not None else 'Unknown'}"
+            self.log(self.style.ERROR(
+                f"API Error for {athlete.firstname}: {e.response.status_code if e.response is not None else 'Unknown'}. "
+                "Skipping this athlete."
+            ))
+        except Exception as e:
+            result['status'] = f"error: {e}"
+            self.log(self.style.ERROR(
+                f"Unexpected error for {athlete.firstname}: {e}. Skipping this athlete."
+            ))
+
+        result['elapsed'] = time.monotonic() - started
+        return result
+
+    def write_summary(self, results):
+        """Imprime una tabla con el resultado de cada atleta."""
+        self.stdout.write(self.style.NOTICE('Summary:'))
+        self.stdout.write(f"{'Athlete':<30} {'Inserted':>9} {'Updated':>9} {'Unchanged':>10} {'Time (s)':>9}  Status")
+        for result in results:
+            athlete = result['athlete']
+            stats = result['stats'] or {'inserted': 0, 'updated': 0, 'unchanged': 0}
+            name = f"{athlete.firstname} {athlete.lastname} ({athlete.id})"
+            line = (
+                f"{name[:30]:<30} {stats['inserted']:>9} {stats['updated']:>9} "
+                f"{stats['unchanged']:>10} {result['elapsed']:>9.1f}  {result['status']}"
+            )
+            style = self.style.SUCCESS if result['status'] == 'ok' else self.style.ERROR
+            self.stdout.write(style(line))
@@ -0,0 +1,60 @@
+"""
+CronJobs:
+
+# Descarga los streams pendientes poco a poco (como mucho --limit actividades por atleta y ejecución)
+# para no agotar el límite de peticiones de Strava en un solo backfill.
+*/30 * * * * /path/to/venv/bin/python /path/to/project/manage.py sync_streams --limit 40 >> /path/to/project/logs/sync_streams.log 2>&1
+
+"""
+from django.core.management.base import BaseCommand
+from dashboard.cache import bump_generation
+from dashboard.models import Athlete
+from dashboard.tokens import refresh_strava_token
+from dashboard.strava_api import get_client
+from dashboard.streams import pending_activities, save_api_streams, save_stream_arrays
+import requests
+
+
+class Command(BaseCommand):
+    help = 'Descarga los streams (series por segundo) de las actividades que aún no los tienen.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, default=50,
+            help='Máximo de actividades a descargar por atleta en esta ejecución.'
+        )
+        parser.add_argument('--athlete', type=int, help='Procesar solo este atleta (Strava ID).')
+
+    def handle(self, *args, **options):
+        athletes = Athlete.objects.all()
+        if options['athlete'] is not None:
+            athletes = athletes.filter(id=options['athlete'])
+
+        client = get_client()
+        for athlete in athletes:
+            if athlete.is_token_expired():
+                try:
+                    athlete = refresh_strava_token(athlete)
+                except requests.exceptions.RequestException as e:
+                    # Un refresh token revocado no debe dejar sin streams al resto de atletas
+                    self.stderr.write(f"Error refreshing token for {athlete.firstname}: {e}")
+                    continue
+
+            fetched = 0
+            for activity in pending_activities(athlete, options['limit']):
+                try:
+                    payload = client.get_streams(athlete.access_token, activity.id)
+                except requests.exceptions.HTTPError as e:
+                    if e.response is not None and e.response.status_code == 404:
+                        # Actividad manual o sin GPS: guardamos un stream vacío para no reintentarlo
+                        save_stream_arrays(activity.id, {})
+                        continue
+                    self.stderr.write(f"Error fetching streams for activity {activity.id}: {e}")
+                    break
+                save_api_streams(activity.id, payload)
+                fetched += 1
+
+            if fetched:
+                # El análisis de las actividades cambió (p. ej. las respuestas de la API JSON)
+                bump_generation(athlete)
+            self.stdout.write(self.style.SUCCESS(f"Fetched streams for {fetched} activities of {athlete.firstname}"))
@@ -0,0 +1,48 @@
+"""
+Gestiona la suscripción de la aplicación al webhook de Strava (hay una como máximo):
+
+python manage.py webhook_subscription create https://example.com/webhook/
+python manage.py webhook_subscription show
+python manage.py webhook_subscription delete
+
+Al crearla Strava hace el handshake contra la URL, así que el servidor debe
+estar accesible y con el mismo STRAVA_WEBHOOK_VERIFY_TOKEN. Guarda el ID que
+se imprime en STRAVA_WEBHOOK_SUBSCRIPTION_ID.
+"""
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from dashboard.strava_api import get_client
+
+
+class Command(BaseCommand):
+    help = 'Crea, muestra o borra la suscripción al webhook de Strava.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['create', 'show', 'delete'])
+        parser.add_argument('callback_url', nargs='?', help='URL pública del endpoint (solo en `create`).')
+
+    def handle(self, *args, **options):
+        client = get_client()
+        try:
+            if options['action'] == 'create':
+                if not options['callback_url']:
+                    raise CommandError('callback_url is required.')
+                if not settings.STRAVA_WEBHOOK_VERIFY_TOKEN:
+                    raise CommandError('Set STRAVA_WEBHOOK_VERIFY_TOKEN first.')
+                subscription = client.create_subscription(options['callback_url'], settings.STRAVA_WEBHOOK_VERIFY_TOKEN)
+                self.stdout.write(self.style.SUCCESS(f"Subscription {subscription['id']} created."))
+                return
+
+            subscriptions = client.list_subscriptions()
+            if not subscriptions:
+                self.stdout.write('No subscription.')
+                return
+            for subscription in subscriptions:
+                if options['action'] == 'delete':
+                    client.delete_subscription(subscription['id'])
+                    self.stdout.write(self.style.SUCCESS(f"Subscription {subscription['id']} deleted."))
+                else:
+                    self.stdout.write(f"Subscription {subscription['id']}: {subscription['callback_url']}")
+        except requests.exceptions.HTTPError as e:
+            raise CommandError(f"Strava API error: {e.response.text if e.response is not None else e}")
@@ -0,0 +1,105 @@
+"""
+Sincronización incremental de los datos de mapa (polilínea y puntos de
+inicio y fin) que hace `manage.py sync_maps`.
+
+En lugar de recorrer cada noche todas las páginas de todos los atletas, cada
+atleta guarda un `MapSyncCheckpoint`: la fecha de la actividad más reciente
+ya reconciliada. Con `after` la API devuelve las actividades en orden
+cronológico ascendente, así que el checkpoint avanza tras cada página y una
+ejecución interrumpida (límite de peticiones, error de red) continúa donde
+se quedó. Solo se listan las actividades posteriores al checkpoint, con un
+margen para las ediciones recientes, o desde la más antigua que aún no tiene
+datos de mapa (`summary_polyline` NULL).
+
+Cada página se compara con la DB antes de escribir: solo se guardan las
+actividades que cambiaron, con un `bulk_update` de los campos de mapa.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Min
+
+from .cache import bump_generation
+from .ingest import MAP_FIELDS, map_values, parse_strava_datetime
+from .models import Activity, MapSyncCheckpoint
+from .routes import refresh_routes
+from .tracks import refresh_tracks
+
+# Margen hacia atrás desde el checkpoint para recoger ediciones de las actividades recientes
+OVERLAP = timedelta(days=1)
+# Máximo de la API: menos peticiones por ejecución
+PER_PAGE = 200
+
+
+def new_stats():
+    return {'pages': 0, 'updated': 0, 'polylines': 0, 'unchanged': 0, 'missing': 0}
+
+
+def scan_start(athlete, checkpoint, overlap=OVERLAP):
+    """Fecha desde la que hay que listar las actividades del atleta (`None`: desde la primera)."""
+    if checkpoint.synced_until is None:
+        return None
+    start = checkpoint.synced_until - overlap
+    first_missing = Activity.objects.filter(
+        athlete=athlete, summary_polyline__isnull=True
+    ).aggregate(first=Min('start_date'))['first']
+    if first_missing is not None and first_missing <= start:
+        # `after` es exclusivo
+        start = first_missing - timedelta(seconds=1)
+    return start
+
+
+def sync_maps(athlete, client, full=False, overlap=OVERLAP, per_page=PER_PAGE):
+    """
+    Reconcilia los datos de mapa del atleta desde su checkpoint (o desde la
+    primera actividad con `full`). Devuelve las estadísticas de `new_stats`:
+    `missing` cuenta las actividades de la API que aún no están en la DB
+    (las inserta `sync_strava_data`).
+    """
+    checkpoint, _ = MapSyncCheckpoint.objects.get_or_create(athlete=athlete)
+    start = None if full else scan_start(athlete, checkpoint, overlap)
+
+    stats = new_stats()
+    pages = client.iter_activity_pages(
+        athlete.access_token, per_page=per_page, after=int(start.timestamp()) if start else 0,
+    )
+    for page, items in pages:
+        for key, value in _sync_page(athlete, items, checkpoint).items():
+            stats[key] += value
+        stats['pages'] = page
+    return stats
+
+
+def _sync_page(athlete, items, checkpoint):
+    stats = new_stats()
+    incoming = {item['id']: map_values(item) for item in items}
+
+    changed, changed_polylines = [], {}
+    activities = Activity.objects.filter(athlete=athlete, id__in=incoming.keys()).only('id', *MAP_FIELDS)
+    for activity in activities:
+        values = incoming.pop(activity.id)
+        if all(getattr(activity, field) == value for field, value in values.items()):
+            stats['unchanged'] += 1
+            continue
+        if activity.summary_polyline != values['summary_polyline']:
+            changed_polylines[activity.id] = values['summary_polyline']
+        for field, value in values.items():
+            setattr(activity, field, value)
+        changed.append(activity)
+    stats['missing'] = len(incoming)
+    stats['updated'] = len(changed)
+    stats['polylines'] = len(changed_polylines)
+
+    with transaction.atomic():
+        if changed:
+            Activity.objects.bulk_update(changed, MAP_FIELDS)
+        if changed_polylines:
+            refresh_tracks(changed_polylines)
+            refresh_routes(athlete.id, changed_polylines)
+        # La página está reconciliada: la siguiente ejecución puede empezar aquí
+        checkpoint.synced_until = max(parse_strava_datetime(item['start_date']) for item in items)
+        checkpoint.save()
+
+    if changed:
+        bump_generation(athlete)
+    return stats
@@ -0,0 +1,25 @@
+"""
+Resuelve una sola vez por petición el atleta de la sesión.
+"""
+from .cache import get_athlete
+
+
+class AthleteMiddleware:
+    """
+    Deja en `request.athlete` el atleta de la sesión (o `None`), leído de la
+    caché de atletas (ver `cache.get_athlete`). No renueva el token: eso se
+    hace fuera de las peticiones web (ver dashboard/tokens.py).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.athlete = None
+        athlete_id = request.session.get('athlete_id')
+        if athlete_id:
+            request.athlete = get_athlete(athlete_id)
+            if request.athlete is None:
+                # El atleta retiró el acceso desde Strava y se borraron sus datos (webhook)
+                del request.session['athlete_id']
+        return self.get_response(request)
@@ -0,0 +1,61 @@
+# Generated by Django 5.0.4 on 2026-10-17 20:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_rollups(apps, schema_editor):
+    # Carga inicial de los agregados a partir de las actividades existentes
+    Activity = apps.get_model('dashboard', 'Activity')
+    DailyRollup = apps.get_model('dashboard', 'DailyRollup')
+
+    rows = Activity.objects.values('athlete_id', 'calculated_day', 'type').annotate(
+        total_count=Count('id'),
+        total_distance=Sum('distance'),
+        total_moving_time=Sum('moving_time'),
+        total_elevation=Sum('total_elevation_gain'),
+    ).order_by()
+    DailyRollup.objects.bulk_create([
+        DailyRollup(
+            athlete_id=row['athlete_id'],
+            day=row['calculated_day'],
+            type=row['type'],
+            count=row['total_count'],
+            distance=row['total_distance'] or 0.0,
+            moving_time=row['total_moving_time'] or 0,
+            elevation=row['total_elevation'] or 0.0,
+        )
+        for row in rows
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0002_activity_end_latlng_activity_start_latlng_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(help_text='Same value as Activity.calculated_day')),
+                ('type', models.CharField(help_text='e.g., Run, Ride, Swim', max_length=50)),
+                ('count', models.IntegerField(default=0)),
+                ('distance', models.FloatField(default=0.0, help_text='Distance in meters')),
+                ('moving_time', models.IntegerField(default=0, help_text='Moving time in seconds')),
+                ('elevation', models.FloatField(default=0.0, help_text='Elevation gain in meters')),
+                ('athlete', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='dashboard.athlete')),
+            ],
+            options={
+                'ordering': ['-day'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyrollup',
+            constraint=models.UniqueConstraint(fields=('athlete', 'day', 'type'), name='unique_daily_rollup'),
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.0.4 on 2026-10-17 20:32
+
+import django.db.models.deletion
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def populate_streaks(apps, schema_editor):
+    # Estado inicial de la racha a partir de los agregados diarios existentes
+    AthleteStreak = apps.get_model('dashboard', 'AthleteStreak')
+    DailyRollup = apps.get_model('dashboard', 'DailyRollup')
+
+    streaks = {}
+    days = DailyRollup.objects.values_list('athlete_id', 'day').distinct().order_by('athlete_id', 'day')
+    for athlete_id, day in days.iterator():
+        streak = streaks.setdefault(athlete_id, AthleteStreak(athlete_id=athlete_id))
+        if streak.last_day and day - streak.last_day == timedelta(days=1):
+            streak.current_streak += 1
+        else:
+            streak.current_streak = 1
+        streak.last_day = day
+        streak.total_days += 1
+        streak.longest_streak = max(streak.longest_streak, streak.current_streak)
+
+    AthleteStreak.objects.bulk_create(streaks.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0003_dailyrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AthleteStreak',
+            fields=[
+                ('athlete', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='streak', serialize=False, to='dashboard.athlete')),
+                ('current_streak', models.IntegerField(default=0, help_text='Consecutive active days ending on last_day')),
+                ('longest_streak', models.IntegerField(default=0)),
+                ('total_days', models.IntegerField(default=0, help_text='Number of distinct active days')),
+                ('last_day', models.DateField(blank=True, help_text='Most recent active day', null=True)),
+            ],
+        ),
+        migrations.RunPython(populate_streaks, migrations.RunPython.noop),
+    ]
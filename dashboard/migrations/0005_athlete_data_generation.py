@@ -0,0 +1,18 @@
+# Generated by Django 5.0.4 on 2026-10-17 20:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0004_athletestreak'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='athlete',
+            name='data_generation',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
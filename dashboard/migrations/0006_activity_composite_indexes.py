@@ -0,0 +1,34 @@
+# Generated by Django 5.0.4 on 2026-10-17 20:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0005_athlete_data_generation'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='activity',
+            name='calculated_day',
+            field=models.DateField(help_text='Date part of start_date_local for daily grouping'),
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['athlete', '-start_date_local', '-id'], name='activity_athlete_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['athlete', 'type', '-start_date_local', '-id'], name='activity_athlete_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['athlete', 'calculated_day'], name='activity_athlete_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['athlete', 'start_date'], name='activity_athlete_start_idx'),
+        ),
+    ]
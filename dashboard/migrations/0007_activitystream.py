@@ -0,0 +1,31 @@
+# Generated by Django 5.0.4 on 2026-10-17 20:36
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0006_activity_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityStream',
+            fields=[
+                ('activity', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stream', serialize=False, to='dashboard.activity')),
+                ('sample_count', models.IntegerField(default=0, help_text='Number of samples per channel (0 = no streams)')),
+                ('time', models.BinaryField(blank=True, help_text='Seconds from start (uint32, delta encoded)', null=True)),
+                ('distance', models.BinaryField(blank=True, help_text='Meters (float32)', null=True)),
+                ('latlng', models.BinaryField(blank=True, help_text='Degrees * 1e7, interleaved lat/lng (int32, delta encoded)', null=True)),
+                ('altitude', models.BinaryField(blank=True, help_text='Meters (float32)', null=True)),
+                ('heartrate', models.BinaryField(blank=True, help_text='BPM (uint16)', null=True)),
+                ('cadence', models.BinaryField(blank=True, help_text='RPM (uint16)', null=True)),
+                ('watts', models.BinaryField(blank=True, help_text='Watts (uint16)', null=True)),
+                ('velocity_smooth', models.BinaryField(blank=True, help_text='Meters per second (float32)', null=True)),
+                ('fetched_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.4 on 2026-10-17 20:37
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0007_activitystream'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityAnalysis',
+            fields=[
+                ('activity', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='analysis', serialize=False, to='dashboard.activity')),
+                ('results', models.JSONField(default=dict)),
+                ('version', models.IntegerField(default=0, help_text='dashboard.analysis.ANALYSIS_VERSION used to compute results')),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
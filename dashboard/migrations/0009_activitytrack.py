@@ -0,0 +1,29 @@
+# Generated by Django 5.0.4 on 2026-10-17 20:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0008_activityanalysis'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityTrack',
+            fields=[
+                ('activity', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='track', serialize=False, to='dashboard.activity')),
+                ('source_hash', models.CharField(help_text='SHA-1 of the summary_polyline the track was built from', max_length=40)),
+                ('point_count', models.IntegerField(default=0, help_text='Points in the full-resolution polyline')),
+                ('low', models.TextField(blank=True, default='')),
+                ('medium', models.TextField(blank=True, default='')),
+                ('high', models.TextField(blank=True, default='')),
+                ('min_lat', models.FloatField(blank=True, null=True)),
+                ('min_lng', models.FloatField(blank=True, null=True)),
+                ('max_lat', models.FloatField(blank=True, null=True)),
+                ('max_lng', models.FloatField(blank=True, null=True)),
+            ],
+        ),
+    ]
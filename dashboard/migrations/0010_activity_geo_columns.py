@@ -0,0 +1,114 @@
+# Generated by Django 5.0.4 on 2026-10-17 20:41
+
+import json
+import math
+
+from django.db import migrations, models
+
+# Copia de dashboard/geo.py al escribir la migración (rejilla de 0.1 grados)
+GRID_SIZE = 0.1
+GRID_COLUMNS = 3600
+GRID_ROWS = 1800
+
+
+def _grid_cell(lat, lng):
+    row = min(max(int(math.floor((lat + 90) / GRID_SIZE)), 0), GRID_ROWS - 1)
+    column = int(math.floor((lng + 180) / GRID_SIZE)) % GRID_COLUMNS
+    return row * GRID_COLUMNS + column
+
+
+def _parse(value):
+    try:
+        lat, lng = json.loads(value)
+        return float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None, None
+
+
+def split_latlng(apps, schema_editor):
+    # Pasa el JSON de start_latlng/end_latlng a columnas numéricas
+    Activity = apps.get_model('dashboard', 'Activity')
+    rows = Activity.objects.filter(
+        models.Q(start_latlng__isnull=False) | models.Q(end_latlng__isnull=False)
+    ).only('id', 'start_latlng', 'end_latlng')
+
+    batch = []
+    for activity in rows.iterator(chunk_size=1000):
+        activity.start_lat, activity.start_lng = _parse(activity.start_latlng)
+        activity.end_lat, activity.end_lng = _parse(activity.end_latlng)
+        if activity.start_lat is not None:
+            activity.start_cell = _grid_cell(activity.start_lat, activity.start_lng)
+        batch.append(activity)
+        if len(batch) >= 1000:
+            Activity.objects.bulk_update(batch, ['start_lat', 'start_lng', 'end_lat', 'end_lng', 'start_cell'])
+            batch = []
+    if batch:
+        Activity.objects.bulk_update(batch, ['start_lat', 'start_lng', 'end_lat', 'end_lng', 'start_cell'])
+
+
+def join_latlng(apps, schema_editor):
+    Activity = apps.get_model('dashboard', 'Activity')
+    rows = Activity.objects.filter(
+        models.Q(start_lat__isnull=False) | models.Q(end_lat__isnull=False)
+    ).only('id', 'start_lat', 'start_lng', 'end_lat', 'end_lng')
+
+    batch = []
+    for activity in rows.iterator(chunk_size=1000):
+        if activity.start_lat is not None:
+            activity.start_latlng = json.dumps([activity.start_lat, activity.start_lng])
+        if activity.end_lat is not None:
+            activity.end_latlng = json.dumps([activity.end_lat, activity.end_lng])
+        batch.append(activity)
+        if len(batch) >= 1000:
+            Activity.objects.bulk_update(batch, ['start_latlng', 'end_latlng'])
+            batch = []
+    if batch:
+        Activity.objects.bulk_update(batch, ['start_latlng', 'end_latlng'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0009_activitytrack'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activity',
+            name='end_lat',
+            field=models.FloatField(blank=True, help_text='Ending latitude in degrees', null=True),
+        ),
+        migrations.AddField(
+            model_name='activity',
+            name='end_lng',
+            field=models.FloatField(blank=True, help_text='Ending longitude in degrees', null=True),
+        ),
+        migrations.AddField(
+            model_name='activity',
+            name='start_cell',
+            field=models.IntegerField(blank=True, help_text='Grid cell of the starting point', null=True),
+        ),
+        migrations.AddField(
+            model_name='activity',
+            name='start_lat',
+            field=models.FloatField(blank=True, help_text='Starting latitude in degrees', null=True),
+        ),
+        migrations.AddField(
+            model_name='activity',
+            name='start_lng',
+            field=models.FloatField(blank=True, help_text='Starting longitude in degrees', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['athlete', 'start_cell'], name='activity_athlete_cell_idx'),
+        ),
+        migrations.RunPython(split_latlng, join_latlng),
+        migrations.RemoveField(
+            model_name='activity',
+            name='end_latlng',
+        ),
+        migrations.RemoveField(
+            model_name='activity',
+            name='start_latlng',
+        ),
+    ]
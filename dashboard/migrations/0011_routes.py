@@ -0,0 +1,40 @@
+# Generated by Django 5.0.4 on 2026-10-17 20:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0010_activity_geo_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouteFingerprint',
+            fields=[
+                ('activity', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='route', serialize=False, to='dashboard.activity')),
+                ('length', models.FloatField(help_text='Polyline length in meters')),
+                ('cell_count', models.IntegerField(help_text='Distinct grid cells crossed by the route')),
+                ('shape', models.BinaryField(help_text='Route resampled to equally spaced points: float32 [lat, lng] pairs')),
+                ('athlete', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='routes', to='dashboard.athlete')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RouteCell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cell', models.BigIntegerField(help_text='Grid cell id (see dashboard/routes.py)')),
+                ('activity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='route_cells', to='dashboard.activity')),
+                ('athlete', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='dashboard.athlete')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['athlete', 'cell'], name='routecell_athlete_cell_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='routecell',
+            constraint=models.UniqueConstraint(fields=('activity', 'cell'), name='unique_route_cell'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.4 on 2026-10-17 20:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0011_routes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Heatmap',
+            fields=[
+                ('athlete', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='heatmap', serialize=False, to='dashboard.athlete')),
+                ('version', models.PositiveIntegerField(default=0, help_text='Bumped on every render; part of the tile URLs')),
+                ('activity_count', models.IntegerField(default=0, help_text='Activities drawn in the tiles')),
+                ('rendered_at', models.DateTimeField(blank=True, null=True)),
+                ('min_lat', models.FloatField(blank=True, null=True)),
+                ('min_lng', models.FloatField(blank=True, null=True)),
+                ('max_lat', models.FloatField(blank=True, null=True)),
+                ('max_lng', models.FloatField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='activitytrack',
+            name='heatmap_hash',
+            field=models.CharField(blank=True, default='', max_length=40),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.4 on 2026-10-17 20:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0013_syncjob'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='syncjob',
+            name='one_active_sync_per_athlete',
+        ),
+        migrations.AddField(
+            model_name='syncjob',
+            name='activity_id',
+            field=models.BigIntegerField(blank=True, help_text='Strava activity of a webhook event', null=True),
+        ),
+        migrations.AddField(
+            model_name='syncjob',
+            name='deleted',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='syncjob',
+            name='kind',
+            field=models.CharField(choices=[('sync', 'Full sync'), ('activity', 'Activity created or updated'), ('delete', 'Activity deleted'), ('deauthorize', 'Athlete deauthorized')], default='sync', max_length=12),
+        ),
+        migrations.AddConstraint(
+            model_name='syncjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('kind', 'sync'), ('status__in', ['queued', 'running'])), fields=('athlete',), name='one_active_sync_per_athlete'),
+        ),
+        migrations.AddConstraint(
+            model_name='syncjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('kind__in', ['activity', 'delete']), ('status', 'queued')), fields=('kind', 'activity_id'), name='one_queued_event_per_activity'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.4 on 2026-10-17 20:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0014_syncjob_webhook_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MapSyncCheckpoint',
+            fields=[
+                ('athlete', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='map_checkpoint', serialize=False, to='dashboard.athlete')),
+                ('synced_until', models.DateTimeField(blank=True, help_text='start_date of the newest activity whose map data was reconciled', null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
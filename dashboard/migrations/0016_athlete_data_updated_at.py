@@ -0,0 +1,18 @@
+# Generated by Django 5.0.4 on 2026-10-17 21:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0015_mapsynccheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='athlete',
+            name='data_updated_at',
+            field=models.DateTimeField(blank=True, help_text='When data_generation last changed', null=True),
+        ),
+    ]
@@ -0,0 +1,128 @@
+# Generated by Django 5.0.4 on 2026-10-17 21:12
+
+import math
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+
+# Copia de dashboard/training.py al escribir la migración
+FITNESS_DECAY = math.exp(-1 / 42)
+FATIGUE_DECAY = math.exp(-1 / 7)
+TRIMP_WEIGHT = 0.64
+TRIMP_EXPONENT = 1.92
+TYPE_INTENSITY = {
+    'Run': 1.5, 'TrailRun': 1.6, 'VirtualRun': 1.5,
+    'Ride': 1.1, 'VirtualRide': 1.3, 'MountainBikeRide': 1.3, 'GravelRide': 1.2, 'EBikeRide': 0.6,
+    'Swim': 1.4, 'Rowing': 1.4, 'NordicSki': 1.5, 'Hike': 0.9, 'Walk': 0.5,
+    'WeightTraining': 0.9, 'Workout': 1.0, 'Crossfit': 1.3, 'Yoga': 0.3,
+}
+DEFAULT_INTENSITY = 1.0
+
+
+def _activity_load(moving_time, average_heartrate, activity_type):
+    minutes = (moving_time or 0) / 60
+    max_heartrate = settings.STRAVA_MAX_HEARTRATE
+    resting_heartrate = settings.STRAVA_RESTING_HEARTRATE
+    if average_heartrate and max_heartrate > resting_heartrate:
+        reserve = (average_heartrate - resting_heartrate) / (max_heartrate - resting_heartrate)
+        reserve = min(max(reserve, 0.0), 1.0)
+        return round(minutes * reserve * TRIMP_WEIGHT * math.exp(TRIMP_EXPONENT * reserve), 1)
+    return round(minutes * TYPE_INTENSITY.get(activity_type, DEFAULT_INTENSITY), 1)
+
+
+def backfill_training_load(apps, schema_editor):
+    # Carga de las actividades existentes, sus sumas diarias y la serie completa de cada atleta
+    Athlete = apps.get_model('dashboard', 'Athlete')
+    Activity = apps.get_model('dashboard', 'Activity')
+    DailyRollup = apps.get_model('dashboard', 'DailyRollup')
+    TrainingLoad = apps.get_model('dashboard', 'TrainingLoad')
+
+    for athlete_id in Athlete.objects.values_list('id', flat=True):
+        # 1. Carga de cada actividad
+        activities = Activity.objects.filter(athlete_id=athlete_id).values_list(
+            'id', 'moving_time', 'average_heartrate', 'type'
+        )
+        batch = []
+        for activity_id, moving_time, average_heartrate, activity_type in activities.iterator(chunk_size=1000):
+            load = _activity_load(moving_time, average_heartrate, activity_type)
+            if load:
+                batch.append(Activity(id=activity_id, training_load=load))
+            if len(batch) >= 1000:
+                Activity.objects.bulk_update(batch, ['training_load'])
+                batch = []
+        Activity.objects.bulk_update(batch, ['training_load'])
+
+        # 2. Suma por día y tipo en los agregados diarios
+        sums = {
+            (row['calculated_day'], row['type']): row['total'] or 0.0
+            for row in Activity.objects.filter(athlete_id=athlete_id).values('calculated_day', 'type').annotate(
+                total=Sum('training_load')
+            ).order_by()
+        }
+        rollups = list(DailyRollup.objects.filter(athlete_id=athlete_id).only('id', 'day', 'type'))
+        for rollup in rollups:
+            rollup.training_load = sums.get((rollup.day, rollup.type), 0.0)
+        DailyRollup.objects.bulk_update(rollups, ['training_load'], batch_size=500)
+
+        # 3. Serie diaria del primer al último día activo
+        loads = dict(DailyRollup.objects.filter(athlete_id=athlete_id).values('day').annotate(
+            total=Sum('training_load')
+        ).order_by().values_list('day', 'total'))
+        if not loads:
+            continue
+        day, last_day = min(loads), max(loads)
+        fitness = fatigue = 0.0
+        rows = []
+        while day <= last_day:
+            load = loads.get(day) or 0.0
+            form = fitness - fatigue
+            fitness = fitness * FITNESS_DECAY + load * (1 - FITNESS_DECAY)
+            fatigue = fatigue * FATIGUE_DECAY + load * (1 - FATIGUE_DECAY)
+            rows.append(TrainingLoad(
+                athlete_id=athlete_id, day=day, load=load, fitness=fitness, fatigue=fatigue, form=form,
+            ))
+            day += timedelta(days=1)
+        TrainingLoad.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0016_athlete_data_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activity',
+            name='training_load',
+            field=models.FloatField(default=0.0, help_text='Heart-rate TRIMP, or duration x intensity without HR'),
+        ),
+        migrations.AddField(
+            model_name='dailyrollup',
+            name='training_load',
+            field=models.FloatField(default=0.0, help_text='Sum of Activity.training_load'),
+        ),
+        migrations.CreateModel(
+            name='TrainingLoad',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('load', models.FloatField(default=0.0, help_text='Training load of the day')),
+                ('fitness', models.FloatField(default=0.0, help_text='Chronic load: 42-day exponentially weighted average')),
+                ('fatigue', models.FloatField(default=0.0, help_text='Acute load: 7-day exponentially weighted average')),
+                ('form', models.FloatField(default=0.0, help_text="Balance: previous day's fitness minus fatigue")),
+                ('athlete', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='training_loads', to='dashboard.athlete')),
+            ],
+            options={
+                'ordering': ['day'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='trainingload',
+            constraint=models.UniqueConstraint(fields=('athlete', 'day'), name='unique_training_load_day'),
+        ),
+        migrations.RunPython(backfill_training_load, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.0.4 on 2026-10-17 21:15
+
+import zlib
+from collections import defaultdict
+from datetime import date
+
+import django.db.models.deletion
+import numpy as np
+from django.db import migrations, models
+
+# Copia de dashboard/yearly.py al escribir la migración
+METRICS = ['count', 'distance', 'moving_time', 'elevation']
+ALL_TYPES = ''
+DAYS = 366
+LEAP_YEAR = 2000
+
+
+def _day_index(day):
+    return date(LEAP_YEAR, day.month, day.day).timetuple().tm_yday - 1
+
+
+def _encode_days(values):
+    return zlib.compress(np.asarray(values, dtype='<i4').tobytes())
+
+
+def populate_yearly_progress(apps, schema_editor):
+    # Progreso anual de las actividades existentes a partir de los agregados diarios
+    Athlete = apps.get_model('dashboard', 'Athlete')
+    DailyRollup = apps.get_model('dashboard', 'DailyRollup')
+    YearlyProgress = apps.get_model('dashboard', 'YearlyProgress')
+
+    for athlete_id in Athlete.objects.values_list('id', flat=True):
+        years = defaultdict(lambda: defaultdict(lambda: {metric: np.zeros(DAYS, dtype=np.int64) for metric in METRICS}))
+        rows = DailyRollup.objects.filter(athlete_id=athlete_id).values('day', 'type', *METRICS)
+        for row in rows.iterator(chunk_size=2000):
+            arrays = years[row['day'].year][row['type']]
+            for metric in METRICS:
+                arrays[metric][_day_index(row['day'])] = int(round(row[metric] or 0))
+
+        progress = []
+        for year, by_type in years.items():
+            by_type = {activity_type: arrays for activity_type, arrays in by_type.items() if arrays['count'].any()}
+            if not by_type:
+                continue
+            by_type[ALL_TYPES] = {metric: sum(arrays[metric] for arrays in by_type.values()) for metric in METRICS}
+            progress.extend(
+                YearlyProgress(
+                    athlete_id=athlete_id, year=year, type=activity_type,
+                    **{metric: _encode_days(arrays[metric]) for metric in METRICS},
+                )
+                for activity_type, arrays in by_type.items()
+            )
+        YearlyProgress.objects.bulk_create(progress, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0017_training_load'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='YearlyProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('type', models.CharField(blank=True, help_text='Activity type, or empty for all types', max_length=50)),
+                ('count', models.BinaryField(help_text='Activities per day of year')),
+                ('distance', models.BinaryField(help_text='Meters per day of year')),
+                ('moving_time', models.BinaryField(help_text='Moving seconds per day of year')),
+                ('elevation', models.BinaryField(help_text='Elevation gain meters per day of year')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('athlete', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='yearly_progress', to='dashboard.athlete')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='yearlyprogress',
+            constraint=models.UniqueConstraint(fields=('athlete', 'year', 'type'), name='unique_yearly_progress'),
+        ),
+        migrations.RunPython(populate_yearly_progress, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+def unpublish_heatmaps(apps, schema_editor):
+    # Las teselas pasan a un directorio por versión: las de antes no se sirven y
+    # el mapa se oculta hasta que `render_heatmaps` (o la próxima sincronización) lo redibuje
+    Heatmap = apps.get_model('dashboard', 'Heatmap')
+    Heatmap.objects.update(rendered_at=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0018_yearly_progress'),
+    ]
+
+    operations = [
+        migrations.RunPython(unpublish_heatmaps, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.0.4 on 2026-10-17 21:28
+
+import zlib
+
+import numpy as np
+from django.db import migrations, models
+
+
+def _decode(blob, rows):
+    deltas = np.frombuffer(zlib.decompress(bytes(blob)), dtype='<i4')
+    if rows:
+        deltas = deltas.reshape(-1, 2)
+        return np.cumsum(deltas, axis=0, dtype=np.int64).astype('<i4')
+    return np.cumsum(deltas, dtype=np.int64).astype('<i4').reshape(-1, 2)
+
+
+def _encode(values, rows):
+    values = values.astype(np.int64)
+    if rows:
+        deltas = np.diff(values, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+    else:
+        deltas = np.diff(values.reshape(-1), prepend=0)
+    return zlib.compress(deltas.astype('<i4').tobytes(), 6)
+
+
+def _recode(apps, rows):
+    ActivityStream = apps.get_model('dashboard', 'ActivityStream')
+    batch = []
+    for stream in ActivityStream.objects.filter(latlng__isnull=False).only('activity_id', 'latlng').iterator(chunk_size=200):
+        stream.latlng = _encode(_decode(stream.latlng, not rows), rows)
+        batch.append(stream)
+        if len(batch) >= 200:
+            ActivityStream.objects.bulk_update(batch, ['latlng'])
+            batch = []
+    ActivityStream.objects.bulk_update(batch, ['latlng'])
+
+
+def latlng_by_rows(apps, schema_editor):
+    # Las diferencias de latlng pasan de la serie aplanada (lat, lng, lat...) a cada columna
+    _recode(apps, rows=True)
+
+
+def latlng_flat(apps, schema_editor):
+    _recode(apps, rows=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0019_heatmap_version_dirs'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='activitystream',
+            name='latlng',
+            field=models.BinaryField(blank=True, help_text='Degrees * 1e7, lat/lng pairs (int32, delta encoded per column)', null=True),
+        ),
+        migrations.RunPython(latlng_by_rows, latlng_flat),
+    ]
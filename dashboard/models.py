@@ -22,6 +22,10 @@ class Athlete(models.Model):
     refresh_token = models.CharField(max_length=255)
     expires_at = models.IntegerField() # Timestamp UNIX para manejar la expiración
 
+    # Versión de los datos del atleta: se incrementa en cada sincronización con cambios
+    data_generation = models.PositiveIntegerField(default=0)
+    data_updated_at = models.DateTimeField(blank=True, null=True, help_text="When data_generation last changed")
+
     # Campos de auditoría
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
@@ -60,11 +64,27 @@ class Activity(models.Model):
     
     # Datos de mapa
     summary_polyline = models.TextField(blank=True, null=True, help_text="Encoded polyline for the activity map")
-    start_latlng = models.CharField(max_length=100, blank=True, null=True, help_text="Starting coordinates [lat, lng]")
-    end_latlng = models.CharField(max_length=100, blank=True, null=True, help_text="Ending coordinates [lat, lng]")
+    start_lat = models.FloatField(blank=True, null=True, help_text="Starting latitude in degrees")
+    start_lng = models.FloatField(blank=True, null=True, help_text="Starting longitude in degrees")
+    end_lat = models.FloatField(blank=True, null=True, help_text="Ending latitude in degrees")
+    end_lng = models.FloatField(blank=True, null=True, help_text="Ending longitude in degrees")
+    # Celda de la rejilla del punto de inicio para búsquedas por cercanía (ver dashboard/geo.py)
+    start_cell = models.IntegerField(blank=True, null=True, help_text="Grid cell of the starting point")
     
     # Campo para la racha (streak) u otros metadatos calculados
-    calculated_day = models.DateField(db_index=True, help_text="Date part of start_date_local for daily grouping")
+    calculated_day = models.DateField(help_text="Date part of start_date_local for daily grouping")
+    # Carga de entrenamiento (ver dashboard/training.py)
+    training_load = models.FloatField(default=0.0, help_text="Heart-rate TRIMP, or duration x intensity without HR")
+
+    @property
+    def start_latlng(self):
+        """Coordenadas de inicio `[lat, lng]` (o `None`), como las devuelve la API."""
+        return [self.start_lat, self.start_lng] if self.start_lat is not None else None
+
+    @property
+    def end_latlng(self):
+        """Coordenadas de fin `[lat, lng]` (o `None`)."""
+        return [self.end_lat, self.end_lng] if self.end_lat is not None else None
 
     # Método de utilidad para la plantilla
     def distance_km(self):
@@ -94,6 +114,18 @@ class Activity(models.Model):
     class Meta:
         ordering = ['-start_date_local']
         verbose_name_plural = "Activities"
+        # Índices compuestos alineados con las consultas de las vistas y de la sincronización
+        indexes = [
+            # Lista de actividades, recientes y paginación por cursor (start_date_local, id)
+            models.Index(fields=['athlete', '-start_date_local', '-id'], name='activity_athlete_date_idx'),
+            # Filtro por tipo y "actividades similares"
+            models.Index(fields=['athlete', 'type', '-start_date_local', '-id'], name='activity_athlete_type_idx'),
+            # Recalculo de agregados diarios por día
+            models.Index(fields=['athlete', 'calculated_day'], name='activity_athlete_day_idx'),
+            # Punto de partida de la sincronización (Max('start_date'))
+            models.Index(fields=['athlete', 'start_date'], name='activity_athlete_start_idx'),
+            models.Index(fields=['athlete', 'start_cell'], name='activity_athlete_cell_idx'),
+        ]
         
     def save(self, *args, **kwargs):
         # Aseguramos que el campo `calculated_day` se calcule antes de guardar
@@ -113,4 +145,272 @@ class Activity(models.Model):
         return "N/A"
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+class DailyRollup(models.Model):
+    # Agregado por atleta, día y tipo de actividad (se mantiene en cada sincronización)
+    athlete = models.ForeignKey(Athlete, on_delete=models.CASCADE, related_name='daily_rollups')
+    day = models.DateField(help_text="Same value as Activity.calculated_day")
+    type = models.CharField(max_length=50, help_text="e.g., Run, Ride, Swim")
+
+    # Métricas acumuladas del día
+    count = models.IntegerField(default=0)
+    distance = models.FloatField(default=0.0, help_text="Distance in meters")
+    moving_time = models.IntegerField(default=0, help_text="Moving time in seconds")
+    elevation = models.FloatField(default=0.0, help_text="Elevation gain in meters")
+    training_load = models.FloatField(default=0.0, help_text="Sum of Activity.training_load")
+
+    class Meta:
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(fields=['athlete', 'day', 'type'], name='unique_daily_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.athlete_id} {self.day} {self.type}"
+
+
+class YearlyProgress(models.Model):
+    # Totales diarios de un año por día del año (ver dashboard/yearly.py); `type` vacío = todos los tipos
+    athlete = models.ForeignKey(Athlete, on_delete=models.CASCADE, related_name='yearly_progress')
+    year = models.PositiveSmallIntegerField()
+    type = models.CharField(max_length=50, blank=True, help_text="Activity type, or empty for all types")
+
+    # 366 valores int32 little-endian comprimidos con zlib; el acumulado se calcula al leer (cumsum)
+    count = models.BinaryField(help_text="Activities per day of year")
+    distance = models.BinaryField(help_text="Meters per day of year")
+    moving_time = models.BinaryField(help_text="Moving seconds per day of year")
+    elevation = models.BinaryField(help_text="Elevation gain meters per day of year")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['athlete', 'year', 'type'], name='unique_yearly_progress'),
+        ]
+
+    def __str__(self):
+        return f"{self.athlete_id} {self.year} {self.type or 'all'}"
+
+
+class TrainingLoad(models.Model):
+    # Serie diaria de forma física (una fila por día desde el primer día activo, ver dashboard/training.py)
+    athlete = models.ForeignKey(Athlete, on_delete=models.CASCADE, related_name='training_loads')
+    day = models.DateField()
+    load = models.FloatField(default=0.0, help_text="Training load of the day")
+    fitness = models.FloatField(default=0.0, help_text="Chronic load: 42-day exponentially weighted average")
+    fatigue = models.FloatField(default=0.0, help_text="Acute load: 7-day exponentially weighted average")
+    form = models.FloatField(default=0.0, help_text="Balance: previous day's fitness minus fatigue")
+
+    class Meta:
+        ordering = ['day']
+        constraints = [
+            models.UniqueConstraint(fields=['athlete', 'day'], name='unique_training_load_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.athlete_id} {self.day}: {self.fitness:.0f}/{self.fatigue:.0f}/{self.form:.0f}"
+
+
+class AthleteStreak(models.Model):
+    # Estado de la racha de días consecutivos con actividad (uno por atleta)
+    athlete = models.OneToOneField(Athlete, on_delete=models.CASCADE, primary_key=True, related_name='streak')
+    current_streak = models.IntegerField(default=0, help_text="Consecutive active days ending on last_day")
+    longest_streak = models.IntegerField(default=0)
+    total_days = models.IntegerField(default=0, help_text="Number of distinct active days")
+    last_day = models.DateField(blank=True, null=True, help_text="Most recent active day")
+
+    # Métodos de utilidad para la plantilla
+    def current_streak_on(self, day):
+        """La racha solo sigue viva si hubo actividad hoy o ayer."""
+        if self.last_day and (day - self.last_day).days <= 1:
+            return self.current_streak
+        return 0
+
+    def __str__(self):
+        return f"{self.athlete_id}: {self.current_streak} days"
+
+
+class ActivityStream(models.Model):
+    # Series por segundo de una actividad (GET /activities/{id}/streams).
+    # Cada canal es un array tipado comprimido con zlib (ver dashboard/streams.py).
+    activity = models.OneToOneField(Activity, on_delete=models.CASCADE, primary_key=True, related_name='stream')
+    sample_count = models.IntegerField(default=0, help_text="Number of samples per channel (0 = no streams)")
+
+    time = models.BinaryField(blank=True, null=True, help_text="Seconds from start (uint32, delta encoded)")
+    distance = models.BinaryField(blank=True, null=True, help_text="Meters (float32)")
+    latlng = models.BinaryField(blank=True, null=True, help_text="Degrees * 1e7, lat/lng pairs (int32, delta encoded per column)")
+    altitude = models.BinaryField(blank=True, null=True, help_text="Meters (float32)")
+    heartrate = models.BinaryField(blank=True, null=True, help_text="BPM (uint16)")
+    cadence = models.BinaryField(blank=True, null=True, help_text="RPM (uint16)")
+    watts = models.BinaryField(blank=True, null=True, help_text="Watts (uint16)")
+    velocity_smooth = models.BinaryField(blank=True, null=True, help_text="Meters per second (float32)")
+
+    fetched_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Streams for {self.activity_id} ({self.sample_count} samples)"
+
+
+class ActivityAnalysis(models.Model):
+    # Resultados del análisis de streams (mejores esfuerzos, zonas, NP...) cacheados por actividad
+    activity = models.OneToOneField(Activity, on_delete=models.CASCADE, primary_key=True, related_name='analysis')
+    results = models.JSONField(default=dict)
+    version = models.IntegerField(default=0, help_text="dashboard.analysis.ANALYSIS_VERSION used to compute results")
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Analysis for {self.activity_id}"
+
+
+class ActivityTrack(models.Model):
+    # Trazado precalculado a varias resoluciones (ver dashboard/tracks.py)
+    activity = models.OneToOneField(Activity, on_delete=models.CASCADE, primary_key=True, related_name='track')
+    source_hash = models.CharField(max_length=40, help_text="SHA-1 of the summary_polyline the track was built from")
+    point_count = models.IntegerField(default=0, help_text="Points in the full-resolution polyline")
+
+    # Polilíneas codificadas simplificadas con Douglas-Peucker
+    low = models.TextField(blank=True, default='')
+    medium = models.TextField(blank=True, default='')
+    high = models.TextField(blank=True, default='')
+
+    # Límites del trazado para encuadrar el mapa sin decodificarlo
+    min_lat = models.FloatField(blank=True, null=True)
+    min_lng = models.FloatField(blank=True, null=True)
+    max_lat = models.FloatField(blank=True, null=True)
+    max_lng = models.FloatField(blank=True, null=True)
+
+    # Hash de la polilínea dibujada en el mapa de calor ('' = pendiente)
+    heatmap_hash = models.CharField(max_length=40, blank=True, default='')
+
+    def __str__(self):
+        return f"Track for {self.activity_id} ({self.point_count} points)"
+
+
+class RouteFingerprint(models.Model):
+    # Huella compacta del recorrido para encontrar actividades por la misma ruta (ver dashboard/routes.py)
+    activity = models.OneToOneField(Activity, on_delete=models.CASCADE, primary_key=True, related_name='route')
+    athlete = models.ForeignKey(Athlete, on_delete=models.CASCADE, related_name='routes')
+    length = models.FloatField(help_text="Polyline length in meters")
+    cell_count = models.IntegerField(help_text="Distinct grid cells crossed by the route")
+    shape = models.BinaryField(help_text="Route resampled to equally spaced points: float32 [lat, lng] pairs")
+
+    def __str__(self):
+        return f"Route of {self.activity_id} ({self.length / 1000:.1f} km, {self.cell_count} cells)"
+
+
+class RouteCell(models.Model):
+    # Índice invertido celda -> actividades que pasan por ella
+    athlete = models.ForeignKey(Athlete, on_delete=models.CASCADE, related_name='+')
+    activity = models.ForeignKey(Activity, on_delete=models.CASCADE, related_name='route_cells')
+    cell = models.BigIntegerField(help_text="Grid cell id (see dashboard/routes.py)")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['activity', 'cell'], name='unique_route_cell'),
+        ]
+        indexes = [
+            models.Index(fields=['athlete', 'cell'], name='routecell_athlete_cell_idx'),
+        ]
+
+
+class Heatmap(models.Model):
+    # Estado de las teselas del mapa de calor del atleta (ver dashboard/heatmap.py)
+    athlete = models.OneToOneField(Athlete, on_delete=models.CASCADE, primary_key=True, related_name='heatmap')
+    version = models.PositiveIntegerField(default=0, help_text="Bumped on every render; part of the tile URLs")
+    activity_count = models.IntegerField(default=0, help_text="Activities drawn in the tiles")
+    rendered_at = models.DateTimeField(blank=True, null=True)
+
+    # Límites de todas las actividades para encuadrar el mapa
+    min_lat = models.FloatField(blank=True, null=True)
+    min_lng = models.FloatField(blank=True, null=True)
+    max_lat = models.FloatField(blank=True, null=True)
+    max_lng = models.FloatField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Heatmap of {self.athlete_id} v{self.version} ({self.activity_count} activities)"
+
+
+class MapSyncCheckpoint(models.Model):
+    # Hasta dónde llegó `manage.py sync_maps` con cada atleta (ver dashboard/maps.py)
+    athlete = models.OneToOneField(Athlete, on_delete=models.CASCADE, primary_key=True, related_name='map_checkpoint')
+    synced_until = models.DateTimeField(
+        blank=True, null=True, help_text="start_date of the newest activity whose map data was reconciled"
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Map sync of {self.athlete_id} until {self.synced_until}"
+
+
+class SyncJob(models.Model):
+    # Cola de sincronizaciones en la DB; la procesa `manage.py run_sync_worker` (ver dashboard/jobs.py)
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+    ACTIVE_STATUSES = [QUEUED, RUNNING]
+
+    # Tipo de trabajo: sincronización completa o un evento del webhook de Strava (ver dashboard/webhooks.py)
+    SYNC = 'sync'
+    ACTIVITY = 'activity'
+    DELETE = 'delete'
+    DEAUTHORIZE = 'deauthorize'
+    KIND_CHOICES = [
+        (SYNC, 'Full sync'),
+        (ACTIVITY, 'Activity created or updated'),
+        (DELETE, 'Activity deleted'),
+        (DEAUTHORIZE, 'Athlete deauthorized'),
+    ]
+
+    athlete = models.ForeignKey(Athlete, on_delete=models.CASCADE, related_name='sync_jobs')
+    kind = models.CharField(max_length=12, choices=KIND_CHOICES, default=SYNC)
+    activity_id = models.BigIntegerField(blank=True, null=True, help_text="Strava activity of a webhook event")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True, default='', help_text="Worker that claimed the job")
+
+    # Progreso (se actualiza tras cada lote escrito)
+    pages = models.IntegerField(default=0, help_text="API pages fetched")
+    inserted = models.IntegerField(default=0)
+    updated = models.IntegerField(default=0)
+    unchanged = models.IntegerField(default=0)
+    deleted = models.IntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    heartbeat_at = models.DateTimeField(blank=True, null=True, help_text="Last progress update of a running job")
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            # Deduplicación: como mucho una sincronización completa pendiente o en curso por atleta
+            models.UniqueConstraint(
+                fields=['athlete'],
+                condition=models.Q(kind='sync', status__in=['queued', 'running']),
+                name='one_active_sync_per_athlete',
+            ),
+            # y un solo evento pendiente por actividad (uno en curso no cuenta: puede haber leído ya
+            # la versión anterior, así que un evento nuevo debe volver a descargarla)
+            models.UniqueConstraint(
+                fields=['kind', 'activity_id'],
+                condition=models.Q(kind__in=['activity', 'delete'], status='queued'),
+                name='one_queued_event_per_activity',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='syncjob_status_created_idx'),
+            models.Index(fields=['athlete', '-created_at'], name='syncjob_athlete_created_idx'),
+        ]
+
+    def __str__(self):
+        if self.activity_id:
+            return f"{self.get_kind_display()} {self.activity_id} of {self.athlete_id} ({self.status})"
+        return f"{self.get_kind_display()} {self.id} of {self.athlete_id} ({self.status})"
@@ -0,0 +1,81 @@
+"""
+Paginación por cursor (keyset) para listas de actividades.
+
+En lugar de `COUNT(*)` + `OFFSET`, cada página busca a partir de la última fila
+de la anterior usando la clave `(start_date_local, id)`, por lo que el coste de
+cualquier página es el mismo sin importar lo profundo que esté en el historial.
+Los cursores son opacos para el cliente (JSON en base64 url-safe); uno mal
+formado se rechaza con `InvalidCursor` en lugar de volver a la primera página.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.db.models import Q
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class InvalidCursor(ValueError):
+    """El cursor recibido no es uno generado por `encode_cursor`."""
+
+
+def encode_cursor(activity, direction):
+    """Cursor que apunta a `activity` para avanzar (`NEXT`) o retroceder (`PREVIOUS`)."""
+    payload = json.dumps([activity.start_date_local.isoformat(), activity.id, direction], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Devuelve `(start_date_local, id, direction)`, o `None` sin cursor. Lanza `InvalidCursor` si no es válido."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        start_date_local, activity_id, direction = json.loads(base64.b64decode(padded, altchars=b'-_', validate=True))
+        start_date_local = datetime.fromisoformat(start_date_local)
+    except (ValueError, TypeError, binascii.Error) as e:
+        raise InvalidCursor(f"Invalid cursor: {token}") from e
+    if direction not in (NEXT, PREVIOUS) or type(activity_id) is not int or start_date_local.tzinfo is None:
+        raise InvalidCursor(f"Invalid cursor: {token}")
+    return start_date_local, activity_id, direction
+
+
+def paginate_keyset(queryset, cursor, page_size):
+    """
+    Devuelve un dict con `object_list`, `has_next`, `has_previous`,
+    `next_cursor` y `previous_cursor`, ordenado por fecha descendente.
+    Sin cursor devuelve la primera página; uno inválido lanza `InvalidCursor`.
+    """
+    position = decode_cursor(cursor)
+
+    if position is None:
+        rows = list(queryset.order_by('-start_date_local', '-id')[:page_size + 1])
+        has_next, has_previous = len(rows) > page_size, False
+        rows = rows[:page_size]
+    else:
+        start_date_local, activity_id, direction = position
+        if direction == NEXT:
+            rows = list(queryset.filter(
+                Q(start_date_local__lt=start_date_local) |
+                Q(start_date_local=start_date_local, id__lt=activity_id)
+            ).order_by('-start_date_local', '-id')[:page_size + 1])
+            has_next, has_previous = len(rows) > page_size, True
+            rows = rows[:page_size]
+        else:
+            rows = list(queryset.filter(
+                Q(start_date_local__gt=start_date_local) |
+                Q(start_date_local=start_date_local, id__gt=activity_id)
+            ).order_by('start_date_local', 'id')[:page_size + 1])
+            has_next, has_previous = True, len(rows) > page_size
+            rows = rows[:page_size][::-1]
+
+    return {
+        'object_list': rows,
+        'has_next': has_next and bool(rows),
+        'has_previous': has_previous and bool(rows),
+        'next_cursor': encode_cursor(rows[-1], NEXT) if has_next and rows else None,
+        'previous_cursor': encode_cursor(rows[0], PREVIOUS) if has_previous and rows else None,
+    }
@@ -0,0 +1,124 @@
+"""
+Códec de polilíneas codificadas (formato de Google, el que usa Strava) y
+simplificación Douglas-Peucker, ambos vectorizados con NumPy.
+"""
+import numpy as np
+
+PRECISION = 1e5
+
+# Lo que lanza `decode` con una polilínea truncada o con caracteres fuera del formato
+DECODE_ERRORS = (ValueError, IndexError)
+
+
+def decode(encoded):
+    """Polilínea codificada -> array (n, 2) de [lat, lng] en grados."""
+    if not encoded:
+        return np.empty((0, 2))
+
+    chunks = np.frombuffer(encoded.encode('ascii'), dtype=np.uint8).astype(np.int64) - 63
+    # Cada valor es una secuencia de bloques de 5 bits; el último no lleva el bit 0x20
+    is_last = (chunks & 0x20) == 0
+    ends = np.flatnonzero(is_last)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+
+    position = np.arange(len(chunks)) - np.repeat(starts, ends - starts + 1)
+    values = np.add.reduceat((chunks & 0x1f) << (5 * position), starts)
+
+    # Deshacer el zigzag y las diferencias
+    values = np.where(values & 1, ~(values >> 1), values >> 1)
+    if len(values) % 2:
+        values = values[:-1]
+    return np.cumsum(values.reshape(-1, 2), axis=0) / PRECISION
+
+
+def encode(points):
+    """Array (n, 2) de [lat, lng] -> polilínea codificada."""
+    points = np.asarray(points, dtype=np.float64)
+    if not len(points):
+        return ''
+
+    scaled = np.round(points * PRECISION).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).reshape(-1)
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+
+    # Cada valor se parte en bloques de 5 bits; todos menos el último llevan el bit 0x20
+    chunk_count = np.maximum(1, (np.floor(np.log2(np.maximum(values, 1))).astype(np.int64) + 5) // 5)
+    shifts = 5 * np.arange(chunk_count.max())
+    chunks = (values[:, None] >> shifts) & 0x1f
+    position = np.arange(len(shifts))
+    chunks |= np.where(position < chunk_count[:, None] - 1, 0x20, 0)
+    used = position < chunk_count[:, None]
+    return (chunks[used] + 63).astype(np.uint8).tobytes().decode('ascii')
+
+
+def significance(points, min_tolerance=0.0):
+    """
+    Douglas-Peucker iterativo que, en lugar de una sola tolerancia, devuelve
+    para cada punto la mayor tolerancia a la que sobrevive: la distancia a la
+    que se eligió, acotada por la de los puntos que partieron su tramo antes.
+    `points[significance(points) > t]` es la simplificación con tolerancia `t`,
+    así que una sola pasada sirve para todas las resoluciones.
+
+    Cada iteración procesa a la vez todos los tramos pendientes del mismo
+    nivel; los tramos cuyo punto más lejano no supera `min_tolerance` no se
+    siguen partiendo.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    n = len(points)
+    result = np.zeros(n)
+    if n:
+        result[0] = result[-1] = np.inf
+    if n < 3:
+        return result
+
+    starts, ends, bounds = np.array([0]), np.array([n - 1]), np.array([np.inf])
+
+    while len(starts):
+        interior = ends - starts - 1
+        pending = interior > 0
+        starts, ends, bounds, interior = starts[pending], ends[pending], bounds[pending], interior[pending]
+        if not len(starts):
+            break
+
+        # Índices de los puntos interiores de todos los tramos y el tramo de cada uno
+        offsets = np.concatenate(([0], np.cumsum(interior)[:-1]))
+        segment = np.repeat(np.arange(len(starts)), interior)
+        index = np.repeat(starts + 1, interior) + np.arange(interior.sum()) - np.repeat(offsets, interior)
+
+        a, b = points[starts][segment], points[ends][segment]
+        direction = b - a
+        length = np.hypot(direction[:, 0], direction[:, 1])
+        relative = points[index] - a
+        # Distancia perpendicular a la recta a-b (producto cruzado / longitud); al punto a si a == b
+        cross = np.abs(direction[:, 0] * relative[:, 1] - direction[:, 1] * relative[:, 0])
+        distances = np.where(
+            length > 0,
+            cross / np.where(length > 0, length, 1),
+            np.hypot(relative[:, 0], relative[:, 1]),
+        )
+
+        # Punto más lejano de cada tramo
+        farthest = np.maximum.reduceat(distances, offsets)
+        first = np.flatnonzero(distances == farthest[segment])
+        first = first[np.unique(segment[first], return_index=True)[1]]
+
+        split = farthest > min_tolerance
+        chosen = index[first][split]
+        chosen_bounds = np.minimum(farthest[split], bounds[split])
+        result[chosen] = chosen_bounds
+        starts = np.concatenate((starts[split], chosen))
+        ends = np.concatenate((chosen, ends[split]))
+        bounds = np.concatenate((chosen_bounds, chosen_bounds))
+
+    return result
+
+
+def simplify(points, tolerance):
+    """
+    Douglas-Peucker: conserva los puntos que se alejan más de `tolerance`
+    (en grados) del segmento que los aproxima.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    if len(points) < 3 or tolerance <= 0:
+        return points
+    return points[significance(points, tolerance) > tolerance]
@@ -0,0 +1,161 @@
+"""
+Tabla de agregados diarios (`DailyRollup`) para las vistas del dashboard.
+
+La sincronización recalcula solo los días que tocó y las vistas leen de aquí
+en lugar de recorrer `Activity`, así el coste de una página depende del número
+de días mostrados y no del historial completo del atleta.
+"""
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import ExtractIsoYear, ExtractWeek, TruncMonth
+
+from .models import Activity, DailyRollup
+
+
+def refresh_rollups(athlete_id, days):
+    """Recalcula los agregados de `days` a partir de las actividades de esos días."""
+    days = set(days)
+    if not days:
+        return
+
+    with transaction.atomic():
+        DailyRollup.objects.filter(athlete_id=athlete_id, day__in=days).delete()
+        _insert_rollups(Activity.objects.filter(athlete_id=athlete_id, calculated_day__in=days))
+
+
+def active_days(athlete_id, days):
+    """Subconjunto de `days` en los que el atleta tiene alguna actividad."""
+    if not days:
+        return set()
+    return set(DailyRollup.objects.filter(
+        athlete_id=athlete_id, day__in=days
+    ).values_list('day', flat=True).distinct())
+
+
+def rebuild_rollups(athlete_id=None):
+    """Reconstruye la tabla desde cero (para un atleta o para todos). Devuelve las filas creadas."""
+    activities = Activity.objects.all()
+    rollups = DailyRollup.objects.all()
+    if athlete_id is not None:
+        activities = activities.filter(athlete_id=athlete_id)
+        rollups = rollups.filter(athlete_id=athlete_id)
+
+    with transaction.atomic():
+        rollups.delete()
+        return _insert_rollups(activities)
+
+
+def _insert_rollups(activities):
+    rows = activities.values('athlete_id', 'calculated_day', 'type').annotate(
+        total_count=Count('id'),
+        total_distance=Sum('distance'),
+        total_moving_time=Sum('moving_time'),
+        total_elevation=Sum('total_elevation_gain'),
+        total_training_load=Sum('training_load'),
+    ).order_by()
+
+    created = DailyRollup.objects.bulk_create([
+        DailyRollup(
+            athlete_id=row['athlete_id'],
+            day=row['calculated_day'],
+            type=row['type'],
+            count=row['total_count'],
+            distance=row['total_distance'] or 0.0,
+            moving_time=row['total_moving_time'] or 0,
+            elevation=row['total_elevation'] or 0.0,
+            training_load=row['total_training_load'] or 0.0,
+        )
+        for row in rows
+    ], batch_size=500)
+    return len(created)
+
+
+# --- Consultas para las vistas ---
+
+def summarize_periods(athlete, periods, end_day):
+    """
+    Totales de varios periodos en una sola consulta.
+    `periods` es un dict `{nombre: primer_día}`; todos terminan en `end_day` (incluido).
+    Devuelve `{nombre: {'count', 'distance' (km), 'elevation' (m), 'time' (h)}}`.
+    """
+    aggregates = {}
+    for name, start_day in periods.items():
+        in_period = Q(day__gte=start_day)
+        aggregates[f'{name}__count'] = Sum('count', filter=in_period)
+        aggregates[f'{name}__distance'] = Sum('distance', filter=in_period)
+        aggregates[f'{name}__elevation'] = Sum('elevation', filter=in_period)
+        aggregates[f'{name}__time'] = Sum('moving_time', filter=in_period)
+
+    raw = DailyRollup.objects.filter(
+        athlete=athlete,
+        day__gte=min(periods.values()),
+        day__lte=end_day,
+    ).aggregate(**aggregates)
+
+    summaries = {}
+    for name in periods:
+        count = raw[f'{name}__count'] or 0
+        distance = (raw[f'{name}__distance'] or 0) / 1000.0
+        elevation = raw[f'{name}__elevation'] or 0
+        time = (raw[f'{name}__time'] or 0) / 3600.0
+        summaries[name] = {
+            'count': count,
+            'distance': round(distance, 2),
+            'elevation': round(elevation, 2),
+            'time': round(time, 2),
+        }
+    return summaries
+
+
+def type_distribution(athlete):
+    """Número de actividades por tipo, de mayor a menor."""
+    return DailyRollup.objects.filter(
+        athlete=athlete
+    ).values('type').annotate(
+        count=Sum('count')
+    ).order_by('-count')
+
+
+def activity_types(athlete):
+    """Tipos de actividad distintos del atleta, en orden alfabético."""
+    return list(DailyRollup.objects.filter(
+        athlete=athlete
+    ).values_list('type', flat=True).distinct().order_by('type'))
+
+
+def weekly_summary(athlete, since):
+    """Totales por semana ISO desde `since`, de la más reciente a la más antigua."""
+    return DailyRollup.objects.filter(
+        athlete=athlete,
+        day__gte=since
+    ).annotate(
+        year=ExtractIsoYear('day'),
+        week=ExtractWeek('day')
+    ).values(
+        'year', 'week'
+    ).annotate(
+        count=Sum('count'),
+        distance=Sum(F('distance') / 1000.0), # Convertir a km en la DB
+        elevation=Sum('elevation'),
+        time=Sum(F('moving_time') / 3600.0)    # Convertir a horas en la DB
+    ).order_by('-year', '-week')
+
+
+def monthly_summary(athlete, since):
+    """
+    Totales por mes desde `since`, del más reciente al más antiguo. Cada fila
+    lleva el mes como `month_key` ('YYYY-MM'); se agrupa con `TruncMonth`, que
+    funciona igual en SQLite y en PostgreSQL.
+    """
+    rows = DailyRollup.objects.filter(
+        athlete=athlete,
+        day__gte=since
+    ).annotate(
+        month=TruncMonth('day')
+    ).values('month').annotate(
+        count=Sum('count'),
+        distance=Sum(F('distance') / 1000.0),
+        elevation=Sum('elevation'),
+        time=Sum(F('moving_time') / 3600.0)
+    ).order_by('-month')
+    return [{'month_key': row.pop('month').strftime('%Y-%m'), **row} for row in rows]
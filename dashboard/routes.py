@@ -0,0 +1,243 @@
+"""
+Detección de actividades por la misma ruta.
+
+Al sincronizar, cada `summary_polyline` se convierte en una huella:
+- las celdas de una rejilla de ~200 m que cruza el recorrido (muestreado cada
+  `SAMPLE_SPACING` m para no saltarse celdas), guardadas en `RouteCell` como
+  índice invertido `(atleta, celda) -> actividad`;
+- la forma del recorrido remuestreada a `SHAPE_POINTS` puntos equidistantes.
+
+Para una actividad, los candidatos salen del índice invertido (las que
+comparten la mayoría de sus celdas, como mucho `MAX_CANDIDATES`) y se
+confirman con la distancia de Hausdorff entre las formas, que se calcula por
+bloques de puntos y se abandona en cuanto un bloque supera el umbral. Las
+coincidencias se ordenan por esa distancia: primero las más parecidas.
+Hausdorff no depende del sentido: una ruta recorrida al revés también cuenta.
+"""
+import math
+
+import numpy as np
+from django.db import connection
+from django.db.models import Count
+
+from .geo import EARTH_RADIUS_KM
+from .models import Activity, RouteCell, RouteFingerprint
+from .polyline import DECODE_ERRORS, decode
+
+CELL_SIZE = 0.002  # grados, ~200 m
+CELL_COLUMNS = int(round(360 / CELL_SIZE))
+SAMPLE_SPACING = 50.0  # metros
+SHAPE_POINTS = 64
+
+# Criterios de coincidencia
+MIN_SHARED_CELLS = 0.6        # fracción de celdas de la actividad que debe compartir el candidato
+MAX_LENGTH_DIFFERENCE = 0.2   # diferencia relativa de longitud
+MAX_HAUSDORFF = 200.0         # metros
+# Candidatos del índice invertido que se comparan con Hausdorff por búsqueda
+MAX_CANDIDATES = 200
+# Puntos de la forma por bloque al calcular Hausdorff (cada bloque, una matriz bloque x SHAPE_POINTS)
+HAUSDORFF_CHUNK = 16
+
+EARTH_RADIUS_M = EARTH_RADIUS_KM * 1000
+
+
+def _to_meters(points, origin):
+    """Proyección equirectangular local (suficiente a escala de una actividad)."""
+    lat0 = math.radians(origin[0])
+    scale = np.radians(1) * EARTH_RADIUS_M
+    return np.column_stack((
+        (points[:, 1] - origin[1]) * scale * math.cos(lat0),
+        (points[:, 0] - origin[0]) * scale,
+    ))
+
+
+def _resample(points, meters, positions):
+    """Interpola `points` en las distancias acumuladas `positions` (en metros)."""
+    along = np.concatenate(([0.0], np.cumsum(np.hypot(*np.diff(meters, axis=0).T))))
+    return np.column_stack((
+        np.interp(positions, along, points[:, 0]),
+        np.interp(positions, along, points[:, 1]),
+    ))
+
+
+def route_cells(points):
+    """Celdas distintas de la rejilla por las que pasan los puntos."""
+    rows = np.floor((points[:, 0] + 90) / CELL_SIZE).astype(np.int64)
+    columns = np.floor((points[:, 1] + 180) / CELL_SIZE).astype(np.int64) % CELL_COLUMNS
+    return np.unique(rows * CELL_COLUMNS + columns)
+
+
+def fingerprint(polyline):
+    """
+    Huella de una polilínea: `{'length', 'cells', 'shape'}`, o `None` si el
+    recorrido es demasiado corto para compararlo.
+    """
+    points = decode(polyline)
+    if len(points) < 2:
+        return None
+    meters = _to_meters(points, points[0])
+    length = float(np.hypot(*np.diff(meters, axis=0).T).sum())
+    if length < SAMPLE_SPACING:
+        return None
+
+    dense = _resample(points, meters, np.arange(0.0, length + SAMPLE_SPACING, SAMPLE_SPACING).clip(max=length))
+    return {
+        'length': length,
+        'cells': route_cells(dense),
+        'shape': _resample(points, meters, np.linspace(0.0, length, SHAPE_POINTS)).astype('<f4'),
+    }
+
+
+def refresh_routes(athlete_id, polylines):
+    """
+    Recalcula las huellas de `{activity_id: summary_polyline}` de un atleta y
+    sus celdas en el índice invertido.
+    """
+    RouteCell.objects.filter(activity_id__in=polylines.keys()).delete()
+
+    fingerprints, cells, without_route = [], [], []
+    for activity_id, polyline in polylines.items():
+        try:
+            route = fingerprint(polyline) if polyline else None
+        except DECODE_ERRORS:
+            # Polilínea truncada o mal formada: la actividad se queda sin huella
+            route = None
+        if route is None:
+            without_route.append(activity_id)
+            continue
+        fingerprints.append(RouteFingerprint(
+            activity_id=activity_id,
+            athlete_id=athlete_id,
+            length=route['length'],
+            cell_count=len(route['cells']),
+            shape=route['shape'].tobytes(),
+        ))
+        cells.extend((athlete_id, activity_id, cell) for cell in route['cells'].tolist())
+
+    if without_route:
+        RouteFingerprint.objects.filter(activity_id__in=without_route).delete()
+    if fingerprints:
+        RouteFingerprint.objects.bulk_create(
+            fingerprints,
+            update_conflicts=True,
+            unique_fields=['activity'],
+            update_fields=['athlete', 'length', 'cell_count', 'shape'],
+        )
+        _insert_cells(cells)
+
+
+def _insert_cells(rows):
+    """
+    Inserta las filas `(athlete_id, activity_id, cell)` del índice invertido.
+    Son decenas por actividad: un `executemany` directo evita construir un
+    objeto del modelo por celda como haría `bulk_create`.
+    """
+    table = connection.ops.quote_name(RouteCell._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {table} (athlete_id, activity_id, cell) VALUES (%s, %s, %s)',
+            rows,
+        )
+
+
+def _directed_hausdorff(a_m, b_m, bound):
+    """Mayor distancia de un punto de `a_m` a `b_m`, o `None` en cuanto un bloque supera `bound`."""
+    worst = 0.0
+    for start in range(0, len(a_m), HAUSDORFF_CHUNK):
+        chunk = a_m[start:start + HAUSDORFF_CHUNK]
+        nearest = np.hypot(*(chunk[:, None, :] - b_m[None, :, :]).transpose(2, 0, 1)).min(axis=1).max()
+        if nearest > bound:
+            return None
+        worst = max(worst, nearest)
+    return worst
+
+
+def hausdorff_distance(a, b, bound=MAX_HAUSDORFF):
+    """
+    Distancia de Hausdorff en metros entre dos formas `[lat, lng]`, o `None`
+    si supera `bound`. Cada dirección se recorre por bloques de
+    `HAUSDORFF_CHUNK` puntos y se abandona en el primero que pasa de `bound`.
+    """
+    a_m, b_m = _to_meters(a, a[0]), _to_meters(b, a[0])
+    forward = _directed_hausdorff(a_m, b_m, bound)
+    if forward is None:
+        return None
+    backward = _directed_hausdorff(b_m, a_m, bound)
+    if backward is None:
+        return None
+    return float(max(forward, backward))
+
+
+def find_same_route(activity, limit=5, max_candidates=MAX_CANDIDATES):
+    """
+    Actividades del atleta por la misma ruta, de la más parecida a la menos
+    (a igual distancia, la más reciente primero), cada una con
+    `route_deviation` (Hausdorff en metros). Devuelve `None` si la actividad
+    no tiene huella (sin mapa).
+
+    `max_candidates` limita cuántas actividades del índice invertido (las que
+    más celdas comparten) se comparan con Hausdorff (`None`: todas). Con
+    muchas repeticiones de una ruta, una coincidencia que comparta menos
+    celdas que otras puede quedarse fuera aunque su forma sea más parecida.
+    """
+    route = RouteFingerprint.objects.filter(activity_id=activity.id).first()
+    if route is None:
+        return None
+
+    # 1. Índice invertido: actividades que comparten la mayoría de las celdas
+    own_cells = RouteCell.objects.filter(activity_id=activity.id).values('cell')
+    candidates = (
+        RouteCell.objects
+        .filter(athlete_id=route.athlete_id, cell__in=own_cells)
+        .exclude(activity_id=activity.id)
+        .values('activity_id')
+        .annotate(shared=Count('id'))
+        .filter(shared__gte=math.ceil(route.cell_count * MIN_SHARED_CELLS))
+        .order_by('-shared')
+    )
+    if max_candidates is not None:
+        candidates = candidates[:max_candidates]
+    shared = {row['activity_id']: row['shared'] for row in candidates}
+    if not shared:
+        return []
+
+    # 2. Longitud parecida y la misma parte del mapa en ambas direcciones
+    shape = np.frombuffer(bytes(route.shape), dtype='<f4').reshape(-1, 2).astype(np.float64)
+    deviations = {}
+    for other in RouteFingerprint.objects.filter(activity_id__in=shared.keys()):
+        if abs(other.length - route.length) > MAX_LENGTH_DIFFERENCE * route.length:
+            continue
+        if shared[other.activity_id] < MIN_SHARED_CELLS * other.cell_count:
+            continue
+        other_shape = np.frombuffer(bytes(other.shape), dtype='<f4').reshape(-1, 2).astype(np.float64)
+        deviation = hausdorff_distance(shape, other_shape)
+        if deviation is not None:
+            deviations[other.activity_id] = deviation
+
+    # 3. Las `limit` más parecidas
+    best = sorted(deviations, key=deviations.get)[:limit]
+    matches = list(Activity.objects.filter(id__in=best))
+    for match in matches:
+        match.route_deviation = deviations[match.id]
+    matches.sort(key=lambda match: (match.route_deviation, -match.start_date_local.timestamp(), -match.id))
+    return matches
+
+
+def backfill_routes(queryset=None, chunk_size=500):
+    """Construye las huellas de las actividades con polilínea que aún no la tienen."""
+    queryset = queryset if queryset is not None else Activity.objects.all()
+    rows = queryset.filter(
+        summary_polyline__isnull=False, route__isnull=True
+    ).exclude(summary_polyline='').values_list('athlete_id', 'id', 'summary_polyline').order_by('athlete_id')
+
+    pending = {}
+    built = 0
+    for athlete_id, activity_id, polyline in rows.iterator(chunk_size=chunk_size):
+        pending.setdefault(athlete_id, {})[activity_id] = polyline
+        if len(pending[athlete_id]) >= chunk_size:
+            refresh_routes(athlete_id, pending.pop(athlete_id))
+            built += chunk_size
+    for athlete_id, polylines in pending.items():
+        refresh_routes(athlete_id, polylines)
+        built += len(polylines)
+    return built
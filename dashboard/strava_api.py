@@ -0,0 +1,311 @@
+"""
+Cliente de la API v3 de Strava.
+
+Un único cliente por proceso (`get_client()`) comparte:
+- una `requests.Session` con pool de conexiones de larga duración,
+- un presupuesto de peticiones (token bucket) para la ventana de 15 minutos y
+  la diaria, sincronizado con las cabeceras `X-RateLimit-Limit` / `X-RateLimit-Usage`,
+- reintentos con backoff exponencial y jitter ante respuestas 429 y 5xx
+  (respetando `Retry-After` si viene).
+
+Así las sincronizaciones grandes avanzan al ritmo máximo permitido sin superar
+los límites de Strava. Las llamadas hechas dentro de una petición web (el
+intercambio del código OAuth) no esperan a que se reinicie la ventana: con
+`max_wait` lanzan `RateLimitExceeded` y la vista lo comunica. Es seguro usarlo
+desde varios hilos.
+"""
+import random
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+SHORT_WINDOW = 15 * 60
+DAILY_WINDOW = 24 * 60 * 60
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Espera máxima de una llamada hecha dentro de una petición web
+INTERACTIVE_MAX_WAIT = 5
+
+STREAM_KEYS = ['time', 'distance', 'latlng', 'altitude', 'heartrate', 'cadence', 'watts', 'velocity_smooth']
+
+
+def _seconds_until_reset(window, now=None):
+    """
+    Strava reinicia el contador de 15 minutos en cada cuarto de hora natural
+    y el diario a medianoche UTC.
+    """
+    now = time.time() if now is None else now
+    return window - (now % window)
+
+
+class RateLimitExceeded(requests.RequestException):
+    """No quedan peticiones en el presupuesto y la llamada no puede esperar. `retry_after` en segundos."""
+
+    def __init__(self, retry_after, *args, **kwargs):
+        self.retry_after = retry_after
+        super().__init__(f"Strava rate limit reached, retry in {retry_after:.0f} s", *args, **kwargs)
+
+
+def _retry_after(response):
+    """Segundos de la cabecera `Retry-After` (solo la forma numérica), o `None`."""
+    try:
+        return max(0.0, float(response.headers['Retry-After']))
+    except (KeyError, ValueError):
+        return None
+
+
+class RateLimitBudget:
+    """
+    Token bucket con dos ventanas (15 minutos y diaria).
+
+    Cada `acquire()` consume un token de ambas ventanas y bloquea si alguna está
+    agotada hasta que se reinicie (o como mucho `timeout` segundos, tras los que
+    lanza `RateLimitExceeded`). Las cabeceras de cada respuesta corrigen el
+    consumo local con el valor real que lleva Strava (que incluye peticiones de
+    otros procesos que usan la misma aplicación).
+    """
+
+    def __init__(self, short_limit, daily_limit):
+        self._cond = threading.Condition()
+        self.limits = [short_limit, daily_limit]
+        self.usage = [0, 0]
+        self._window_ids = self._current_window_ids()
+
+    def _current_window_ids(self):
+        now = time.time()
+        return [int(now // SHORT_WINDOW), int(now // DAILY_WINDOW)]
+
+    def _roll_windows(self):
+        window_ids = self._current_window_ids()
+        for i, window_id in enumerate(window_ids):
+            if window_id != self._window_ids[i]:
+                self.usage[i] = 0
+        self._window_ids = window_ids
+
+    def acquire(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                self._roll_windows()
+                if self.usage[0] < self.limits[0] and self.usage[1] < self.limits[1]:
+                    self.usage[0] += 1
+                    self.usage[1] += 1
+                    return
+                window = SHORT_WINDOW if self.usage[0] >= self.limits[0] else DAILY_WINDOW
+                wait = _seconds_until_reset(window) + 1
+                if deadline is not None:
+                    left = deadline - time.monotonic()
+                    if left <= 0:
+                        raise RateLimitExceeded(wait)
+                    wait = min(wait, left)
+                self._cond.wait(timeout=wait)
+
+    def update_from_headers(self, headers):
+        """Ajusta límites y consumo con `X-RateLimit-Limit: 100,1000` y `X-RateLimit-Usage: 20,300`."""
+        limit = _parse_pair(headers.get('X-RateLimit-Limit'))
+        usage = _parse_pair(headers.get('X-RateLimit-Usage'))
+        if not limit and not usage:
+            return
+        with self._cond:
+            self._roll_windows()
+            if limit:
+                self.limits = limit
+            if usage:
+                # Nunca bajamos el consumo: otras peticiones nuestras pueden seguir en vuelo
+                self.usage = [max(local, remote) for local, remote in zip(self.usage, usage)]
+            self._cond.notify_all()
+
+    def exhaust_short_window(self):
+        """Tras un 429 damos la ventana de 15 minutos por agotada."""
+        with self._cond:
+            self._roll_windows()
+            self.usage[0] = self.limits[0]
+
+    def remaining(self):
+        with self._cond:
+            self._roll_windows()
+            return [limit - used for limit, used in zip(self.limits, self.usage)]
+
+
+def _parse_pair(value):
+    if not value:
+        return None
+    try:
+        short, daily = (int(part) for part in value.split(','))
+    except ValueError:
+        return None
+    return [short, daily]
+
+
+class StravaClient:
+    """Cliente con sesión persistente, presupuesto de peticiones y reintentos."""
+
+    def __init__(self, budget=None, max_retries=None, backoff=1.0, pool_size=10, timeout=30):
+        self.budget = budget or RateLimitBudget(
+            getattr(settings, 'STRAVA_RATE_LIMIT_SHORT', 100),
+            getattr(settings, 'STRAVA_RATE_LIMIT_DAILY', 1000),
+        )
+        self.max_retries = getattr(settings, 'STRAVA_API_MAX_RETRIES', 5) if max_retries is None else max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    # --- Núcleo ---
+
+    def request(self, method, url, access_token=None, max_retries=None, max_wait=None, **kwargs):
+        """
+        Ejecuta una petición respetando el presupuesto y reintentando ante 429/5xx.
+        Devuelve la respuesta o lanza `requests.HTTPError` si falla definitivamente.
+
+        `max_retries` sustituye al del cliente (0 = sin reintentos). Con
+        `max_wait` la llamada no espera en total (presupuesto, `Retry-After` y
+        backoff) más de esos segundos: si el límite de Strava lo impide lanza
+        `RateLimitExceeded`, y ante otros fallos devuelve el último error.
+        """
+        headers = kwargs.pop('headers', {})
+        if access_token:
+            headers['Authorization'] = f'Bearer {access_token}'
+        kwargs.setdefault('timeout', self.timeout)
+        max_retries = self.max_retries if max_retries is None else max_retries
+        deadline = None if max_wait is None else time.monotonic() + max_wait
+
+        attempt = 0
+        while True:
+            self.budget.acquire(timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+            try:
+                response = self.session.request(method, url, headers=headers, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                delay = self._backoff_delay(attempt)
+                if attempt >= max_retries or not self._fits(delay, deadline):
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            self.budget.update_from_headers(response.headers)
+            status = response.status_code
+            if status not in RETRY_STATUSES:
+                response.raise_for_status()
+                return response
+
+            delay = _retry_after(response)
+            if status == 429 and delay is None:
+                # Límite superado sin más indicación: esperamos al reinicio de la ventana (acquire bloquea)
+                self.budget.exhaust_short_window()
+                delay = 0.0
+            elif delay is None:
+                delay = self._backoff_delay(attempt)
+
+            if attempt >= max_retries or not self._fits(delay, deadline):
+                if status == 429 and deadline is not None:
+                    raise RateLimitExceeded(delay or _seconds_until_reset(SHORT_WINDOW), response=response)
+                response.raise_for_status()
+            time.sleep(delay)
+            attempt += 1
+
+    def _backoff_delay(self, attempt):
+        # Backoff exponencial con "full jitter"
+        return random.uniform(0, self.backoff * (2 ** attempt))
+
+    @staticmethod
+    def _fits(delay, deadline):
+        return deadline is None or time.monotonic() + delay <= deadline
+
+    def get(self, path, access_token, params=None):
+        return self.request('GET', f"{settings.STRAVA_API_URL}{path}", access_token, params=params).json()
+
+    # --- OAuth ---
+
+    # Las peticiones de tokens no se reintentan: un código o un refresh token que
+    # Strava ya consumió (y rotó) no vale una segunda vez.
+
+    def exchange_code(self, code):
+        """
+        Intercambia el código de autorización por tokens (incluye el atleta).
+        Se llama desde la vista del callback: no espera más de `INTERACTIVE_MAX_WAIT`.
+        """
+        return self._token_request({'code': code, 'grant_type': 'authorization_code'}, max_wait=INTERACTIVE_MAX_WAIT)
+
+    def refresh_token(self, refresh_token):
+        """Obtiene un nuevo access token a partir del refresh token."""
+        return self._token_request({'refresh_token': refresh_token, 'grant_type': 'refresh_token'})
+
+    def _token_request(self, payload, max_wait=None):
+        payload = {**self._app_credentials(), **payload}
+        return self.request(
+            'POST', f"{settings.STRAVA_OAUTH_URL}/token", data=payload, max_retries=0, max_wait=max_wait,
+        ).json()
+
+    # --- Actividades ---
+
+    def list_activities(self, access_token, page=1, per_page=50, after=None, before=None):
+        """`GET /athlete/activities`: una página de `SummaryActivity`."""
+        params = {'page': page, 'per_page': per_page}
+        if after is not None:
+            params['after'] = after
+        if before is not None:
+            params['before'] = before
+        return self.get('/athlete/activities', access_token, params=params)
+
+    def iter_activity_pages(self, access_token, per_page=50, after=None, before=None, start_page=1):
+        """Recorre todas las páginas de `list_activities`, devolviendo `(page, items)`."""
+        page = start_page
+        while True:
+            items = self.list_activities(access_token, page=page, per_page=per_page, after=after, before=before)
+            if not items:
+                return
+            yield page, items
+            if len(items) < per_page:
+                return
+            page += 1
+
+    def get_activity(self, access_token, activity_id):
+        """`GET /activities/{id}`: `DetailedActivity`."""
+        return self.get(f'/activities/{activity_id}', access_token)
+
+    def get_streams(self, access_token, activity_id, keys=None):
+        """
+        `GET /activities/{id}/streams` indexado por tipo:
+        `{'time': {'data': [...], ...}, 'latlng': {...}, ...}`.
+        """
+        params = {'keys': ','.join(keys or STREAM_KEYS), 'key_by_type': 'true'}
+        return self.get(f'/activities/{activity_id}/streams', access_token, params=params)
+
+    # --- Suscripción al webhook (se autentican con las credenciales de la aplicación) ---
+
+    def create_subscription(self, callback_url, verify_token):
+        """`POST /push_subscriptions`. Strava valida antes `callback_url` con el handshake."""
+        payload = {**self._app_credentials(), 'callback_url': callback_url, 'verify_token': verify_token}
+        return self.request('POST', f"{settings.STRAVA_API_URL}/push_subscriptions", data=payload).json()
+
+    def list_subscriptions(self):
+        """`GET /push_subscriptions`: la aplicación tiene como mucho una."""
+        return self.request('GET', f"{settings.STRAVA_API_URL}/push_subscriptions", params=self._app_credentials()).json()
+
+    def delete_subscription(self, subscription_id):
+        self.request('DELETE', f"{settings.STRAVA_API_URL}/push_subscriptions/{subscription_id}", params=self._app_credentials())
+
+    def _app_credentials(self):
+        return {'client_id': settings.STRAVA_CLIENT_ID, 'client_secret': settings.STRAVA_CLIENT_SECRET}
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Devuelve el cliente compartido del proceso (se crea en el primer uso)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = StravaClient()
+    return _client
@@ -0,0 +1,186 @@
+"""
+Importación de la exportación de cuenta de Strava (el zip de "Descargar o
+eliminar tu cuenta") sin pasar por la API.
+
+El zip no se descomprime: `activities.csv` se lee en streaming desde el
+archivo y las actividades se procesan en lotes. Para cada lote se leen sus
+ficheros GPX/TCX/FIT (en paralelo si se piden varios procesos, ver
+`trackfiles.TrackReader`), se insertan las actividades con la misma ingesta
+por lotes que la sincronización (`bulk_upsert_activities`, que también
+construye trazados, huellas de ruta y agregados) y se guardan sus streams con
+un solo upsert. Solo un lote está en memoria a la vez.
+
+Las actividades que ya existen (p. ej. sincronizadas desde la API, que tiene
+datos que el CSV no trae, como la zona horaria) no se modifican salvo con
+`overwrite=True`; los streams solo se guardan para las que aún no los tienen.
+"""
+import csv
+import io
+import re
+import zipfile
+from datetime import datetime, timezone as dt_timezone
+from itertools import islice
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+
+from .cache import bump_generation
+from .ingest import DEFAULT_BATCH_SIZE, bulk_upsert_activities, merge_stats, new_stats
+from .models import Activity, ActivityStream
+from .streams import CHANNELS, build_stream
+from .trackfiles import TrackReader, track_format
+
+ACTIVITIES_CSV = 'activities.csv'
+CSV_DATE_FORMAT = '%b %d, %Y, %I:%M:%S %p'
+
+
+def new_import_stats():
+    return {**new_stats(), 'skipped': 0, 'streams': 0, 'failed': 0}
+
+
+def _number(value, default=0.0):
+    try:
+        return float((value or '').replace(',', ''))
+    except ValueError:
+        return default
+
+
+def _optional_number(value):
+    number = _number(value, None)
+    return number or None
+
+
+def strava_timezone(zone, moment):
+    """Zona horaria en el formato de la API: '(GMT-06:00) America/Mexico_City'."""
+    offset = moment.astimezone(zone).utcoffset()
+    minutes = int(offset.total_seconds() // 60)
+    sign = '-' if minutes < 0 else '+'
+    return f'(GMT{sign}{abs(minutes) // 60:02d}:{abs(minutes) % 60:02d}) {zone.key}'
+
+
+def iter_csv_rows(archive):
+    """
+    Filas de `activities.csv` como dicts. Algunas columnas aparecen dos veces
+    (`Distance` en km y luego en metros, `Elapsed Time`...): vale la última.
+    """
+    with archive.open(ACTIVITIES_CSV) as raw:
+        reader = csv.reader(io.TextIOWrapper(raw, encoding='utf-8-sig', newline=''))
+        header = next(reader, [])
+        columns = {name: index for index, name in enumerate(header)}
+        distance_in_km = header.count('Distance') == 1
+        for row in reader:
+            values = {name: row[index] if index < len(row) else '' for name, index in columns.items()}
+            if distance_in_km:
+                values['Distance'] = str(_number(values['Distance']) * 1000)
+            yield values
+
+
+def csv_activity(row, zone):
+    """Fila del CSV -> dict con la forma de un `SummaryActivity` de la API (sin mapa)."""
+    start = datetime.strptime(row['Activity Date'], CSV_DATE_FORMAT).replace(tzinfo=dt_timezone.utc)
+    distance = _number(row.get('Distance'))
+    elapsed_time = int(_number(row.get('Elapsed Time')))
+    moving_time = int(_number(row.get('Moving Time'))) or elapsed_time
+    average_heartrate = _optional_number(row.get('Average Heart Rate'))
+    # 'Weight Training' -> 'WeightTraining', 'E-Bike Ride' -> 'EBikeRide', como en la API
+    activity_type = re.sub(r'[^A-Za-z]', '', row['Activity Type'])
+    return {
+        'id': int(row['Activity ID']),
+        'name': row['Activity Name'],
+        'distance': distance,
+        'moving_time': moving_time,
+        'elapsed_time': elapsed_time,
+        'total_elevation_gain': _number(row.get('Elevation Gain')),
+        'type': activity_type,
+        'sport_type': activity_type,
+        'average_speed': _number(row.get('Average Speed')) or (distance / moving_time if moving_time else 0.0),
+        'max_speed': _number(row.get('Max Speed')),
+        'has_heartrate': average_heartrate is not None,
+        'average_heartrate': average_heartrate,
+        'max_heartrate': _optional_number(row.get('Max Heart Rate')),
+        'start_date': start.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        # El CSV solo trae la hora UTC: la local se calcula con la zona indicada
+        'start_date_local': start.astimezone(zone).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'timezone': strava_timezone(zone, start),
+        'map': {'summary_polyline': ''},
+        'start_latlng': None,
+        'end_latlng': None,
+        'filename': row.get('Filename', ''),
+    }
+
+
+def import_strava_export(athlete, path, workers=1, batch_size=DEFAULT_BATCH_SIZE, zone=None, overwrite=False,
+                         on_batch=None):
+    """
+    Importa las actividades y streams de la exportación en `path` para el
+    atleta. `zone` es la zona horaria (`ZoneInfo`) de las horas locales (por
+    defecto `settings.TIME_ZONE`). `on_batch(stats)` se llama tras cada lote.
+
+    Devuelve un dict con `inserted`, `updated`, `unchanged`, `skipped`
+    (ya existían), `streams` (guardados) y `failed` (ficheros ilegibles), y la
+    lista de errores en `errors`.
+    """
+    zone = zone or ZoneInfo(settings.TIME_ZONE)
+    stats = new_import_stats()
+    errors = []
+
+    with zipfile.ZipFile(path) as archive, TrackReader(path, workers) as reader:
+        rows = iter_csv_rows(archive)
+        while True:
+            batch = [csv_activity(row, zone) for row in islice(rows, batch_size)]
+            if not batch:
+                break
+            _import_batch(athlete, batch, reader, overwrite, stats, errors)
+            if on_batch:
+                on_batch(stats)
+
+    if stats['streams']:
+        # `bulk_upsert_activities` ya lo hace si cambió alguna actividad, pero no por los streams
+        bump_generation(athlete)
+    stats['errors'] = errors
+    return stats
+
+
+def _import_batch(athlete, batch, reader, overwrite, stats, errors):
+    ids = [item['id'] for item in batch]
+    owners = dict(Activity.objects.filter(id__in=ids).values_list('id', 'athlete_id'))
+    existing = set(owners)
+    foreign = {activity_id for activity_id, owner in owners.items() if owner != athlete.id}
+    with_streams = set(ActivityStream.objects.filter(activity_id__in=ids).values_list('activity_id', flat=True))
+
+    # Actividades de otro atleta (el archivo no es de este atleta): no se tocan
+    batch = [item for item in batch if item['id'] not in foreign]
+    stats['skipped'] += len(foreign)
+
+    to_read = [item for item in batch if track_format(item['filename'])
+               and (overwrite or item['id'] not in with_streams)]
+    tracks = {}
+    for item, (track, error) in zip(to_read, reader.read([item['filename'] for item in to_read])):
+        if error:
+            stats['failed'] += 1
+            errors.append(error)
+        elif track is not None:
+            tracks[item['id']] = track
+
+    items = []
+    for item in batch:
+        if item['id'] in existing and not overwrite:
+            stats['skipped'] += 1
+            continue
+        track = tracks.get(item['id'])
+        if track is not None:
+            summary = track['summary']
+            item['map'] = {'summary_polyline': summary['summary_polyline']}
+            item['start_latlng'], item['end_latlng'] = summary['start_latlng'], summary['end_latlng']
+        items.append(item)
+    merge_stats(stats, bulk_upsert_activities(athlete, items, batch_size=len(items) or 1))
+
+    streams = [build_stream(activity_id, track['streams']) for activity_id, track in tracks.items()]
+    if streams:
+        ActivityStream.objects.bulk_create(
+            streams,
+            update_conflicts=True,
+            unique_fields=['activity'],
+            update_fields=['sample_count', *CHANNELS, 'fetched_at'],
+        )
+        stats['streams'] += len(streams)
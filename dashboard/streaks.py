@@ -0,0 +1,62 @@
+"""
+Motor de rachas (días consecutivos con actividad) para la tarjeta "Activity Streak".
+
+El estado de cada atleta vive en `AthleteStreak` y se actualiza en O(1) por cada
+día nuevo que llega en la sincronización. Solo se recalcula desde cero cuando un
+backfill inserta días anteriores al último día activo o cuando un día se queda
+sin actividades.
+"""
+from datetime import timedelta
+
+from .models import AthleteStreak, DailyRollup
+
+
+def update_streak(athlete_id, added_days=(), removed_days=()):
+    """
+    Aplica al estado de la racha los días que pasaron a tener actividad
+    (`added_days`) o que dejaron de tenerla (`removed_days`).
+    """
+    added_days = sorted(added_days)
+    if not added_days and not removed_days:
+        return
+
+    streak, _ = AthleteStreak.objects.get_or_create(athlete_id=athlete_id)
+
+    if removed_days or (streak.last_day and added_days[0] <= streak.last_day):
+        recompute_streak(athlete_id, streak)
+        return
+
+    for day in added_days:
+        _advance(streak, day)
+
+    streak.save()
+
+
+def recompute_streak(athlete_id, streak=None):
+    """Recalcula la racha recorriendo todos los días activos del atleta."""
+    if streak is None:
+        streak, _ = AthleteStreak.objects.get_or_create(athlete_id=athlete_id)
+
+    streak.current_streak = streak.longest_streak = streak.total_days = 0
+    streak.last_day = None
+
+    days = DailyRollup.objects.filter(
+        athlete_id=athlete_id
+    ).values_list('day', flat=True).distinct().order_by('day')
+
+    for day in days.iterator():
+        _advance(streak, day)
+
+    streak.save()
+    return streak
+
+
+def _advance(streak, day):
+    """Añade un día activo posterior a `streak.last_day`."""
+    if streak.last_day and day - streak.last_day == timedelta(days=1):
+        streak.current_streak += 1
+    else:
+        streak.current_streak = 1
+    streak.last_day = day
+    streak.total_days += 1
+    streak.longest_streak = max(streak.longest_streak, streak.current_streak)
@@ -0,0 +1,140 @@
+"""
+Almacén de streams (series por segundo) de las actividades.
+
+Cada canal se guarda como un array NumPy tipado, little-endian y comprimido
+con zlib en un `BinaryField` de `ActivityStream`. Los canales enteros que
+crecen de forma monótona (tiempo, coordenadas) se guardan como diferencias
+entre muestras, lo que los deja casi en nada tras la compresión; las
+muestras sin dato se conservan como huecos (ver `encode_channel`). Al leer, los bytes se
+convierten directamente en arrays (`np.frombuffer`), sin crear un objeto
+Python por muestra: una salida de 4 horas (~15k muestras) ocupa unos cientos
+de KB en memoria y bastante menos en disco.
+"""
+import zlib
+
+import numpy as np
+from django.utils import timezone
+
+from .models import Activity, ActivityStream
+
+# Canal -> (dtype almacenado, escala, codificado en diferencias)
+CHANNELS = {
+    'time': ('<u4', 1, True),
+    'distance': ('<f4', 1, False),
+    'latlng': ('<i4', 1e7, True),
+    'altitude': ('<f4', 1, False),
+    'heartrate': ('<u2', 1, False),
+    'cadence': ('<u2', 1, False),
+    'watts': ('<u2', 1, False),
+    'velocity_smooth': ('<f4', 1, False),
+}
+
+COMPRESSION_LEVEL = 6
+
+
+def missing_value(dtype):
+    """Valor que marca una muestra sin dato en un canal entero (el extremo que no usan los datos)."""
+    info = np.iinfo(dtype)
+    return info.max if info.min == 0 else info.min
+
+
+def encode_channel(name, values):
+    """
+    Array (o lista) de un canal -> bytes comprimidos para la DB. Las muestras
+    sin dato (`None`/NaN) se guardan como NaN en los canales float y como
+    `missing_value` en los enteros.
+    """
+    dtype, scale, delta = CHANNELS[name]
+    data = np.asarray(values, dtype=np.float64)
+    if name == 'latlng':
+        data = data.reshape(-1, 2)
+    if np.dtype(dtype).kind in 'iu':
+        missing = np.isnan(data)
+        data = np.round(data * scale)
+        data[missing] = missing_value(dtype)
+    data = data.astype(dtype)
+    if delta:
+        # Diferencias entre muestras consecutivas (por columna en latlng); se deshacen con cumsum
+        # al leer. La resta desborda de forma modular, así que también se recuperan los huecos.
+        data = data.astype(np.int64)
+        data = np.diff(data, axis=0, prepend=np.zeros((1, *data.shape[1:]), dtype=np.int64))
+        data = data.astype(dtype.replace('u', 'i'))
+    return zlib.compress(data.tobytes(), COMPRESSION_LEVEL)
+
+
+def decode_channel(name, blob):
+    """
+    Bytes de la DB -> array NumPy del canal (`latlng` con forma (n, 2) en
+    grados). Un canal entero con huecos se devuelve en float64 con NaN en ellos.
+    """
+    if blob is None:
+        return None
+    dtype, scale, delta = CHANNELS[name]
+    raw = zlib.decompress(bytes(blob))
+    if delta:
+        data = np.frombuffer(raw, dtype=dtype.replace('u', 'i'))
+        if name == 'latlng':
+            data = data.reshape(-1, 2)
+        data = np.cumsum(data, axis=0, dtype=np.int64).astype(dtype)
+    else:
+        data = np.frombuffer(raw, dtype=dtype)
+    if np.dtype(dtype).kind in 'iu':
+        missing = data == missing_value(dtype)
+        if missing.any():
+            data = data.astype(np.float64)
+            data[missing] = np.nan
+    if scale != 1:
+        data = data / scale
+    if name == 'latlng':
+        data = data.reshape(-1, 2)
+    return data
+
+
+def build_stream(activity_id, arrays):
+    """
+    `ActivityStream` sin guardar con los canales de `arrays` (`{canal: array}`).
+    Los canales ausentes quedan en NULL.
+    """
+    arrays = {name: values for name, values in arrays.items() if name in CHANNELS and values is not None}
+    sample_count = max((len(values) for values in arrays.values()), default=0)
+
+    stream = ActivityStream(activity_id=activity_id, sample_count=sample_count, fetched_at=timezone.now())
+    for name, values in arrays.items():
+        setattr(stream, name, encode_channel(name, values))
+    return stream
+
+
+def save_stream_arrays(activity_id, arrays):
+    """Guarda los canales de `arrays` para una actividad. Devuelve el `ActivityStream`."""
+    stream = build_stream(activity_id, arrays)
+    stream.save()
+    return stream
+
+
+def save_api_streams(activity_id, payload):
+    """
+    Guarda la respuesta de `GET /activities/{id}/streams?key_by_type=true`
+    (`{'time': {'data': [...]}, ...}`).
+    """
+    arrays = {name: stream.get('data') for name, stream in (payload or {}).items()}
+    return save_stream_arrays(activity_id, arrays)
+
+
+def load_streams(activity_id, channels=None):
+    """
+    Devuelve `{canal: array}` de una actividad (o `{}` si no tiene streams).
+    Solo se leen de la DB las columnas pedidas en `channels`.
+    """
+    channels = list(channels or CHANNELS)
+    row = ActivityStream.objects.filter(activity_id=activity_id).values('sample_count', *channels).first()
+    if not row or not row['sample_count']:
+        return {}
+    return {name: decode_channel(name, row[name]) for name in channels if row[name] is not None}
+
+
+def pending_activities(athlete, limit):
+    """Actividades del atleta sin streams descargados, de la más reciente a la más antigua."""
+    return Activity.objects.filter(
+        athlete=athlete,
+        stream__isnull=True,
+    ).order_by('-start_date_local', '-id')[:limit]
@@ -1,3 +1,1938 @@
-from django.test import TestCase
+import base64
+import csv
+import gzip
+import io
+import json
+import math
+import re
+import shutil
+import tempfile
+import threading
+import warnings
+import zipfile
+import zlib
+from contextlib import nullcontext
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Max, Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+import numpy as np
+import requests
+
+from .cache import bump_generation, cached, get_athlete, get_cache, get_stats
+from .analysis import (
+    HEARTRATE_ZONES, MAX_SAMPLE_GAP, analyze_streams, best_average_by_duration, best_efforts_by_distance,
+    get_analysis, normalized_power, smoothed_elevation_gain, time_in_zones,
+)
+from .export import export_activities, read_columnar
+from .fit import FitError, decode_fit, encode_fit, read_fit
+from .geo import bounding_box, haversine_km, nearby_activities
+from . import heatmap as heatmap_module
+from .heatmap import EMPTY_TILE, render_heatmap, version_dir
+from .ingest import bulk_upsert_activities, delete_activities
+from .jobs import claim_next_job, enqueue_event, enqueue_sync, requeue_stale_jobs, run_job
+from .maps import sync_maps
+from .models import (
+    Activity, ActivityTrack, Athlete, AthleteStreak, DailyRollup, Heatmap, MapSyncCheckpoint, RouteFingerprint, SyncJob,
+    TrainingLoad, YearlyProgress,
+)
+from .pagination import NEXT, PREVIOUS, InvalidCursor, decode_cursor, encode_cursor, paginate_keyset
+from .polyline import decode, encode
+from .rollups import monthly_summary, rebuild_rollups, refresh_rollups
+from .routes import find_same_route, hausdorff_distance
+from .streaks import recompute_streak
+from .strava_export import import_strava_export
+from .strava_api import RateLimitBudget, RateLimitExceeded, StravaClient
+from .streams import decode_channel, encode_channel, load_streams, save_api_streams
+from .tokens import refresh_expiring_tokens, refresh_strava_token
+from .training import activity_load, rebuild_training_load, training_series
+from .yearly import cumulative_progress, day_index, decode_days, rebuild_yearly_progress, same_day_comparison
+
+ACTIVITY_TYPES = ['Run', 'Ride', 'Swim', 'Walk']
+
+# Una línea de EXPLAIN QUERY PLAN que recorre una tabla del dashboard sin índice
+FULL_SCAN = re.compile(r'\bSCAN (dashboard_\w+)(?! USING)')
+# Ordenar actividades en memoria implica leer todas las del atleta antes del LIMIT
+ACTIVITY_SORT = 'USE TEMP B-TREE FOR ORDER BY'
+
+
+def strava_activity(activity_id, start, activity_type, latlng=None):
+    """Un `SummaryActivity` mínimo como los que devuelve la API."""
+    start = start.strftime('%Y-%m-%dT%H:%M:%SZ')
+    return {
+        'id': activity_id,
+        'name': f'Activity {activity_id}',
+        'distance': 5000.0 + activity_id,
+        'moving_time': 1800,
+        'elapsed_time': 1900,
+        'total_elevation_gain': 50.0,
+        'type': activity_type,
+        'sport_type': activity_type,
+        'average_speed': 2.8,
+        'max_speed': 4.1,
+        'start_date': start,
+        'start_date_local': start,
+        'timezone': '(GMT-06:00) America/Mexico_City',
+        'map': {'summary_polyline': None},
+        'start_latlng': latlng,
+        'end_latlng': latlng,
+    }
+
+
+def make_athlete(athlete_id=1, **fields):
+    """Atleta de prueba con tokens que no caducan (salvo que `fields` diga otra cosa)."""
+    values = {
+        'firstname': 'Test', 'lastname': str(athlete_id),
+        'access_token': 'token', 'refresh_token': 'refresh', 'expires_at': 2 ** 31 - 1,
+    }
+    return Athlete.objects.create(id=athlete_id, **{**values, **fields})
+
+
+def activity_on(activity_id, day, activity_type='Run', **fields):
+    """`strava_activity` que empieza a las 8:00 UTC de `day`, con los campos de `fields` sustituidos."""
+    start = datetime(day.year, day.month, day.day, 8, tzinfo=dt_timezone.utc)
+    return {**strava_activity(activity_id, start, activity_type), **fields}
+
+
+def make_activity(athlete, activity_id, day, activity_type='Run', **fields):
+    """Sincroniza una actividad de `activity_on` para `athlete`. Devuelve las estadísticas de la ingesta."""
+    return bulk_upsert_activities(athlete, [activity_on(activity_id, day, activity_type, **fields)])
+
+
+def use_temp_heatmap_dir(test, **overrides):
+    """Teselas del mapa de calor en un directorio temporal mientras dura `test` (nunca en el checkout)."""
+    tile_dir = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, tile_dir, ignore_errors=True)
+    settings_override = override_settings(STRAVA_HEATMAP_DIR=tile_dir, **overrides)
+    settings_override.enable()
+    test.addCleanup(settings_override.disable)
+    return tile_dir
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN checks are written for SQLite')
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class QueryPlanTests(TestCase):
+    """
+    Regresiones de rendimiento de las vistas: cada consulta sobre las tablas del
+    dashboard debe usar un índice y el número de consultas por página no debe
+    crecer con el número de actividades (N+1).
+    """
+
+    ACTIVITIES_PER_ATHLETE = 400
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now().replace(microsecond=0)
+        # Dos atletas: los índices deben separar sus actividades
+        for athlete_id in (1, 2):
+            athlete = make_athlete(athlete_id)
+            items = [
+                strava_activity(
+                    athlete_id * 100000 + i,
+                    now - timedelta(hours=20 * i),
+                    ACTIVITY_TYPES[i % len(ACTIVITY_TYPES)],
+                    # Inicios repartidos en ~100 km alrededor de la CDMX
+                    [19.0 + (i * 37 % 100) / 100, -99.5 + (i * 61 % 100) / 100],
+                )
+                for i in range(cls.ACTIVITIES_PER_ATHLETE)
+            ]
+            bulk_upsert_activities(athlete, items, batch_size=200)
+        cls.athlete = Athlete.objects.get(id=1)
+
+    def setUp(self):
+        session = self.client.session
+        session['athlete_id'] = self.athlete.id
+        session.save()
+
+    def assertEfficientView(self, url, max_queries):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        queries = [q['sql'] for q in ctx.captured_queries]
+        self.assertLessEqual(
+            len(queries), max_queries,
+            f"{url} ran {len(queries)} queries (budget {max_queries}):\n" + "\n".join(queries),
+        )
+        for sql in queries:
+            self.assertUsesIndexes(sql)
+        return response
+
+    def assertUsesIndexes(self, sql):
+        if 'dashboard_' not in sql or not sql.lstrip().upper().startswith('SELECT'):
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            plan = [row[-1] for row in cursor.fetchall()]
+        for line in plan:
+            self.assertIsNone(
+                FULL_SCAN.search(line),
+                f"Full table scan:\n{sql}\nPlan:\n" + "\n".join(plan),
+            )
+        if 'FROM "dashboard_activity"' in sql:
+            self.assertNotIn(
+                ACTIVITY_SORT, plan,
+                f"Activities sorted without an index:\n{sql}\nPlan:\n" + "\n".join(plan),
+            )
+
+    def test_index(self):
+        response = self.assertEfficientView(reverse('index'), max_queries=6)
+        self.assertIsNotNone(response.context['streak'])
+
+    def test_weekly(self):
+        self.assertEfficientView(reverse('weekly_view'), max_queries=3)
+
+    def test_monthly(self):
+        self.assertEfficientView(reverse('monthly_view'), max_queries=3)
+
+    def test_activities_first_page(self):
+        response = self.assertEfficientView(reverse('activities'), max_queries=4)
+        self.assertEqual(len(response.context['activities']), 20)
+
+    def test_activities_deep_page_filtered(self):
+        oldest = Activity.objects.filter(athlete=self.athlete, type='Run').order_by('start_date_local')[25]
+        url = f"{reverse('activities')}?type=Run&cursor={encode_cursor(oldest, NEXT)}"
+        response = self.assertEfficientView(url, max_queries=4)
+        self.assertEqual(len(response.context['activities']), 20)
+
+    def test_activity_detail(self):
+        activity = Activity.objects.filter(athlete=self.athlete).order_by('start_date_local')[200]
+        self.assertEfficientView(reverse('activity_detail', args=[activity.id]), max_queries=6)
+
+    def test_nearby_activities(self):
+        lat, lng, radius_km = 19.43, -99.13, 12
+        url = f"{reverse('nearby_activities')}?lat={lat}&lng={lng}&radius_km={radius_km}&limit=200"
+        response = self.assertEfficientView(url, max_queries=3)
+
+        expected = {
+            activity.id
+            for activity in Activity.objects.filter(athlete=self.athlete)
+            if haversine_km(lat, lng, activity.start_lat, activity.start_lng) <= radius_km
+        }
+        found = [row['distance_from_point_km'] for row in response.json()['activities']]
+        self.assertTrue(expected)
+        self.assertEqual({row['id'] for row in response.json()['activities']}, expected)
+        self.assertEqual(found, sorted(found))
+
+    def test_sync_starting_point_uses_index(self):
+        with CaptureQueriesContext(connection) as ctx:
+            Activity.objects.filter(athlete=self.athlete).aggregate(Max('start_date'))
+        self.assertUsesIndexes(ctx.captured_queries[0]['sql'])
+
+
+LOCAL_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'cache-tests'}}
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class IngestTests(TestCase):
+    """Upsert por lotes de `bulk_upsert_activities`: clasificación de filas y días recalculados."""
+
+    def setUp(self):
+        self.athlete = make_athlete()
+
+    def generation(self):
+        return Athlete.objects.get(id=self.athlete.id).data_generation
+
+    def test_counts(self):
+        items = [activity_on(i, date(2024, 3, i)) for i in range(1, 6)]
+        self.assertEqual(
+            bulk_upsert_activities(self.athlete, items, batch_size=2),
+            {'inserted': 5, 'updated': 0, 'unchanged': 0},
+        )
+        self.assertEqual(Activity.objects.filter(athlete=self.athlete).count(), 5)
+        generation = self.generation()
+
+        # Una resincronización idéntica no escribe nada ni invalida la caché
+        with CaptureQueriesContext(connection) as queries:
+            stats = bulk_upsert_activities(self.athlete, items, batch_size=2)
+        self.assertEqual(stats, {'inserted': 0, 'updated': 0, 'unchanged': 5})
+        self.assertFalse([q for q in queries.captured_queries if not q['sql'].lstrip().upper().startswith(('SELECT', 'SAVEPOINT', 'RELEASE'))])
+        self.assertEqual(self.generation(), generation)
+
+        items[1] = {**items[1], 'name': 'Renamed'}
+        items.append(activity_on(6, date(2024, 3, 6)))
+        self.assertEqual(
+            bulk_upsert_activities(self.athlete, items, batch_size=2),
+            {'inserted': 1, 'updated': 1, 'unchanged': 4},
+        )
+        self.assertEqual(Activity.objects.get(id=2).name, 'Renamed')
+        self.assertEqual(self.generation(), generation + 1)
+
+    def test_duplicate_id_in_batch(self):
+        # La API puede repetir una actividad al desplazarse las páginas: gana la última versión
+        stats = bulk_upsert_activities(self.athlete, [
+            activity_on(1, date(2024, 3, 1)),
+            activity_on(1, date(2024, 3, 2), name='Latest'),
+            activity_on(2, date(2024, 3, 2)),
+        ])
+        self.assertEqual(stats, {'inserted': 2, 'updated': 0, 'unchanged': 0})
+        activity = Activity.objects.get(id=1)
+        self.assertEqual((activity.name, activity.calculated_day), ('Latest', date(2024, 3, 2)))
+        self.assertEqual(list(DailyRollup.objects.filter(athlete=self.athlete).values_list('day', 'count')), [
+            (date(2024, 3, 2), 2),
+        ])
+
+    def test_moved_activity_refreshes_both_days(self):
+        bulk_upsert_activities(self.athlete, [
+            activity_on(1, date(2024, 3, 1)),
+            activity_on(2, date(2024, 3, 2)),
+        ])
+
+        with mock.patch('dashboard.ingest.refresh_rollups', wraps=refresh_rollups) as refresh:
+            stats = make_activity(self.athlete, 1, date(2024, 3, 5))
+        self.assertEqual(stats, {'inserted': 0, 'updated': 1, 'unchanged': 0})
+        refresh.assert_called_once_with(self.athlete.id, {date(2024, 3, 1), date(2024, 3, 5)})
+
+        self.assertEqual(list(DailyRollup.objects.filter(athlete=self.athlete).values_list('day', 'count')), [
+            (date(2024, 3, 5), 1), (date(2024, 3, 2), 1),
+        ])
+        yearly = YearlyProgress.objects.get(athlete=self.athlete, year=2024, type='')
+        counts = list(decode_days(yearly.count))
+        self.assertEqual(
+            [counts[day_index(date(2024, 3, day))] for day in (1, 2, 5)], [0, 1, 1],
+        )
+        streak = AthleteStreak.objects.get(athlete=self.athlete)
+        self.assertEqual((streak.current_streak, streak.total_days, streak.last_day), (1, 2, date(2024, 3, 5)))
+
+
+class RollupTests(TestCase):
+    """Agregados diarios: el parcheo por días tocados deja lo mismo que una reconstrucción completa."""
+
+    def setUp(self):
+        self.athlete = make_athlete()
+
+    def stored(self):
+        return set(DailyRollup.objects.filter(athlete=self.athlete).values_list(
+            'day', 'type', 'count', 'distance', 'moving_time', 'elevation', 'training_load',
+        ))
+
+    def assertMatchesRebuild(self):
+        patched = self.stored()
+        rebuild_rollups(self.athlete.id)
+        self.assertEqual(self.stored(), patched)
+        return patched
+
+    def test_incremental_matches_rebuild(self):
+        bulk_upsert_activities(self.athlete, [
+            activity_on(1, date(2024, 3, 1)),
+            activity_on(2, date(2024, 3, 1), 'Ride'),
+            activity_on(3, date(2024, 3, 2)),
+            activity_on(4, date(2024, 3, 2)),
+        ])
+        rollups = self.assertMatchesRebuild()
+        self.assertEqual(len(rollups), 3)
+
+        # Una edición que mueve la actividad 3 a otro día recalcula el día de origen y el de destino
+        bulk_upsert_activities(self.athlete, [
+            activity_on(1, date(2024, 3, 1), distance=8000.0),
+            activity_on(3, date(2024, 3, 5)),
+        ])
+        rollups = self.assertMatchesRebuild()
+        days = {(day, activity_type): count for day, activity_type, count, *_ in rollups}
+        self.assertEqual(days, {
+            (date(2024, 3, 1), 'Run'): 1, (date(2024, 3, 1), 'Ride'): 1,
+            (date(2024, 3, 2), 'Run'): 1, (date(2024, 3, 5), 'Run'): 1,
+        })
+
+        # Borrar la última actividad de un día y tipo elimina su fila
+        delete_activities(self.athlete, [2, 4])
+        rollups = self.assertMatchesRebuild()
+        self.assertEqual({(day, activity_type) for day, activity_type, *_ in rollups}, {
+            (date(2024, 3, 1), 'Run'), (date(2024, 3, 5), 'Run'),
+        })
+        self.assertEqual(
+            DailyRollup.objects.get(athlete=self.athlete, day=date(2024, 3, 1)).distance, 8000.0,
+        )
+
+
+class StreakTests(TestCase):
+    """Racha de días consecutivos mantenida por `update_streak` en cada sincronización."""
+
+    def setUp(self):
+        self.athlete = make_athlete()
+
+    def sync_days(self, *days):
+        """Una actividad por día de marzo de 2024; el id es el día del mes."""
+        bulk_upsert_activities(self.athlete, [
+            activity_on(day, date(2024, 3, day)) for day in days
+        ])
+
+    def assertStreak(self, current, longest, total, last_day):
+        streak = AthleteStreak.objects.get(athlete=self.athlete)
+        state = (streak.current_streak, streak.longest_streak, streak.total_days, streak.last_day)
+        self.assertEqual(state, (current, longest, total, date(2024, 3, last_day)))
+
+        # El estado incremental coincide con recorrer todos los días activos
+        recomputed = recompute_streak(self.athlete.id)
+        self.assertEqual(
+            (recomputed.current_streak, recomputed.longest_streak, recomputed.total_days, recomputed.last_day), state,
+        )
+
+    def test_extends_current_streak(self):
+        self.sync_days(1, 2)
+        self.assertStreak(2, 2, 2, 2)
+        self.sync_days(3)
+        self.assertStreak(3, 3, 3, 3)
+
+        # Una segunda actividad en un día ya activo no cuenta dos veces
+        bulk_upsert_activities(self.athlete, [
+            strava_activity(100, datetime(2024, 3, 3, 18, tzinfo=dt_timezone.utc), 'Ride'),
+        ])
+        self.assertStreak(3, 3, 3, 3)
+
+    def test_backfill_bridges_gap(self):
+        self.sync_days(1, 2, 4, 5)
+        self.assertStreak(2, 2, 4, 5)
+        self.sync_days(3)
+        self.assertStreak(5, 5, 5, 5)
+
+    def test_delete_breaks_streak(self):
+        self.sync_days(1, 2, 3, 4, 5)
+        self.assertStreak(5, 5, 5, 5)
+        delete_activities(self.athlete, [3])
+        self.assertStreak(2, 2, 4, 5)
+        delete_activities(self.athlete, [5])
+        self.assertStreak(1, 2, 3, 4)
+
+    def test_longest_streak_in_the_past(self):
+        self.sync_days(1, 2, 3, 6)
+        self.assertStreak(1, 3, 4, 6)
+        self.sync_days(7)
+        self.assertStreak(2, 3, 5, 7)
+
+        # La tarjeta solo muestra la racha actual si hubo actividad hoy o ayer
+        streak = AthleteStreak.objects.get(athlete=self.athlete)
+        self.assertEqual(streak.current_streak_on(date(2024, 3, 8)), 2)
+        self.assertEqual(streak.current_streak_on(date(2024, 3, 9)), 0)
+
+
+class PaginationTests(TestCase):
+    """Paginación por cursor sobre `(start_date_local, id)` en la lista de actividades y en la API."""
+
+    def setUp(self):
+        self.athlete = make_athlete()
+        # Siete actividades con la misma hora de inicio entre dos más antiguas y una más reciente
+        start = datetime(2024, 3, 1, 8, tzinfo=dt_timezone.utc)
+        bulk_upsert_activities(self.athlete, [
+            strava_activity(activity_id, start, 'Run') for activity_id in range(10, 17)
+        ] + [
+            strava_activity(1, start - timedelta(days=1), 'Run'),
+            strava_activity(2, start - timedelta(days=2), 'Ride'),
+            strava_activity(20, start + timedelta(days=1), 'Run'),
+        ])
+        self.expected = [20, 16, 15, 14, 13, 12, 11, 10, 1, 2]
+        session = self.client.session
+        session['athlete_id'] = self.athlete.id
+        session.save()
+
+    def test_ties_broken_by_id(self):
+        queryset = Activity.objects.filter(athlete=self.athlete)
+        pages, cursor = [], None
+        while True:
+            page = paginate_keyset(queryset, cursor, 3)
+            pages.append([activity.id for activity in page['object_list']])
+            if not page['has_next']:
+                break
+            cursor = page['next_cursor']
+        self.assertEqual(pages, [[20, 16, 15], [14, 13, 12], [11, 10, 1], [2]])
+
+        # Hacia atrás desde la última página se recorren las mismas páginas
+        backwards = []
+        while page['has_previous']:
+            page = paginate_keyset(queryset, page['previous_cursor'], 3)
+            backwards.append([activity.id for activity in page['object_list']])
+        self.assertEqual(backwards, pages[-2::-1])
+
+    def test_api_pages_through_ties(self):
+        ids, cursor = [], None
+        while True:
+            params = {'limit': 2, **({'cursor': cursor} if cursor else {})}
+            response = self.client.get(reverse('api_activities'), params)
+            self.assertEqual(response.status_code, 200)
+            ids += [activity['id'] for activity in response.json()['activities']]
+            cursor = response.json()['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(ids, self.expected)
+
+        first = self.client.get(reverse('api_activities'), {'limit': 4, 'type': 'Run'}).json()
+        rest = self.client.get(reverse('api_activities'), {'limit': 4, 'type': 'Run', 'cursor': first['next_cursor']})
+        self.assertEqual([activity['id'] for activity in rest.json()['activities']], [13, 12, 11, 10])
+
+    def test_malformed_cursor_rejected(self):
+        activity = Activity.objects.get(id=13)
+        self.assertEqual(decode_cursor(encode_cursor(activity, PREVIOUS)), (activity.start_date_local, 13, PREVIOUS))
+        self.assertIsNone(decode_cursor(''))
+
+        valid = encode_cursor(activity, NEXT)
+        naive = base64.urlsafe_b64encode(b'["2024-03-01T08:00:00",13,"n"]').decode()
+        for cursor in (
+            'not a cursor', valid[:-3], valid + '!!', naive,
+            base64.urlsafe_b64encode(b'["2024-03-01T08:00:00+00:00",13,"x"]').decode(),
+            base64.urlsafe_b64encode(b'["2024-03-01T08:00:00+00:00","13","n"]').decode(),
+            base64.urlsafe_b64encode(b'{"id":13}').decode(),
+        ):
+            with self.assertRaises(InvalidCursor, msg=cursor):
+                decode_cursor(cursor)
+            response = self.client.get(reverse('api_activities'), {'cursor': cursor})
+            self.assertEqual((response.status_code, response.json()), (400, {'error': 'Invalid cursor'}), cursor)
+            self.assertEqual(self.client.get(reverse('activities'), {'cursor': cursor}).status_code, 400, cursor)
+
+        response = self.client.get(reverse('activities'), {'cursor': valid})
+        self.assertEqual([activity.id for activity in response.context['activities']], [12, 11, 10, 1, 2])
+
+
+class CacheTests(TestCase):
+    """Caché de vistas versionada por la generación de datos del atleta."""
+
+    def setUp(self):
+        get_cache().clear()
+        self.athlete = make_athlete()
+
+    def test_bump_generation_invalidates_entries(self):
+        builder = mock.Mock(side_effect=[1, 2])
+        self.assertEqual(cached(self.athlete, 'view', builder, 'page'), 1)
+        self.assertEqual(cached(self.athlete, 'view', builder, 'page'), 1)
+        self.assertEqual(builder.call_count, 1)
+
+        bump_generation(self.athlete)
+        self.assertEqual(self.athlete.data_generation, 1)
+        self.assertIsNotNone(self.athlete.data_updated_at)
+        self.assertEqual(cached(self.athlete, 'view', builder, 'page'), 2)
+        self.assertEqual(builder.call_count, 2)
+
+    def test_bump_generation_evicts_athlete(self):
+        self.assertEqual(get_athlete(self.athlete.id).data_generation, 0)
+        bump_generation(self.athlete)
+        self.assertEqual(get_athlete(self.athlete.id).data_generation, 1)
+
+    def test_sync_invalidates_views(self):
+        now = timezone.now()
+        bulk_upsert_activities(self.athlete, [strava_activity(1, now, 'Run')])
+        generation = self.athlete.data_generation
+        session = self.client.session
+        session['athlete_id'] = self.athlete.id
+        session.save()
+        self.assertEqual(self.client.get(reverse('api_monthly')).json()['months'][0]['count'], 1)
+
+        # Sin cambios no se invalida nada; una actividad nueva sí
+        bulk_upsert_activities(self.athlete, [strava_activity(1, now, 'Run')])
+        self.assertEqual(self.athlete.data_generation, generation)
+        bulk_upsert_activities(self.athlete, [strava_activity(2, now, 'Run')])
+        self.assertEqual(self.athlete.data_generation, generation + 1)
+        self.assertEqual(self.client.get(reverse('api_monthly')).json()['months'][0]['count'], 2)
+
+    def test_stats_need_shared_backend(self):
+        cached(self.athlete, 'view', lambda: 1)
+        with self.assertRaises(CommandError):
+            call_command('cache_stats', stdout=io.StringIO())
+
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        file_cache = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': cache_dir}}
+        with override_settings(CACHES=file_cache):
+            cached(self.athlete, 'view', lambda: 1)
+            cached(self.athlete, 'view', lambda: 1)
+            cached(self.athlete, 'view', lambda: 1)
+            self.assertEqual(get_stats(), {'hits': 2, 'misses': 1, 'hit_ratio': 2 / 3})
+            out = io.StringIO()
+            call_command('cache_stats', '--reset', stdout=out)
+            self.assertIn('Hits: 2  Misses: 1', out.getvalue())
+            self.assertEqual(get_stats()['hits'], 0)
+
+
+class GeoTests(TestCase):
+    """Búsqueda por radio: la caja de celdas debe contener todo el círculo."""
+
+    def test_bounding_box_high_latitude(self):
+        # Punto del círculo de 500 km con la longitud máxima (a ~70.49° N, 13.25° E)
+        lat, lng = 70.4918, 13.23
+        self.assertLess(haversine_km(70, 0, lat, lng), 500)
+        min_lat, max_lat, min_lng, max_lng = bounding_box(70, 0, 500)
+        self.assertTrue(min_lng < -lng and lng < max_lng)
+        self.assertGreater(max_lng, 13.25)
+        # Cerca del polo el círculo abarca todas las longitudes
+        self.assertEqual(bounding_box(85, 0, 600)[2:], (-180, 180))
+
+    def test_nearby_activities_high_latitude(self):
+        athlete = make_athlete()
+        bulk_upsert_activities(athlete, [
+            strava_activity(1, timezone.now(), 'Run', [70.4918, 13.23]),
+            strava_activity(2, timezone.now(), 'Run', [70.4918, 13.35]),
+        ])
+        found = nearby_activities(athlete, 70, 0, 500)
+        self.assertEqual([activity.id for _, activity in found], [1])
+
+
+class TrackTests(TestCase):
+    """Trazados del mapa: decodificación en el servidor y resolución según el zoom."""
+
+    def test_decode_reference_polyline(self):
+        # Ejemplo de la documentación del formato de Google
+        points = decode('_p~iF~ps|U_ulLnnqC_mqNvxq`@')
+        self.assertEqual(points.round(5).tolist(), [[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]])
+        self.assertEqual(encode(points), '_p~iF~ps|U_ulLnnqC_mqNvxq`@')
+
+    def test_track_endpoint_by_zoom(self):
+        athlete = make_athlete()
+        angle = [i / 500 for i in range(3000)]
+        points = [[19.4 + 0.01 * math.sin(a), -99.1 + 0.01 * math.cos(a) + 0.001 * a] for a in angle]
+        item = strava_activity(1, timezone.now(), 'Run')
+        item['map'] = {'summary_polyline': encode(points)}
+        bulk_upsert_activities(athlete, [item])
+
+        session = self.client.session
+        session['athlete_id'] = athlete.id
+        session.save()
+
+        url = reverse('activity_track', args=[1])
+        low = self.client.get(url).json()
+        full = self.client.get(f'{url}?zoom=18').json()
+        self.assertEqual(low['resolution'], 'low')
+        self.assertEqual(full['resolution'], 'full')
+        self.assertEqual(len(full['points']), 3000)
+        self.assertLess(len(low['points']), len(full['points']) // 10)
+        self.assertEqual(low['bounds'], full['bounds'])
+
+    def test_malformed_polyline_keeps_batch(self):
+        athlete = make_athlete()
+        items = [strava_activity(activity_id, timezone.now(), 'Run') for activity_id in (1, 2, 3)]
+        items[0]['map'] = {'summary_polyline': '_p~iF~ps|U_ulLnnqC_mqNvxq`@'}
+        items[1]['map'] = {'summary_polyline': '_p~iF~ps|U_ulLnnqC_mqNvxq`'}  # truncada
+        items[2]['map'] = {'summary_polyline': '_p~iF~ps|Ué'}
+        self.assertEqual(bulk_upsert_activities(athlete, items)['inserted'], 3)
+
+        self.assertEqual(list(ActivityTrack.objects.values_list('activity_id', flat=True)), [1])
+        self.assertFalse(RouteFingerprint.objects.filter(activity_id__in=[2, 3]).exists())
+
+        session = self.client.session
+        session['athlete_id'] = athlete.id
+        session.save()
+        response = self.client.get(reverse('activity_track', args=[2]))
+        self.assertEqual((response.status_code, response.json()['points']), (200, []))
+
+
+def loop_polyline(center_lat, center_lng, radius, points=400, reverse=False):
+    """Polilínea de un circuito circular de `radius` grados."""
+    loop = [
+        [center_lat + radius * math.sin(2 * math.pi * i / points), center_lng + radius * math.cos(2 * math.pi * i / points)]
+        for i in range(points + 1)
+    ]
+    return encode(loop[::-1] if reverse else loop)
+
+
+class StreamCodecTests(TestCase):
+    """Codificación de los canales de los streams: ida y vuelta exacta, huecos incluidos."""
+
+    def round_trip(self, name, values):
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            return decode_channel(name, encode_channel(name, values))
+
+    def test_round_trip(self):
+        time = list(range(0, 600, 2))
+        self.assertEqual(self.round_trip('time', time).tolist(), time)
+        heartrate = [120 + i % 40 for i in range(300)]
+        decoded = self.round_trip('heartrate', heartrate)
+        self.assertEqual(decoded.dtype, np.uint16)
+        self.assertEqual(decoded.tolist(), heartrate)
+        altitude = [2240.5 + i / 10 for i in range(300)]
+        np.testing.assert_allclose(self.round_trip('altitude', altitude), altitude, rtol=1e-6)
+
+    def test_missing_samples(self):
+        decoded = self.round_trip('heartrate', [120, None, 125, float('nan'), 130])
+        self.assertEqual(decoded[[0, 2, 4]].tolist(), [120, 125, 130])
+        self.assertTrue(np.isnan(decoded[[1, 3]]).all())
+        decoded = self.round_trip('watts', [None, 200, 0])
+        self.assertTrue(np.isnan(decoded[0]))
+        self.assertEqual(decoded[1:].tolist(), [200, 0])
+        decoded = self.round_trip('distance', [0.0, None, 10.0])
+        self.assertTrue(np.isnan(decoded[1]))
+
+    def test_latlng(self):
+        angle = np.linspace(0, 6, 2000)
+        latlng = np.column_stack((19.4 + 0.01 * np.sin(angle), -99.1 + 0.01 * np.cos(angle)))
+        decoded = self.round_trip('latlng', latlng.tolist())
+        self.assertEqual(decoded.shape, (2000, 2))
+        np.testing.assert_allclose(decoded, latlng, atol=1e-7)
+
+        # Las diferencias por columna son pequeñas; las de la serie aplanada (lat -> lng) no
+        fixed = np.round(latlng * 1e7).astype(np.int64)
+        flat = zlib.compress(np.diff(fixed.reshape(-1), prepend=0).astype('<i4').tobytes(), 6)
+        self.assertLess(len(encode_channel('latlng', latlng)), len(flat) / 2)
+
+        decoded = self.round_trip('latlng', [[19.4, -99.1], [None, None], [19.5, -99.2]])
+        self.assertTrue(np.isnan(decoded[1]).all())
+        np.testing.assert_allclose(decoded[2], [19.5, -99.2])
+
+    def test_empty(self):
+        for name in ('time', 'heartrate', 'distance'):
+            self.assertEqual(len(self.round_trip(name, [])), 0)
+        self.assertEqual(self.round_trip('latlng', []).shape, (0, 2))
+
+    def test_gaps_skipped_by_analysis(self):
+        time = np.arange(120, dtype=np.float64)
+        heartrate = decode_channel('heartrate', encode_channel('heartrate', [150] * 60 + [None] * 60))
+        watts = decode_channel('watts', encode_channel('watts', [200] * 60 + [None] * 60))
+        results = analyze_streams({'time': time, 'heartrate': heartrate, 'watts': watts}, max_heartrate=200, ftp=250)
+        # Las muestras sin dato no cuentan como 0 W ni como 0 ppm
+        self.assertEqual(sum(zone['seconds'] for zone in results['heartrate_zones']), 60)
+        self.assertAlmostEqual(results['normalized_power'], 200)
+
+    def test_saved_streams(self):
+        athlete = make_athlete()
+        bulk_upsert_activities(athlete, [strava_activity(1, timezone.now(), 'Run')])
+        save_api_streams(1, {
+            'time': {'data': [0, 1, 2]},
+            'latlng': {'data': [[19.4, -99.1], [19.4001, -99.1001], [19.4002, -99.1002]]},
+            'heartrate': {'data': [120, None, 122]},
+        })
+        streams = load_streams(1, ['time', 'latlng', 'heartrate'])
+        self.assertEqual(streams['time'].tolist(), [0, 1, 2])
+        np.testing.assert_allclose(streams['latlng'][2], [19.4002, -99.1002])
+        self.assertTrue(np.isnan(streams['heartrate'][1]))
+
+    def test_sync_streams_skips_athlete_with_rejected_token(self):
+        revoked = make_athlete(1, firstname='Revoked', expires_at=int(timezone.now().timestamp()) - 60)
+        athlete = make_athlete(2)
+        bulk_upsert_activities(revoked, [strava_activity(1, timezone.now(), 'Run')])
+        bulk_upsert_activities(athlete, [strava_activity(2, timezone.now(), 'Run')])
+
+        rejected = requests.Response()
+        rejected.status_code = 400
+        stderr = io.StringIO()
+        with mock.patch('dashboard.tokens.get_client') as token_client, \
+                mock.patch('dashboard.management.commands.sync_streams.get_client') as api_client:
+            token_client.return_value.refresh_token.side_effect = requests.HTTPError(response=rejected)
+            api_client.return_value.get_streams.return_value = {'time': {'data': [0, 1, 2]}}
+            call_command('sync_streams', stdout=io.StringIO(), stderr=stderr)
+
+        self.assertIn('Error refreshing token for Revoked', stderr.getvalue())
+        api_client.return_value.get_streams.assert_called_once_with('token', 2)
+        self.assertEqual(load_streams(2, ['time'])['time'].tolist(), [0, 1, 2])
+
+
+class AnalysisTests(TestCase):
+    """Análisis de streams sobre series sintéticas con resultado conocido."""
+
+    def test_best_efforts_constant_speed(self):
+        speed = 4.0
+        time = np.arange(3000, dtype=np.float64)
+        efforts = best_efforts_by_distance(time, time * speed)
+        self.assertEqual(efforts['400m']['elapsed_time'], 400 / speed)
+        self.assertEqual(efforts['1k']['elapsed_time'], 1000 / speed)
+        self.assertEqual(efforts['10k']['elapsed_time'], 10000 / speed)
+        self.assertNotIn('Half-Marathon', efforts)
+
+    def test_best_effort_finds_fastest_segment(self):
+        # 1 km a 2 m/s, otro a 5 m/s y otro a 2 m/s: el mejor km es el del medio
+        distance = np.concatenate((np.arange(0, 1000, 2.0), np.arange(1000, 2000, 5.0), np.arange(2000, 3001, 2.0)))
+        time = np.arange(len(distance), dtype=np.float64)
+        effort = best_efforts_by_distance(time, distance)['1k']
+        self.assertEqual(effort['elapsed_time'], 200)
+        self.assertEqual(effort['start_time'], 500)
+
+    def test_constant_power(self):
+        watts = np.full(3600, 200.0)
+        self.assertAlmostEqual(normalized_power(watts), 200)
+        best = best_average_by_duration(watts)
+        self.assertEqual(set(best), {'5s', '1min', '5min', '20min', '1h'})
+        self.assertTrue(all(value == 200 for value in best.values()))
+        self.assertIsNone(normalized_power(watts[:10]))
+
+    def test_variable_power_raises_normalized_power(self):
+        # Intervalos de 60 s a 100 W y a 300 W: media de 200 W pero NP mayor
+        watts = np.tile(np.repeat([100.0, 300.0], 60), 30)
+        self.assertAlmostEqual(watts.mean(), 200)
+        self.assertGreater(normalized_power(watts), 220)
+
+    def test_heartrate_zone_boundaries(self):
+        # FC máxima 200: zonas desde 0, 120, 140, 160 y 180 ppm
+        time = np.arange(6, dtype=np.float64)
+        heartrate = np.array([119, 120, 139, 140, 179, 180])
+        zones = time_in_zones(time, heartrate, 200, HEARTRATE_ZONES)
+        self.assertEqual([zone['min'] for zone in zones], [0, 120, 140, 160, 180])
+        self.assertIsNone(zones[-1]['max'])
+        # La última muestra no tiene siguiente: no suma tiempo
+        self.assertEqual([zone['seconds'] for zone in zones], [1, 2, 1, 1, 0])
+
+    def test_zones_skip_pauses(self):
+        time = np.array([0.0, 1.0, 601.0, 602.0])
+        zones = time_in_zones(time, np.array([150, 150, 150, 150]), 200, HEARTRATE_ZONES)
+        self.assertEqual(zones[2]['seconds'], 1 + MAX_SAMPLE_GAP + 1)
+
+    def test_smoothed_elevation_gain(self):
+        # Subida de 100 m con un ruido de ±2 m y periodo igual a la ventana: el suavizado lo elimina
+        altitude = np.linspace(1000, 1100, 1001) + 2 * np.sin(2 * np.pi * np.arange(1001) / 7)
+        self.assertGreater(np.clip(np.diff(altitude), 0, None).sum(), 500)
+        self.assertAlmostEqual(smoothed_elevation_gain(altitude), 100, delta=1)
+        self.assertEqual(smoothed_elevation_gain(np.array([10.0, 12.0, 11.0, 15.0])), 6)
+
+    def test_analyze_streams(self):
+        time = np.arange(1200, dtype=np.float64)
+        results = analyze_streams({
+            'time': time,
+            'distance': time * 5,
+            'watts': np.full(1200, 250),
+            'heartrate': np.full(1200, 150),
+        }, max_heartrate=200, ftp=250)
+        self.assertEqual(results['best_efforts']['5k']['elapsed_time'], 1000)
+        self.assertAlmostEqual(results['normalized_power'], 250)
+        self.assertEqual(results['power_zones'][3]['seconds'], 1199)
+        self.assertEqual(analyze_streams({'time': time[:1]}), {})
+
+    @override_settings(STRAVA_MAX_HEARTRATE=200, STRAVA_FTP=250)
+    def test_cached_analysis_follows_references(self):
+        athlete = make_athlete()
+        make_activity(athlete, 1, date(2024, 3, 1))
+        save_api_streams(1, {
+            'time': {'data': list(range(600))},
+            'heartrate': {'data': [150] * 600},
+            'watts': {'data': [250] * 600},
+        })
+        activity = Activity.objects.get(id=1)
+        results = get_analysis(activity)
+        self.assertEqual(results['references'], {'max_heartrate': 200, 'ftp': 250})
+        self.assertEqual(results['heartrate_zones'][2]['seconds'], 599)
+        with mock.patch('dashboard.analysis.analyze_streams') as analyze:
+            self.assertEqual(get_analysis(activity), results)
+        analyze.assert_not_called()
+
+        # Con otra FC máxima o FTP las zonas guardadas ya no valen
+        with self.settings(STRAVA_MAX_HEARTRATE=170):
+            self.assertEqual(get_analysis(activity)['heartrate_zones'][3]['seconds'], 599)
+        with self.settings(STRAVA_MAX_HEARTRATE=170, STRAVA_FTP=200):
+            results = get_analysis(activity)
+        self.assertEqual(results['references'], {'max_heartrate': 170, 'ftp': 200})
+        self.assertEqual(results['power_zones'][5]['seconds'], 599)
+
+
+class RouteTests(TestCase):
+    """Actividades por la misma ruta: índice invertido de celdas + Hausdorff."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.athlete = make_athlete()
+        start = timezone.now().replace(microsecond=0)
+        routes = {
+            1: loop_polyline(19.40, -99.10, 0.02),
+            2: loop_polyline(19.40, -99.10, 0.02),
+            3: loop_polyline(19.40, -99.10, 0.02, reverse=True),  # Misma ruta al revés
+            4: loop_polyline(19.40, -99.08, 0.02),                # Desplazada ~2 km
+            5: loop_polyline(19.40, -99.10, 0.01),                # Circuito más corto dentro del mismo
+            6: loop_polyline(19.40, -99.10, 0.02),                # De otro atleta
+        }
+        other = make_athlete(2)
+        for activity_id, polyline in routes.items():
+            item = strava_activity(activity_id, start - timedelta(days=activity_id), 'Run')
+            item['map'] = {'summary_polyline': polyline}
+            bulk_upsert_activities(other if activity_id == 6 else cls.athlete, [item])
+
+    def test_same_route_matches(self):
+        activity = Activity.objects.get(id=1)
+        matches = find_same_route(activity)
+        self.assertEqual([match.id for match in matches], [2, 3])
+        self.assertTrue(all(match.route_deviation < 50 for match in matches))
+
+    def test_matches_ranked_by_deviation(self):
+        # La misma ruta desplazada ~50 m y ~110 m, más recientes que las idénticas
+        start = timezone.now()
+        for activity_id, offset in ((7, 0.001), (8, 0.0005)):
+            item = strava_activity(activity_id, start, 'Run')
+            item['map'] = {'summary_polyline': loop_polyline(19.40 + offset, -99.10, 0.02)}
+            bulk_upsert_activities(self.athlete, [item])
+
+        matches = find_same_route(Activity.objects.get(id=1))
+        self.assertEqual([match.id for match in matches], [2, 3, 8, 7])
+        deviations = [match.route_deviation for match in matches]
+        self.assertEqual(deviations, sorted(deviations))
+        self.assertGreater(deviations[2], 40)
+        self.assertEqual([match.id for match in find_same_route(Activity.objects.get(id=1), limit=2)], [2, 3])
+        self.assertEqual(len(find_same_route(Activity.objects.get(id=1), max_candidates=1)), 1)
+
+    def test_hausdorff_by_chunks(self):
+        rng = np.random.default_rng(7)
+        a = 19.40 + rng.random((64, 2)) * 0.01
+        b = a + rng.normal(0, 0.0002, a.shape)
+        # Por bloques da lo mismo que con la matriz de distancias completa
+        with mock.patch('dashboard.routes.HAUSDORFF_CHUNK', len(a)):
+            expected = hausdorff_distance(a, b, bound=10_000)
+        self.assertAlmostEqual(hausdorff_distance(a, b, bound=10_000), expected)
+        self.assertGreater(expected, 0)
+
+        # El primer bloque ya supera el umbral: no se calculan los demás
+        far = b.copy()
+        far[:16] += 0.01
+        with mock.patch('dashboard.routes.np.hypot', wraps=np.hypot) as hypot:
+            self.assertIsNone(hausdorff_distance(far, a))
+        self.assertEqual(hypot.call_count, 1)
+
+    def test_detail_shows_same_route(self):
+        session = self.client.session
+        session['athlete_id'] = self.athlete.id
+        session.save()
+        response = self.client.get(reverse('activity_detail', args=[2]))
+        self.assertTrue(response.context['same_route'])
+        self.assertEqual([a.id for a in response.context['similar_activities']], [1, 3])
+
+    def test_changed_polyline_updates_index(self):
+        item = strava_activity(2, timezone.now() - timedelta(days=2), 'Run')
+        item['map'] = {'summary_polyline': loop_polyline(19.40, -99.08, 0.02)}
+        bulk_upsert_activities(self.athlete, [item])
+        self.assertEqual([match.id for match in find_same_route(Activity.objects.get(id=1))], [3])
+        self.assertEqual([match.id for match in find_same_route(Activity.objects.get(id=4))], [2])
+
+
+class HeatmapTests(TestCase):
+    """Teselas del mapa de calor: renderizado incremental y servidas desde disco."""
+
+    def setUp(self):
+        self.tile_dir = use_temp_heatmap_dir(self, STRAVA_HEATMAP_MIN_ZOOM=10, STRAVA_HEATMAP_MAX_ZOOM=12)
+
+        self.athlete = make_athlete()
+        self.sync(1, loop_polyline(19.40, -99.10, 0.02))
+        self.sync(2, loop_polyline(19.40, -99.10, 0.02))
+
+    def sync(self, activity_id, polyline):
+        item = strava_activity(activity_id, timezone.now() - timedelta(days=activity_id), 'Run')
+        item['map'] = {'summary_polyline': polyline}
+        bulk_upsert_activities(self.athlete, [item])
+
+    def test_incremental_render(self):
+        activities, tiles = render_heatmap(self.athlete)
+        self.assertEqual(activities, 2)
+        self.assertGreater(tiles, 3)
+        self.assertEqual(render_heatmap(self.athlete), (0, 0))
+
+        # Una actividad nueva y pequeña solo toca unas pocas teselas
+        self.sync(3, loop_polyline(19.40, -99.12, 0.001))
+        activities, touched = render_heatmap(self.athlete)
+        self.assertEqual(activities, 1)
+        self.assertLess(touched, tiles)
+        self.assertEqual(Heatmap.objects.get(athlete=self.athlete).activity_count, 3)
+
+    def test_tile_view(self):
+        render_heatmap(self.athlete)
+        heatmap = Heatmap.objects.get(athlete=self.athlete)
+        path = next(Path(self.tile_dir).rglob('*.png'))
+
+        session = self.client.session
+        session['athlete_id'] = self.athlete.id
+        session.save()
+        zoom, x, y = path.parts[-3], path.parts[-2], path.stem
+        response = self.client.get(reverse('heatmap_tile', args=[heatmap.version, zoom, x, y]))
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response.content, path.read_bytes())
+
+        response = self.client.get(reverse('heatmap_tile', args=[heatmap.version, 3, 0, 0]))
+        self.assertEqual(response.content, EMPTY_TILE)
+
+        # Solo se sirve la versión publicada
+        response = self.client.get(reverse('heatmap_tile', args=[heatmap.version + 1, zoom, x, y]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_render_publishes_new_version(self):
+        render_heatmap(self.athlete)
+        heatmap = Heatmap.objects.get(athlete=self.athlete)
+        published = {path: path.read_bytes() for path in version_dir(self.athlete.id, heatmap.version).rglob('*.png')}
+
+        # Si el renderizado falla a mitad, la versión publicada sigue intacta
+        self.sync(3, loop_polyline(19.40, -99.10, 0.001))
+        with mock.patch('dashboard.heatmap.split_tiles', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                render_heatmap(self.athlete)
+        interrupted = Heatmap.objects.get(athlete=self.athlete)
+        self.assertEqual((interrupted.version, interrupted.activity_count), (heatmap.version, 2))
+        self.assertIsNotNone(interrupted.rendered_at)
+        self.assertEqual({path: path.read_bytes() for path in published}, published)
+
+        render_heatmap(self.athlete)
+        rendered = Heatmap.objects.get(athlete=self.athlete)
+        self.assertEqual((rendered.version, rendered.activity_count), (heatmap.version + 1, 3))
+        self.assertFalse(version_dir(self.athlete.id, heatmap.version).exists())
+        # Las teselas que la actividad nueva no toca pasan sin cambios a la versión nueva
+        for path in published:
+            moved = version_dir(self.athlete.id, rendered.version) / path.relative_to(
+                version_dir(self.athlete.id, heatmap.version)
+            )
+            self.assertTrue(moved.exists())
+
+    def test_concurrent_render_publishes_once(self):
+        render_heatmap(self.athlete)
+        base = Heatmap.objects.get(athlete=self.athlete).version
+        self.sync(3, loop_polyline(19.40, -99.10, 0.001))
+
+        # Otro proceso renderiza y publica mientras este ya tiene sus teselas listas
+        original = heatmap_module._publish
+        concurrent = []
+
+        def publish(*args):
+            if not concurrent:
+                concurrent.append(None)
+                concurrent[0] = render_heatmap(self.athlete)
+            return original(*args)
+
+        with mock.patch('dashboard.heatmap._publish', side_effect=publish):
+            self.assertEqual(render_heatmap(self.athlete), (0, 0))
+        self.assertEqual(concurrent[0][0], 1)
+        heatmap = Heatmap.objects.get(athlete=self.athlete)
+        self.assertEqual((heatmap.version, heatmap.activity_count), (base + 1, 3))
+        self.assertEqual([path.name for path in Path(self.tile_dir, '1').iterdir()], [f'v{base + 1}'])
+
+    def test_tiles_written_outside_write_lock(self):
+        write_lock = threading.Lock()
+        original = heatmap_module._write_tile
+
+        def write_tile(*args):
+            self.assertFalse(write_lock.locked())
+            return original(*args)
+
+        with mock.patch('dashboard.heatmap._write_tile', side_effect=write_tile) as patched:
+            activities, tiles = render_heatmap(self.athlete, write_lock=write_lock)
+        self.assertEqual((activities, tiles), (2, patched.call_count))
+        self.assertFalse(write_lock.locked())
+
+
+def api_response(status, body=None, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps(body if body is not None else {}).encode()
+    response.headers.update(headers or {})
+    response.url = 'https://www.strava.com/api/v3/athlete/activities'
+    return response
+
+
+@override_settings(STRAVA_CLIENT_ID='1', STRAVA_CLIENT_SECRET='secret')
+class StravaClientTests(TestCase):
+    """Cliente de la API: presupuesto de peticiones, `Retry-After` y reintentos (sesión simulada)."""
+
+    def setUp(self):
+        self.budget = RateLimitBudget(100, 1000)
+        self.client_api = StravaClient(budget=self.budget, max_retries=3, backoff=0.5)
+        self.client_api.session = mock.Mock(spec=requests.Session)
+        sleep = mock.patch('dashboard.strava_api.time.sleep')
+        self.sleep = sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def respond(self, *responses):
+        self.client_api.session.request.side_effect = list(responses)
+
+    def test_budget(self):
+        budget = RateLimitBudget(2, 10)
+        budget.acquire()
+        budget.acquire()
+        self.assertEqual(budget.remaining(), [0, 8])
+        with self.assertRaises(RateLimitExceeded) as raised:
+            budget.acquire(timeout=0)
+        self.assertGreater(raised.exception.retry_after, 0)
+
+        # Las cabeceras corrigen límites y consumo (que nunca baja)
+        budget.update_from_headers({'X-RateLimit-Limit': '100,1000', 'X-RateLimit-Usage': '5,1'})
+        self.assertEqual(budget.remaining(), [95, 998])
+        budget.exhaust_short_window()
+        self.assertEqual(budget.remaining()[0], 0)
+
+    def test_retries_server_errors(self):
+        self.respond(api_response(503), requests.ConnectionError(), api_response(200, [{'id': 1}]))
+        self.assertEqual(self.client_api.list_activities('token'), [{'id': 1}])
+        self.assertEqual(self.client_api.session.request.call_count, 3)
+        self.assertEqual(self.sleep.call_count, 2)
+        # Backoff con jitter: como mucho backoff * 2^intento
+        self.assertLessEqual(self.sleep.call_args_list[1].args[0], 1.0)
+
+    def test_gives_up_after_max_retries(self):
+        self.respond(*[api_response(500) for _ in range(4)])
+        with self.assertRaises(requests.HTTPError):
+            self.client_api.list_activities('token')
+        self.assertEqual(self.client_api.session.request.call_count, 4)
+
+    def test_retry_after(self):
+        self.respond(api_response(429, headers={'Retry-After': '7'}), api_response(200, []))
+        self.assertEqual(self.client_api.list_activities('token'), [])
+        self.sleep.assert_called_once_with(7.0)
+        self.assertGreater(self.budget.remaining()[0], 0)
+
+    def test_rate_limited_interactive_call(self):
+        # Un 429 sin Retry-After agota la ventana; una llamada con max_wait no se queda esperando
+        self.respond(api_response(429))
+        with self.assertRaises(RateLimitExceeded):
+            self.client_api.request('GET', 'https://www.strava.com/api/v3/athlete', 'token', max_wait=0)
+        self.assertEqual(self.budget.remaining()[0], 0)
+
+        with mock.patch('dashboard.strava_api.INTERACTIVE_MAX_WAIT', 0):
+            with self.assertRaises(RateLimitExceeded):
+                self.client_api.exchange_code('code')
+        self.assertEqual(self.client_api.session.request.call_count, 1)
+
+    def test_token_requests_fail_fast(self):
+        self.respond(api_response(502))
+        with self.assertRaises(requests.HTTPError):
+            self.client_api.refresh_token('refresh')
+        self.assertEqual(self.client_api.session.request.call_count, 1)
+        self.sleep.assert_not_called()
+
+        self.respond(requests.ConnectionError())
+        with self.assertRaises(requests.ConnectionError):
+            self.client_api.exchange_code('code')
+
+    def test_callback_reports_rate_limit(self):
+        with mock.patch('dashboard.views.get_client') as get_client:
+            get_client.return_value.exchange_code.side_effect = RateLimitExceeded(600)
+            response = self.client.get(reverse('strava_callback'), {'code': 'abc'}, follow=True)
+        self.assertIn('try again in 10 minutes', [str(message) for message in response.context['messages']][0])
+        self.assertFalse(Athlete.objects.exists())
+
+
+class SyncCommandTests(TestCase):
+    """`sync_strava_data`: la renovación del token no retiene el lock de escritura durante la llamada a Strava."""
+
+    class RecordingLock:
+        def __init__(self, events):
+            self.events = events
+
+        def __enter__(self):
+            self.events.append('acquire')
+
+        def __exit__(self, *exc_info):
+            self.events.append('release')
+
+    def setUp(self):
+        self.athlete = make_athlete(access_token='expired', expires_at=int(timezone.now().timestamp()) - 60)
+        self.events = []
+
+    def record_updates(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith('UPDATE "DASHBOARD_ATHLETE"'):
+            self.events.append('update')
+        return execute(sql, params, many, context)
+
+    def refresh_response(self, used):
+        self.events.append('refresh')
+        return {'access_token': 'renewed', 'refresh_token': 'rotated', 'expires_at': 2 ** 31 - 1}
+
+    def test_refresh_outside_write_lock(self):
+        with mock.patch('dashboard.tokens.get_client') as get_client, connection.execute_wrapper(self.record_updates):
+            get_client.return_value.refresh_token.side_effect = self.refresh_response
+            athlete = refresh_strava_token(self.athlete, write_lock=self.RecordingLock(self.events))
+        self.assertEqual(self.events, ['refresh', 'acquire', 'update', 'release'])
+        self.assertEqual((athlete.access_token, athlete.refresh_token), ('renewed', 'rotated'))
+        self.assertEqual(Athlete.objects.get(id=1).access_token, 'renewed')
+
+    def test_command_refreshes_then_syncs(self):
+        stdout = io.StringIO()
+        with mock.patch('dashboard.management.commands.sync_strava_data.threading') as threading, \
+                mock.patch('dashboard.management.commands.sync_strava_data.render_heatmap') as render, \
+                mock.patch('dashboard.tokens.get_client') as token_client, \
+                mock.patch('dashboard.views.get_client') as api_client, \
+                connection.execute_wrapper(self.record_updates):
+            write_lock = self.RecordingLock(self.events)
+            threading.Lock.side_effect = [write_lock, nullcontext()]
+            token_client.return_value.refresh_token.side_effect = self.refresh_response
+            api_client.return_value.iter_activity_pages.return_value = [
+                (1, [strava_activity(1, timezone.now(), 'Run')]),
+            ]
+            call_command('sync_strava_data', stdout=stdout)
+
+        # La petición a Strava se hace sin el lock; el UPDATE de los tokens y el lote, con él
+        self.assertEqual(self.events[:4], ['refresh', 'acquire', 'update', 'release'])
+        self.assertEqual(self.events[4:].count('acquire'), 1)
+        api_client.return_value.iter_activity_pages.assert_called_once_with('renewed', per_page=50, after=0)
+        # El mapa de calor recibe el lock para publicar, no se renderiza con él tomado
+        render.assert_called_once_with(mock.ANY, write_lock=write_lock)
+        self.assertTrue(Activity.objects.filter(id=1, athlete=self.athlete).exists())
+        self.assertRegex(stdout.getvalue(), r'Test 1 \(1\)\s+1\s+0\s+0\s+[\d.]+\s+ok')
+
+
+class SyncJobTests(TestCase):
+    """Sincronización en segundo plano: la vista solo encola y el worker hace el trabajo."""
+
+    def setUp(self):
+        self.athlete = make_athlete()
+        session = self.client.session
+        session['athlete_id'] = self.athlete.id
+        session.save()
+
+    def test_refresh_view_enqueues_once(self):
+        with mock.patch('dashboard.views.get_client') as get_client:
+            self.client.get(reverse('refresh_activities'))
+            self.client.get(reverse('refresh_activities'))
+        get_client.assert_not_called()
+        self.assertEqual(SyncJob.objects.filter(athlete=self.athlete).count(), 1)
+        self.assertEqual(self.client.get(reverse('sync_status')).json()['status'], SyncJob.QUEUED)
+
+    def test_worker_runs_job(self):
+        # `run_job` renderiza el mapa de calor de las actividades nuevas
+        use_temp_heatmap_dir(self)
+        job, created = enqueue_sync(self.athlete)
+        self.assertTrue(created)
+        now = timezone.now()
+        pages = [
+            (1, [strava_activity(i, now - timedelta(days=i), 'Run') for i in range(1, 51)]),
+            (2, [strava_activity(i, now - timedelta(days=i), 'Run') for i in range(51, 61)]),
+        ]
+
+        claimed = claim_next_job('test-worker')
+        self.assertEqual(claimed.id, job.id)
+        self.assertIsNone(claim_next_job('other-worker'))
+        with mock.patch('dashboard.views.get_client') as get_client:
+            get_client.return_value.iter_activity_pages.return_value = iter(pages)
+            job = run_job(claimed)
+
+        self.assertEqual(job.status, SyncJob.DONE)
+        self.assertEqual((job.pages, job.inserted, job.attempts), (2, 60, 1))
+        self.assertEqual(Activity.objects.filter(athlete=self.athlete).count(), 60)
+
+        # Terminado el trabajo se puede encolar otro
+        self.assertTrue(enqueue_sync(self.athlete)[1])
+
+    def test_requeue_stale_event_with_newer_queued(self):
+        stale_time = timezone.now() - timedelta(hours=1)
+        lost, _ = enqueue_event(self.athlete.id, SyncJob.ACTIVITY, 10)
+        other, _ = enqueue_event(self.athlete.id, SyncJob.ACTIVITY, 11)
+        SyncJob.objects.filter(id__in=[lost.id, other.id]).update(
+            status=SyncJob.RUNNING, heartbeat_at=stale_time, attempts=1,
+        )
+        # Llega otro evento de la actividad 10 mientras el primero sigue "en curso"
+        newer, created = enqueue_event(self.athlete.id, SyncJob.ACTIVITY, 10)
+        self.assertTrue(created)
+
+        self.assertEqual(requeue_stale_jobs(), 1)
+        lost.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(lost.status, SyncJob.DONE)
+        self.assertEqual(other.status, SyncJob.QUEUED)
+        self.assertEqual(SyncJob.objects.get(id=newer.id).status, SyncJob.QUEUED)
+
+
+@override_settings(STRAVA_WEBHOOK_VERIFY_TOKEN='verify-me', STRAVA_WEBHOOK_SUBSCRIPTION_ID='7')
+class WebhookTests(TestCase):
+    """Ingesta por eventos: el endpoint solo encola y el worker aplica una actividad cada vez."""
+
+    def setUp(self):
+        self.athlete = make_athlete()
+        self.now = timezone.now()
+        # Los eventos que insertan actividades renderizan el mapa de calor
+        use_temp_heatmap_dir(self)
+
+    def send(self, aspect_type, object_id, object_type='activity', owner_id=1, updates=None):
+        event = {
+            'object_type': object_type, 'object_id': object_id, 'aspect_type': aspect_type,
+            'owner_id': owner_id, 'subscription_id': 7, 'event_time': 1700000000, 'updates': updates or {},
+        }
+        return self.client.post(reverse('strava_webhook'), json.dumps(event), content_type='application/json')
+
+    def run_queued(self):
+        jobs = []
+        while (job := claim_next_job('test-worker')) is not None:
+            jobs.append(run_job(job))
+        return jobs
+
+    def test_handshake(self):
+        params = {'hub.mode': 'subscribe', 'hub.challenge': 'abc123', 'hub.verify_token': 'verify-me'}
+        response = self.client.get(reverse('strava_webhook'), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'hub.challenge': 'abc123'})
+
+        params['hub.verify_token'] = 'wrong'
+        self.assertEqual(self.client.get(reverse('strava_webhook'), params).status_code, 403)
+
+    def test_events_are_queued_once(self):
+        with mock.patch('dashboard.webhooks.get_client') as get_client:
+            self.assertTrue(self.send('create', 10).json()['queued'])
+            self.assertTrue(self.send('update', 10, updates={'title': 'Renamed'}).json()['queued'])
+            # Un atleta que no usa el dashboard y un cambio de perfil se ignoran
+            self.assertFalse(self.send('create', 11, owner_id=99).json()['queued'])
+            self.assertFalse(self.send('update', 1, object_type='athlete', updates={'title': 'x'}).json()['queued'])
+        get_client.assert_not_called()
+
+        self.assertEqual(SyncJob.objects.filter(kind=SyncJob.ACTIVITY, activity_id=10).count(), 1)
+        # Los eventos no bloquean la sincronización completa
+        self.assertTrue(enqueue_sync(self.athlete)[1])
+
+    def test_create_and_update_fetch_one_activity(self):
+        self.send('create', 10)
+        with mock.patch('dashboard.webhooks.get_client') as get_client:
+            get_client.return_value.get_activity.return_value = strava_activity(10, self.now, 'Run')
+            job, = self.run_queued()
+        get_client.return_value.get_activity.assert_called_once_with('token', 10)
+        self.assertEqual((job.kind, job.status, job.inserted), (SyncJob.ACTIVITY, SyncJob.DONE, 1))
+        self.assertEqual(DailyRollup.objects.get(athlete=self.athlete).count, 1)
+        self.assertEqual(AthleteStreak.objects.get(athlete=self.athlete).total_days, 1)
+
+        self.send('update', 10, updates={'title': 'Renamed'})
+        item = dict(strava_activity(10, self.now, 'Run'), name='Renamed')
+        with mock.patch('dashboard.webhooks.get_client') as get_client:
+            get_client.return_value.get_activity.return_value = item
+            job, = self.run_queued()
+        self.assertEqual(job.updated, 1)
+        self.assertEqual(Activity.objects.get(id=10).name, 'Renamed')
+
+    def test_delete_event(self):
+        bulk_upsert_activities(self.athlete, [
+            strava_activity(10, self.now, 'Run'),
+            strava_activity(11, self.now - timedelta(days=1), 'Ride'),
+        ])
+        self.send('delete', 10)
+        with mock.patch('dashboard.webhooks.get_client') as get_client:
+            job, = self.run_queued()
+        get_client.assert_not_called()
+
+        self.assertEqual((job.status, job.deleted), (SyncJob.DONE, 1))
+        self.assertEqual(list(Activity.objects.values_list('id', flat=True)), [11])
+        self.assertEqual(DailyRollup.objects.filter(athlete=self.athlete).count(), 1)
+        streak = AthleteStreak.objects.get(athlete=self.athlete)
+        self.assertEqual((streak.total_days, streak.last_day), (1, Activity.objects.get(id=11).calculated_day))
+
+    def test_activity_gone_from_strava_is_deleted(self):
+        bulk_upsert_activities(self.athlete, [strava_activity(10, self.now, 'Run')])
+        self.send('update', 10)
+        not_found = requests.Response()
+        not_found.status_code = 404
+        with mock.patch('dashboard.webhooks.get_client') as get_client:
+            get_client.return_value.get_activity.side_effect = requests.HTTPError(response=not_found)
+            job, = self.run_queued()
+        self.assertEqual((job.status, job.deleted), (SyncJob.DONE, 1))
+        self.assertFalse(Activity.objects.exists())
+
+    def test_deauthorize_forgets_athlete(self):
+        bulk_upsert_activities(self.athlete, [strava_activity(10, self.now, 'Run')])
+        session = self.client.session
+        session['athlete_id'] = self.athlete.id
+        session.save()
+
+        self.send('update', 1, object_type='athlete', updates={'authorized': 'false'})
+        job, = self.run_queued()
+        self.assertEqual(job.status, SyncJob.DONE)
+        self.assertFalse(Athlete.objects.exists())
+        self.assertFalse(Activity.objects.exists())
+        self.assertFalse(SyncJob.objects.exists())
+
+        # La sesión que quedó abierta vuelve a la portada sin datos
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['is_authenticated'])
+
+
+class MapSyncTests(TestCase):
+    """`sync_maps` incremental: lista desde el checkpoint y solo escribe lo que cambió."""
+
+    def setUp(self):
+        self.athlete = make_athlete()
+        self.start = timezone.now().replace(microsecond=0) - timedelta(days=30)
+        self.items = [
+            strava_activity(i, self.start + timedelta(days=i), 'Run', latlng=[19.4, -99.1]) for i in range(1, 11)
+        ]
+        bulk_upsert_activities(self.athlete, self.items)
+
+    def client_returning(self, *pages):
+        client = mock.Mock()
+        client.iter_activity_pages.return_value = iter(enumerate(pages, start=1))
+        return client
+
+    def test_only_changed_activities_are_written(self):
+        polyline = encode([[19.4, -99.1], [19.41, -99.11], [19.42, -99.1]])
+        items = [dict(item) for item in self.items]
+        items[3] = dict(items[3], map={'summary_polyline': polyline})
+
+        client = self.client_returning(items[:5], items[5:])
+        with CaptureQueriesContext(connection) as queries:
+            stats = sync_maps(self.athlete, client)
+        self.assertEqual(client.iter_activity_pages.call_args.kwargs['after'], 0)
+        self.assertEqual(
+            {key: stats[key] for key in ('pages', 'updated', 'polylines', 'unchanged', 'missing')},
+            {'pages': 2, 'updated': 1, 'polylines': 1, 'unchanged': 9, 'missing': 0},
+        )
+        updates = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE "dashboard_activity"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(Activity.objects.get(id=4).summary_polyline, polyline)
+        self.assertTrue(ActivityTrack.objects.filter(activity_id=4).exists())
+        self.assertEqual(MapSyncCheckpoint.objects.get(athlete=self.athlete).synced_until, self.start + timedelta(days=10))
+
+    def test_resumes_from_checkpoint(self):
+        sync_maps(self.athlete, self.client_returning(self.items))
+        checkpoint = MapSyncCheckpoint.objects.get(athlete=self.athlete).synced_until
+
+        client = self.client_returning()
+        sync_maps(self.athlete, client)
+        self.assertEqual(client.iter_activity_pages.call_args.kwargs['after'], int((checkpoint - timedelta(days=1)).timestamp()))
+
+        # Una actividad sin datos de mapa anterior al checkpoint hace empezar desde ella
+        Activity.objects.filter(id=2).update(summary_polyline=None)
+        client = self.client_returning()
+        sync_maps(self.athlete, client)
+        self.assertEqual(client.iter_activity_pages.call_args.kwargs['after'], int((self.start + timedelta(days=2)).timestamp()) - 1)
+
+        client = self.client_returning()
+        sync_maps(self.athlete, client, full=True)
+        self.assertEqual(client.iter_activity_pages.call_args.kwargs['after'], 0)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'athletes'}})
+class AthleteSessionTests(TestCase):
+    """El atleta de la sesión sale de la caché y las páginas nunca esperan al servidor OAuth."""
+
+    def setUp(self):
+        self.athlete = make_athlete(expires_at=int(timezone.now().timestamp()) - 60)
+        session = self.client.session
+        session['athlete_id'] = self.athlete.id
+        session.save()
+
+    def athlete_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return [q['sql'] for q in queries.captured_queries if 'FROM "dashboard_athlete"' in q['sql']]
+
+    def test_expired_token_does_not_block_page(self):
+        with mock.patch('dashboard.tokens.get_client') as get_client:
+            self.assertEqual(len(self.athlete_queries(reverse('activities'))), 1)
+            self.assertEqual(self.athlete_queries(reverse('activities')), [])
+        get_client.assert_not_called()
+
+        # Una sincronización con cambios expulsa al atleta de la caché
+        bulk_upsert_activities(self.athlete, [strava_activity(1, timezone.now(), 'Run')])
+        self.assertEqual(len(self.athlete_queries(reverse('activities'))), 1)
+
+    def test_concurrent_refresh_keeps_newest_tokens(self):
+        stale = Athlete.objects.get(id=1)
+        # Otro proceso renovó (y rotó el refresh token) después de que leyéramos el atleta
+        Athlete.objects.filter(id=1).update(access_token='theirs', refresh_token='rotated', expires_at=2 ** 31 - 1)
+
+        with mock.patch('dashboard.tokens.get_client') as get_client:
+            get_client.return_value.refresh_token.return_value = {
+                'access_token': 'ours', 'refresh_token': 'ours-refresh', 'expires_at': 2 ** 31 - 2,
+            }
+            athlete = refresh_strava_token(stale)
+        self.assertEqual((athlete.access_token, athlete.refresh_token), ('theirs', 'rotated'))
+        self.assertEqual(Athlete.objects.get(id=1).refresh_token, 'rotated')
+
+        # Si Strava rechaza el refresh token porque ya se rotó, también valen los de la DB
+        stale = Athlete.objects.get(id=1)
+        Athlete.objects.filter(id=1).update(access_token='newer', refresh_token='rotated-again')
+        rejected = requests.Response()
+        rejected.status_code = 400
+        with mock.patch('dashboard.tokens.get_client') as get_client:
+            get_client.return_value.refresh_token.side_effect = requests.HTTPError(response=rejected)
+            self.assertEqual(refresh_strava_token(stale).access_token, 'newer')
+
+    def test_refresh_expiring_tokens(self):
+        make_athlete(
+            2, firstname='Fresh', access_token='fresh', refresh_token='fresh',
+            expires_at=int(timezone.now().timestamp()) + 6 * 3600,
+        )
+        with mock.patch('dashboard.tokens.get_client') as get_client:
+            get_client.return_value.refresh_token.return_value = {
+                'access_token': 'renewed', 'refresh_token': 'refresh', 'expires_at': 2 ** 31 - 1,
+            }
+            self.assertEqual(refresh_expiring_tokens(), (1, []))
+        get_client.return_value.refresh_token.assert_called_once_with('refresh')
+        self.assertEqual(Athlete.objects.get(id=1).access_token, 'renewed')
+        self.assertEqual(Athlete.objects.get(id=2).access_token, 'fresh')
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'api'}})
+class ApiTests(TestCase):
+    """API JSON: ETag por generación de datos, 304 sin construir la respuesta y compresión."""
+
+    def setUp(self):
+        self.athlete = make_athlete()
+        now = timezone.now()
+        bulk_upsert_activities(self.athlete, [strava_activity(i, now - timedelta(days=i), ACTIVITY_TYPES[i % 4]) for i in range(30)])
+        session = self.client.session
+        session['athlete_id'] = self.athlete.id
+        session.save()
+
+    def test_requires_session(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('api_summary')).status_code, 401)
+
+    def test_conditional_requests(self):
+        for name in ('api_summary', 'api_weekly', 'api_monthly', 'api_activities'):
+            response = self.client.get(reverse(name))
+            self.assertEqual(response.status_code, 200, name)
+            etag = response['ETag']
+            self.assertRegex(etag, r'^"[0-9a-f]{32}"$')
+
+            # Sin cambios: 304 sin tocar las actividades ni los agregados
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse(name), HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304, name)
+            self.assertFalse([q for q in queries.captured_queries if 'dashboard_activity' in q['sql'] or 'dashboard_dailyrollup' in q['sql']])
+
+            last_modified = self.client.get(reverse(name))['Last-Modified']
+            self.assertEqual(self.client.get(reverse(name), HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        # Otros parámetros, otra representación
+        self.assertNotEqual(self.client.get(reverse('api_activities'), {'type': 'Run'})['ETag'], etag)
+
+        # Una sincronización con cambios invalida el ETag
+        bulk_upsert_activities(self.athlete, [strava_activity(100, timezone.now(), 'Run')])
+        response = self.client.get(reverse('api_activities'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['activities'][0]['id'], 100)
+
+    def test_gzip(self):
+        plain = self.client.get(reverse('api_activities'))
+        response = self.client.get(reverse('api_activities'), HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(response.content)), plain.json())
+        # Cada codificación tiene su propio ETag fuerte
+        self.assertNotEqual(response['ETag'], plain['ETag'])
+        self.assertEqual(self.client.get(
+            reverse('api_activities'), HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'],
+        ).status_code, 304)
+
+    def test_activities_and_detail(self):
+        first = self.client.get(reverse('api_activities'), {'limit': 25}).json()
+        self.assertEqual(len(first['activities']), 25)
+        rest = self.client.get(reverse('api_activities'), {'limit': 25, 'cursor': first['next_cursor']}).json()
+        self.assertEqual(len(rest['activities']), 5)
+        self.assertIsNone(rest['next_cursor'])
+
+        detail = self.client.get(reverse('api_activity', args=[3])).json()
+        self.assertEqual((detail['id'], detail['type'], detail['same_route'], detail['analysis']), (3, 'Walk', None, None))
+        self.assertEqual(self.client.get(reverse('api_activity', args=[999])).status_code, 404)
+
+
+class ExportTests(TestCase):
+    """Exportación en streaming: bloques de `values_list` y los tres formatos."""
+
+    def setUp(self):
+        self.athlete = make_athlete()
+        now = timezone.now()
+        bulk_upsert_activities(self.athlete, [
+            strava_activity(i, now - timedelta(days=i), ACTIVITY_TYPES[i % 4], [19.4, -99.1] if i % 2 else None)
+            for i in range(25)
+        ])
+        session = self.client.session
+        session['athlete_id'] = self.athlete.id
+        session.save()
+
+    def export(self, export_format, fields=None, chunk_size=10):
+        return b''.join(export_activities(self.athlete, export_format, fields, chunk_size))
+
+    def test_csv(self):
+        rows = list(csv.reader(io.StringIO(self.export('csv', ['id', 'type', 'start_date', 'start_lat']).decode())))
+        self.assertEqual(rows[0], ['id', 'type', 'start_date', 'start_lat'])
+        self.assertEqual(len(rows), 26)
+        # Orden cronológico: la más antigua primero
+        self.assertEqual(rows[1][:2], ['24', 'Run'])
+        self.assertEqual(rows[1][3], '')
+        self.assertEqual(rows[2][3], '19.4')
+
+        Activity.objects.all().delete()
+        self.assertEqual(self.export('csv', ['id', 'name']), b'id,name\r\n')
+
+    def test_ndjson(self):
+        lines = self.export('ndjson').decode().splitlines()
+        self.assertEqual(len(lines), 25)
+        last = json.loads(lines[-1])
+        self.assertEqual((last['id'], last['type'], last['average_heartrate']), (0, 'Run', None))
+        self.assertEqual(last['calculated_day'], Activity.objects.get(id=0).calculated_day.isoformat())
+
+    def test_columnar_round_trip(self):
+        fields = ['id', 'name', 'start_date', 'calculated_day', 'distance', 'has_heartrate', 'start_lat']
+        blocks = list(read_columnar(io.BytesIO(self.export('columnar', fields))))
+        self.assertEqual([len(block['id']) for block in blocks], [10, 10, 5])
+
+        activity = Activity.objects.get(id=24)
+        first = blocks[0]
+        self.assertEqual((first['id'][0], first['name'][0], first['distance'][0]), (24, 'Activity 24', activity.distance))
+        self.assertEqual(first['start_date'][0].astype(int), int(activity.start_date.timestamp()))
+        self.assertEqual(str(first['calculated_day'][0]), activity.calculated_day.isoformat())
+        self.assertFalse(first['has_heartrate'][0])
+        # Los nulos quedan enmascarados
+        self.assertTrue(first['start_lat'].mask[0])
+        self.assertEqual(first['start_lat'][1], 19.4)
+
+    def test_unknown_field(self):
+        with self.assertRaises(ValueError):
+            self.export('csv', ['id', 'access_token'])
+
+    def test_reads_rows_without_models(self):
+        with mock.patch.object(Activity, '__init__', side_effect=AssertionError('model instantiated')):
+            self.assertEqual(len(self.export('ndjson').splitlines()), 25)
+
+    def test_view(self):
+        response = self.client.get(reverse('export_activities'), {'format': 'ndjson', 'fields': 'id,type'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertRegex(response['Content-Disposition'], r'^attachment; filename="activities-1-\d{8}\.ndjson"$')
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 25)
+
+        self.assertEqual(self.client.get(reverse('export_activities'), {'format': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('export_activities'), {'fields': 'id,secret'}).status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('export_activities')).status_code, 401)
+
+
+EXPORT_CSV_HEADER = (
+    'Activity ID,Activity Date,Activity Name,Activity Type,Activity Description,Elapsed Time,Distance,'
+    'Max Heart Rate,Relative Effort,Commute,Filename,Elapsed Time,Moving Time,Distance,Max Speed,'
+    'Average Speed,Elevation Gain,Average Heart Rate\n'
+)
+
+
+def export_gpx(points, start):
+    trkpts = ''.join(
+        f'<trkpt lat="{lat}" lon="{lng}"><ele>{2240 + i}</ele>'
+        f'<time>{(start + timedelta(seconds=10 * i)).strftime("%Y-%m-%dT%H:%M:%SZ")}</time>'
+        f'<extensions><gpxtpx:TrackPointExtension><gpxtpx:hr>{120 + i}</gpxtpx:hr></gpxtpx:TrackPointExtension>'
+        f'</extensions></trkpt>'
+        for i, (lat, lng) in enumerate(points)
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<gpx xmlns="http://www.topografix.com/GPX/1/1" '
+        'xmlns:gpxtpx="http://www.garmin.com/xmlschemas/TrackPointExtension/v1" version="1.1">'
+        f'<metadata><time>{start.strftime("%Y-%m-%dT%H:%M:%SZ")}</time></metadata>'
+        f'<trk><name>Run</name><trkseg>{trkpts}</trkseg></trk></gpx>'
+    )
+
+
+def export_tcx(points, start):
+    trackpoints = ''.join(
+        f'<Trackpoint><Time>{(start + timedelta(seconds=5 * i)).strftime("%Y-%m-%dT%H:%M:%S.000Z")}</Time>'
+        + (f'<Position><LatitudeDegrees>{lat}</LatitudeDegrees><LongitudeDegrees>{lng}</LongitudeDegrees></Position>'
+           if lat is not None else '')
+        + f'<DistanceMeters>{25.0 * i}</DistanceMeters><Cadence>{80 + i}</Cadence></Trackpoint>'
+        for i, (lat, lng) in enumerate(points)
+    )
+    # Los TCX de Strava suelen empezar con espacios antes de la declaración XML
+    return (
+        '          <?xml version="1.0" encoding="UTF-8"?>'
+        '<TrainingCenterDatabase xmlns="http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2">'
+        '<Activities><Activity Sport="Biking"><Lap><DistanceMeters>100</DistanceMeters>'
+        f'<Track>{trackpoints}</Track></Lap></Activity></Activities></TrainingCenterDatabase>'
+    )
+
+
+class StravaExportImportTests(TestCase):
+    """Importación del zip de exportación: CSV en lotes, GPX/TCX con iterparse y streams."""
+
+    def setUp(self):
+        self.athlete = make_athlete()
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        start = timezone.now().replace(microsecond=0) - timedelta(days=3)
+        self.start = start
+        run = [(19.4 + i * 1e-3, -99.1 + i * 5e-4) for i in range(30)]
+        ride = [(19.5, -99.2), (None, None)] + [(19.5 + i * 1e-3, -99.2) for i in range(2, 20)]
+
+        rows = [
+            f'101,"{start:%b %d, %Y, %I:%M:%S %p}",Morning Run,Run,,1900,4.5,150,,false,activities/101.gpx.gz,'
+            f'1900.0,1800.0,4500.0,4.1,2.5,30.0,135.5\n',
+            f'102,"{start + timedelta(days=1):%b %d, %Y, %I:%M:%S %p}",Ride,E-Bike Ride,,3600,0.5,,,false,'
+            f'activities/102.tcx.gz,3600.0,,500.0,,,0.0,\n',
+            f'103,"{start + timedelta(days=2):%b %d, %Y, %I:%M:%S %p}",Gym,Weight Training,,2700,0,,,false,,'
+            f'2700.0,2700.0,0.0,,,,\n',
+            f'104,"{start + timedelta(days=2):%b %d, %Y, %I:%M:%S %p}",Broken,Run,,600,1,,,false,activities/104.gpx,'
+            f'600.0,600.0,1000.0,,,,\n',
+        ]
+        self.archive = self.tmp / 'export.zip'
+        with zipfile.ZipFile(self.archive, 'w') as archive:
+            archive.writestr('activities.csv', EXPORT_CSV_HEADER + ''.join(rows))
+            archive.writestr('activities/101.gpx.gz', gzip.compress(export_gpx(run, start).encode()))
+            archive.writestr('activities/102.tcx.gz', gzip.compress(export_tcx(ride, start).encode()))
+            archive.writestr('activities/104.gpx', '<gpx><trk><trkseg><trkpt')
+
+    def test_import(self):
+        stats = import_strava_export(self.athlete, self.archive, batch_size=2)
+        self.assertEqual(
+            {key: stats[key] for key in ('inserted', 'updated', 'skipped', 'streams', 'failed')},
+            {'inserted': 4, 'updated': 0, 'skipped': 0, 'streams': 2, 'failed': 1},
+        )
+        self.assertIn('activities/104.gpx', stats['errors'][0])
+
+        run = Activity.objects.get(id=101)
+        self.assertEqual((run.type, run.distance, run.moving_time, run.average_heartrate), ('Run', 4500.0, 1800, 135.5))
+        self.assertEqual(run.start_date, self.start)
+        self.assertEqual((run.start_lat, run.start_lng), (19.4, -99.1))
+        self.assertTrue(run.summary_polyline)
+        self.assertTrue(ActivityTrack.objects.filter(activity_id=101).exists())
+        self.assertEqual(Activity.objects.get(id=102).type, 'EBikeRide')
+        self.assertEqual(Activity.objects.get(id=103).summary_polyline, '')
+        self.assertEqual(DailyRollup.objects.filter(athlete=self.athlete).aggregate(n=Sum('count'))['n'], 4)
+
+        streams = load_streams(101)
+        self.assertEqual(len(streams['time']), 30)
+        self.assertEqual(streams['time'][-1], 290)
+        self.assertEqual(streams['heartrate'][-1], 149)
+        self.assertAlmostEqual(streams['latlng'][-1][0], 19.429)
+        self.assertGreater(streams['distance'][-1], 3000)
+        # El punto sin posición del TCX se rellena con el anterior
+        streams = load_streams(102)
+        self.assertEqual(len(streams['latlng']), 20)
+        self.assertAlmostEqual(streams['latlng'][1][0], 19.5)
+        self.assertEqual(streams['distance'][-1], 475.0)
+        self.assertEqual(streams['cadence'][0], 80)
+
+        # Repetir la importación no reescribe nada
+        stats = import_strava_export(self.athlete, self.archive)
+        self.assertEqual((stats['inserted'], stats['skipped'], stats['streams']), (0, 4, 0))
+
+    def test_keeps_api_activities(self):
+        bulk_upsert_activities(self.athlete, [strava_activity(101, self.start, 'Run')])
+        import_strava_export(self.athlete, self.archive)
+        activity = Activity.objects.get(id=101)
+        self.assertEqual((activity.name, activity.timezone), ('Activity 101', '(GMT-06:00) America/Mexico_City'))
+        # Pero sí recibe los streams del GPX
+        self.assertEqual(len(load_streams(101)['time']), 30)
+
+    def test_process_pool(self):
+        stats = import_strava_export(self.athlete, self.archive, workers=2)
+        self.assertEqual((stats['inserted'], stats['streams'], stats['failed']), (4, 2, 1))
+        self.assertEqual(len(load_streams(102)['time']), 20)
+
+
+class FitTests(TestCase):
+    """Decodificador FIT: definiciones compiladas, marcas de tiempo comprimidas y valores inválidos."""
+
+    def setUp(self):
+        self.start = timezone.now().replace(microsecond=0) - timedelta(days=1)
+        self.samples = [
+            {'time': second, 'lat': 19.4 + second * 1e-4, 'lng': -99.1, 'altitude': 2240.4, 'heartrate': 130,
+             'cadence': 88, 'distance': second * 3.0, 'watts': None if second % 3 else 250}
+            for second in range(0, 600, 2)
+        ]
+        # Un hueco de más de 32 s obliga a una cabecera normal con la marca de tiempo completa
+        self.samples.append({**self.samples[-1], 'time': 700, 'distance': 2000.0})
+
+    def test_round_trip(self):
+        start, columns = decode_fit(encode_fit(self.samples, self.start))
+        self.assertEqual(start, self.start)
+        self.assertEqual(len(columns['time']), 301)
+        self.assertEqual((columns['time'][1], columns['time'][-1]), (2, 700))
+        self.assertAlmostEqual(columns['lat'][10], 19.402, places=6)
+        self.assertAlmostEqual(columns['altitude'][0], 2240.4)
+        self.assertEqual((columns['heartrate'][0], columns['cadence'][0], columns['distance'][-1]), (130, 88, 2000))
+        # Valores inválidos -> NaN
+        self.assertEqual(columns['watts'][0], 250)
+        self.assertTrue(np.isnan(columns['watts'][1]))
+
+    def test_read_fit_and_import(self):
+        tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        data = encode_fit(self.samples, self.start)
+        (tmp / 'ride.fit').write_bytes(data)
+        start, columns = read_fit(tmp / 'ride.fit')
+        self.assertEqual(len(columns['time']), 301)
+
+        athlete = make_athlete()
+        with zipfile.ZipFile(tmp / 'export.zip', 'w') as archive:
+            archive.writestr('activities.csv', EXPORT_CSV_HEADER + (
+                f'201,"{self.start:%b %d, %Y, %I:%M:%S %p}",Ride,Ride,,700,2,,,false,activities/201.fit.gz,'
+                f'700.0,700.0,2000.0,,,,\n'
+            ))
+            archive.writestr('activities/201.fit.gz', gzip.compress(data))
+        stats = import_strava_export(athlete, tmp / 'export.zip')
+        self.assertEqual((stats['inserted'], stats['streams'], stats['failed']), (1, 1, 0))
+
+        streams = load_streams(201)
+        self.assertEqual(len(streams['latlng']), 301)
+        # Los huecos de potencia se rellenan con el valor anterior
+        self.assertEqual(list(streams['watts'][:4]), [250, 250, 250, 250])
+        self.assertAlmostEqual(Activity.objects.get(id=201).start_lat, 19.4, places=6)
+
+    def test_invalid(self):
+        data = encode_fit(self.samples, self.start)
+        with self.assertRaises(FitError):
+            decode_fit(data[:100])
+        with self.assertRaises(FitError):
+            decode_fit(b'not a fit file at all')
+
+
+@override_settings(STRAVA_MAX_HEARTRATE=190, STRAVA_RESTING_HEARTRATE=60)
+class TrainingLoadTests(TestCase):
+    """Carga por actividad y serie fitness/fatigue/form recalculada solo desde el día que cambia."""
+
+    def setUp(self):
+        self.athlete = make_athlete()
+        self.today = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+
+    def activity(self, activity_id, days_ago, heartrate=None):
+        item = strava_activity(activity_id, self.today - timedelta(days=days_ago), 'Run')
+        if heartrate:
+            item['average_heartrate'] = heartrate
+        return item
+
+    def series(self):
+        return list(TrainingLoad.objects.filter(athlete=self.athlete).values_list('day', 'load', 'fitness', 'fatigue', 'form'))
+
+    def assertSeriesEqual(self, first, second):
+        self.assertEqual([row[:2] for row in first], [row[:2] for row in second])
+        for a, b in zip(first, second):
+            for x, y in zip(a[2:], b[2:]):
+                self.assertAlmostEqual(x, y, places=6)
+
+    def test_activity_load(self):
+        # 30 min con FC media 155: reserva 0.73 -> TRIMP de Banister
+        reserve = (155 - 60) / 130
+        self.assertAlmostEqual(
+            activity_load({'moving_time': 1800, 'average_heartrate': 155, 'type': 'Run'}),
+            round(30 * reserve * 0.64 * math.exp(1.92 * reserve), 1),
+        )
+        # Sin FC: duración por intensidad del tipo
+        self.assertEqual(activity_load({'moving_time': 1800, 'average_heartrate': None, 'type': 'Run'}), 45.0)
+        self.assertEqual(activity_load({'moving_time': 1800, 'average_heartrate': None, 'type': 'Kitesurf'}), 30.0)
+
+    def test_incremental_series(self):
+        bulk_upsert_activities(self.athlete, [self.activity(i, 60 - 3 * i, 140 + i) for i in range(10)])
+        series = self.series()
+        self.assertEqual((series[0][0], series[-1][0]), ((self.today - timedelta(days=60)).date(), (self.today - timedelta(days=33)).date()))
+        self.assertEqual(len(series), 28)
+        self.assertEqual(series[1][1], 0.0)
+        self.assertEqual(series[0][4], 0.0)
+        self.assertGreater(series[-1][2], 0)
+
+        # Una actividad nueva solo reescribe desde el día siguiente a la última fila
+        first_ids = list(TrainingLoad.objects.filter(athlete=self.athlete).values_list('id', flat=True))
+        bulk_upsert_activities(self.athlete, [self.activity(100, 5, 150)])
+        self.assertEqual(list(TrainingLoad.objects.filter(athlete=self.athlete, id__in=first_ids).values_list('id', flat=True)), first_ids)
+        self.assertEqual(TrainingLoad.objects.filter(athlete=self.athlete).last().day, (self.today - timedelta(days=5)).date())
+
+        # El resultado incremental es el mismo que recalcular todo, también con backfills y borrados
+        bulk_upsert_activities(self.athlete, [self.activity(101, 90)])
+        delete_activities(self.athlete, [4])
+        incremental = self.series()
+        rebuild_training_load(self.athlete.id)
+        self.assertSeriesEqual(incremental, self.series())
+        self.assertEqual(incremental[0][0], (self.today - timedelta(days=90)).date())
+
+    def test_series_and_view(self):
+        bulk_upsert_activities(self.athlete, [self.activity(i, 20 - i, 150) for i in range(10)])
+        today = self.today.date()
+        with self.assertNumQueries(1):
+            series = training_series(self.athlete, today - timedelta(days=29), today)
+        # Empieza en el primer día activo y llega hasta hoy
+        self.assertEqual(len(series), 21)
+        self.assertEqual(series[-1]['day'], today)
+        # Sin actividades desde hace 11 días: fitness y fatigue solo decaen
+        self.assertLess(series[-1]['fitness'], series[-11]['fitness'])
+        self.assertLess(series[-1]['fatigue'] / series[-11]['fatigue'], series[-1]['fitness'] / series[-11]['fitness'])
+
+        # Un periodo sin filas se extrapola desde el último día guardado
+        self.assertEqual(len(training_series(self.athlete, today - timedelta(days=4), today)), 5)
+
+        session = self.client.session
+        session['athlete_id'] = self.athlete.id
+        session.save()
+        response = self.client.get(reverse('training_view'), {'days': 90})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('trainingChart', response.content.decode())
+        self.assertEqual(len(json.loads(response.context['chart_data'])['labels']), 21)
+
+
+class YearOverYearTests(TestCase):
+    """Progreso anual por día del año: parcheado por días, acumulado al leer y comparación con el año anterior."""
+
+    def setUp(self):
+        self.athlete = make_athlete()
+
+    def stored(self):
+        return {
+            (row.year, row.type): {metric: list(decode_days(getattr(row, metric))) for metric in ('count', 'distance')}
+            for row in YearlyProgress.objects.filter(athlete=self.athlete)
+        }
+
+    def test_patch_matches_rebuild(self):
+        bulk_upsert_activities(self.athlete, [
+            activity_on(1, date(2023, 1, 15)),
+            activity_on(2, date(2023, 3, 1), 'Ride'),
+            activity_on(3, date(2024, 2, 29)),
+            activity_on(4, date(2024, 3, 1)),
+            activity_on(5, date(2024, 3, 1), 'Ride'),
+        ])
+        make_activity(self.athlete, 6, date(2023, 12, 31))
+        delete_activities(self.athlete, [5])
+        patched = self.stored()
+        self.assertEqual(set(patched), {(2023, ''), (2023, 'Run'), (2023, 'Ride'), (2024, ''), (2024, 'Run')})
+
+        YearlyProgress.objects.all().delete()
+        rebuild_yearly_progress(self.athlete.id)
+        self.assertEqual(self.stored(), patched)
+
+        # El 29 de febrero y el 1 de marzo ocupan la misma posición en todos los años
+        self.assertEqual((day_index(date(2024, 2, 29)), day_index(date(2023, 3, 1))), (59, 60))
+        self.assertEqual(patched[(2024, 'Run')]['distance'][59:61], [5003, 5004])
+
+    def test_cumulative_and_comparison(self):
+        bulk_upsert_activities(self.athlete, [
+            activity_on(1, date(2023, 1, 15)),
+            activity_on(2, date(2023, 3, 1), 'Ride'),
+            activity_on(3, date(2023, 6, 1)),
+            activity_on(4, date(2024, 2, 29)),
+        ])
+        with self.assertNumQueries(1):
+            progress = cumulative_progress(self.athlete, [2023, 2024])
+        self.assertEqual(progress[2023]['distance'][-1], 5001 + 5002 + 5003)
+        self.assertEqual(progress[2023]['count'][day_index(date(2023, 3, 1))], 2)
+
+        comparison = same_day_comparison(self.athlete, date(2024, 3, 1))
+        self.assertEqual(comparison['last_year']['distance'], 5001 + 5002)
+        self.assertEqual(comparison['this_year']['distance'], 5004)
+        self.assertEqual(same_day_comparison(self.athlete, date(2024, 3, 1), 'Ride')['this_year'], None)
+
+        session = self.client.session
+        session['athlete_id'] = self.athlete.id
+        session.save()
+        response = self.client.get(reverse('year_over_year'), {'years': '2023', 'metric': 'count'})
+        self.assertEqual(response.status_code, 200)
+        chart = json.loads(response.context['chart_data'])
+        self.assertEqual([dataset['label'] for dataset in chart['datasets']], ['2023'])
+        self.assertEqual((len(chart['labels']), chart['labels'][59]), (366, 'Feb 29'))
+        self.assertEqual(chart['datasets'][0]['data'][-1], 3)
+        self.assertEqual(response.context['years'], [2024, 2023])
+
+    def test_patch_builds_missing_year(self):
+        bulk_upsert_activities(self.athlete, [activity_on(1, date(2023, 1, 15)), activity_on(2, date(2023, 6, 1))])
+        YearlyProgress.objects.all().delete()
+
+        # El primer día tocado de un año sin filas no deja fuera el resto del año
+        make_activity(self.athlete, 3, date(2023, 9, 1))
+        self.assertEqual(sum(self.stored()[2023, '']['count']), 3)
+
+
+class DatabaseBackendTests(TestCase):
+    """Agregados sin SQL propio de un backend y benchmark sobre la base de datos configurada."""
+
+    def setUp(self):
+        self.athlete = make_athlete()
+
+    def test_monthly_summary(self):
+        bulk_upsert_activities(self.athlete, [
+            strava_activity(1, datetime(2024, 1, 31, 8, tzinfo=dt_timezone.utc), 'Run'),
+            strava_activity(2, datetime(2024, 2, 1, 8, tzinfo=dt_timezone.utc), 'Ride'),
+            strava_activity(3, datetime(2024, 2, 29, 8, tzinfo=dt_timezone.utc), 'Run'),
+            strava_activity(4, datetime(2023, 12, 31, 8, tzinfo=dt_timezone.utc), 'Run'),
+        ])
+
+        with self.assertNumQueries(1):
+            months = monthly_summary(self.athlete, date(2024, 1, 1))
+        self.assertEqual([row['month_key'] for row in months], ['2024-02', '2024-01'])
+        self.assertEqual(months[0]['count'], 2)
+        self.assertAlmostEqual(months[0]['distance'], (5002 + 5003) / 1000)
+        self.assertAlmostEqual(months[1]['time'], 0.5)
+
+        session = self.client.session
+        session['athlete_id'] = self.athlete.id
+        session.save()
+        response = self.client.get(reverse('api_monthly'), {'since': '2023-12-01'})
+        self.assertEqual([row['month'] for row in response.json()['months']], ['2024-02', '2024-01', '2023-12'])
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+        call_command('benchmark_db', activities=30, page_size=10, repeat=1, stdout=out)
+        output = out.getvalue()
+        self.assertIn('sync initial import: 30 activities', output)
+        self.assertIn(reverse('monthly_view'), output)
+        # El atleta sintético no se queda en la base de datos
+        self.assertFalse(Athlete.objects.filter(id=999999).exists())
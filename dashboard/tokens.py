@@ -0,0 +1,95 @@
+"""
+Renovación de los tokens OAuth de Strava fuera de las peticiones web.
+
+Las vistas nunca esperan al servidor OAuth: el access token solo lo usan el
+worker y los comandos, que lo renuevan justo antes de llamar a la API si ha
+caducado, y `refresh_expiring_tokens` (lo llama el worker cada pocos minutos
+y `manage.py refresh_tokens`) renueva por adelantado los que caducan pronto.
+
+Strava puede rotar el refresh token en cada renovación y el anterior deja de
+valer, así que dos procesos que renueven a la vez el mismo atleta no deben
+pisarse. El resultado se guarda con un UPDATE condicionado al refresh token
+que se usó (compare-and-swap): si otro proceso lo cambió antes, se descarta
+el nuestro y se usan los tokens que ya están en la DB.
+"""
+from contextlib import nullcontext
+from datetime import timedelta
+
+import requests
+from django.utils import timezone
+
+from .cache import evict_athlete
+from .models import Athlete
+from .strava_api import get_client
+
+# Margen de la renovación anticipada. Debe superar los 10 minutos de
+# `Athlete.is_token_expired` y quedar por debajo de 1 hora: antes Strava
+# devuelve el mismo token sin renovarlo.
+REFRESH_AHEAD = timedelta(minutes=30)
+
+TOKEN_FIELDS = ['access_token', 'refresh_token', 'expires_at']
+
+
+def refresh_strava_token(athlete, write_lock=None):
+    """
+    Renueva el token del atleta y devuelve el atleta con los tokens vigentes.
+
+    La llamada a Strava se hace sin `write_lock`; el lock (el de
+    `sync_strava_data --workers`) solo se toma para guardar los tokens.
+    """
+    used = athlete.refresh_token
+    try:
+        data = get_client().refresh_token(used)
+    except requests.exceptions.HTTPError:
+        # Un refresh token rechazado puede ser uno que otro proceso acaba de rotar
+        if _reload_tokens(athlete) != used:
+            return athlete
+        raise
+
+    tokens = {
+        'access_token': data['access_token'],
+        'refresh_token': data.get('refresh_token', used),  # A veces no cambia
+        'expires_at': data['expires_at'],
+    }
+    with write_lock or nullcontext():
+        saved = Athlete.objects.filter(id=athlete.id, refresh_token=used).update(
+            updated_at=timezone.now(), **tokens
+        )
+    if saved:
+        for field, value in tokens.items():
+            setattr(athlete, field, value)
+    else:
+        # Otro proceso renovó antes: sus tokens son los que valen
+        _reload_tokens(athlete)
+
+    evict_athlete(athlete.id)
+    return athlete
+
+
+def ensure_fresh_token(athlete):
+    """Renueva el token solo si ha caducado (o le quedan menos de 10 minutos)."""
+    if athlete.is_token_expired():
+        return refresh_strava_token(athlete)
+    return athlete
+
+
+def refresh_expiring_tokens(ahead=REFRESH_AHEAD):
+    """
+    Renueva los tokens que caducan en menos de `ahead`.
+    Devuelve `(renovados, IDs de los atletas que fallaron)`.
+    """
+    cutoff = int((timezone.now() + ahead).timestamp())
+    refreshed, failed = 0, []
+    for athlete in Athlete.objects.filter(expires_at__lt=cutoff).only('id', *TOKEN_FIELDS):
+        try:
+            refresh_strava_token(athlete)
+        except requests.exceptions.RequestException:
+            failed.append(athlete.id)
+        else:
+            refreshed += 1
+    return refreshed, failed
+
+
+def _reload_tokens(athlete):
+    athlete.refresh_from_db(fields=TOKEN_FIELDS)
+    return athlete.refresh_token
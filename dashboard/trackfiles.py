@@ -0,0 +1,254 @@
+"""
+Lectura de ficheros de actividad (GPX, TCX y FIT, opcionalmente comprimidos
+con gzip) tal como vienen en la exportación de cuenta de Strava.
+
+Los XML se recorren con `iterparse` y cada punto se descarta en cuanto se
+lee, así que la memoria depende de las muestras (que acaban en arrays NumPy)
+y no del tamaño del XML. El módulo no usa el ORM: las funciones de
+`parse_in_worker` se ejecutan en los procesos de un `ProcessPoolExecutor`,
+que no inicializan Django.
+"""
+import gzip
+import math
+import struct
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from xml.etree.ElementTree import ParseError, iterparse
+
+import numpy as np
+
+from .fit import FitError, decode_fit
+from .polyline import encode, significance
+
+TRACK_FORMATS = {
+    '.gpx': 'gpx',
+    '.gpx.gz': 'gpx',
+    '.tcx': 'tcx',
+    '.tcx.gz': 'tcx',
+    '.fit': 'fit',
+    '.fit.gz': 'fit',
+}
+
+# Tolerancia de Douglas-Peucker para la `summary_polyline` (~10 m, como la de Strava)
+SUMMARY_TOLERANCE = 1e-4
+
+EARTH_RADIUS_M = 6371008.8
+
+# Etiqueta (sin namespace) -> canal, para los valores por punto
+GPX_VALUES = {'ele': 'altitude', 'hr': 'heartrate', 'cad': 'cadence', 'power': 'watts'}
+TCX_VALUES = {
+    'AltitudeMeters': 'altitude', 'DistanceMeters': 'distance', 'Value': 'heartrate',
+    'Cadence': 'cadence', 'RunCadence': 'cadence', 'Watts': 'watts',
+}
+VALUE_CHANNELS = ['distance', 'altitude', 'heartrate', 'cadence', 'watts']
+
+
+def track_format(name):
+    """'gpx', 'tcx', 'fit' o `None` según la extensión del fichero."""
+    name = name.lower()
+    for suffix, file_format in TRACK_FORMATS.items():
+        if name.endswith(suffix):
+            return file_format
+    return None
+
+
+def open_member(archive, name):
+    stream = archive.open(name)
+    return gzip.GzipFile(fileobj=stream) if name.lower().endswith('.gz') else stream
+
+
+def _local_name(tag):
+    return tag.rpartition('}')[2]
+
+
+def _parse_time(value):
+    return datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+
+
+def _skip_leading_whitespace(stream):
+    # Muchos TCX de Strava empiezan con espacios antes de `<?xml`, que el parser rechaza
+    while stream.peek(1)[:1].isspace():
+        stream.read(1)
+    return stream
+
+
+def iter_points(stream, file_format):
+    """
+    Genera un dict por punto con `time` (datetime), `lat`, `lng` y los valores
+    de los canales que traiga (`altitude`, `heartrate`...).
+    """
+    if file_format == 'gpx':
+        point_tag, values = 'trkpt', GPX_VALUES
+    else:
+        point_tag, values = 'Trackpoint', TCX_VALUES
+        stream = _skip_leading_whitespace(stream)
+
+    for _, elem in iterparse(stream, events=('end',)):
+        if _local_name(elem.tag) != point_tag:
+            continue
+        point = {}
+        if file_format == 'gpx' and 'lat' in elem.attrib:
+            point['lat'], point['lng'] = float(elem.attrib['lat']), float(elem.attrib['lon'])
+        for child in elem.iter():
+            tag = _local_name(child.tag)
+            text = (child.text or '').strip()
+            if not text:
+                continue
+            if tag == 'time' or tag == 'Time':
+                point['time'] = _parse_time(text)
+            elif tag == 'LatitudeDegrees':
+                point['lat'] = float(text)
+            elif tag == 'LongitudeDegrees':
+                point['lng'] = float(text)
+            elif tag in values:
+                point[values[tag]] = float(text)
+        elem.clear()
+        if 'time' in point:
+            yield point
+
+
+def _filled(values):
+    """Array con NaN -> array sin huecos (se rellenan con el valor anterior o el siguiente), o `None` si está vacío."""
+    if values is None:
+        return None
+    missing = np.isnan(values)
+    if missing.all():
+        return None
+    if missing.any():
+        index = np.where(missing, 0, np.arange(len(values)))
+        np.maximum.accumulate(index, out=index)
+        values = values[index]
+        values[np.isnan(values)] = values[~np.isnan(values)][0]
+    return values
+
+
+def cumulative_distance(latlng):
+    """Distancia acumulada en metros (haversine entre puntos consecutivos)."""
+    lat, lng = np.radians(latlng[:, 0]), np.radians(latlng[:, 1])
+    a = np.sin(np.diff(lat) / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lng) / 2) ** 2
+    steps = 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+    return np.concatenate(([0.0], np.cumsum(steps)))
+
+
+def build_track(start, columns):
+    """
+    Columnas alineadas (`time` en segundos desde `start`, `lat`, `lng` y los
+    demás canales, con NaN en los huecos) -> `{'start': datetime, 'streams':
+    {canal: array}}` con los canales de `streams.CHANNELS`.
+    """
+    columns = dict(columns)
+    streams = {'time': columns.pop('time')}
+    lat, lng = _filled(columns.pop('lat', None)), _filled(columns.pop('lng', None))
+    if lat is not None and lng is not None:
+        streams['latlng'] = np.column_stack((lat, lng))
+    for name, values in columns.items():
+        values = _filled(values)
+        if values is not None:
+            streams[name] = values
+    if 'distance' not in streams and 'latlng' in streams:
+        streams['distance'] = cumulative_distance(streams['latlng'])
+    return {'start': start, 'streams': streams}
+
+
+def _column(values):
+    return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+
+def parse_track(stream, file_format):
+    """Lee un GPX/TCX (ver `build_track`); `None` si no tiene puntos con hora."""
+    times = []
+    columns = {name: [] for name in ['lat', 'lng', *VALUE_CHANNELS]}
+    for point in iter_points(stream, file_format):
+        times.append(point['time'])
+        for name, values in columns.items():
+            values.append(point.get(name))
+    if not times:
+        return None
+
+    start = times[0]
+    columns = {name: _column(values) for name, values in columns.items()}
+    columns['time'] = np.array([(time - start).total_seconds() for time in times], dtype=np.float64)
+    return build_track(start, columns)
+
+
+def parse_fit(stream):
+    """Lee un FIT (ver `fit.decode_fit`); `None` si no tiene muestras."""
+    decoded = decode_fit(stream.read())
+    return build_track(*decoded) if decoded else None
+
+
+def track_summary(track):
+    """Polilínea resumida y puntos de inicio y fin, como los de un `SummaryActivity` de la API."""
+    latlng = track['streams'].get('latlng')
+    if latlng is None or not len(latlng):
+        return {'summary_polyline': '', 'start_latlng': None, 'end_latlng': None}
+    kept = significance(latlng, SUMMARY_TOLERANCE) > SUMMARY_TOLERANCE
+    return {
+        'summary_polyline': encode(latlng[kept]),
+        'start_latlng': [float(value) for value in latlng[0]],
+        'end_latlng': [float(value) for value in latlng[-1]],
+    }
+
+
+def read_member(archive, name):
+    """Lee un fichero del zip; devuelve `(track, error)`."""
+    file_format = track_format(name)
+    if file_format is None:
+        return None, f'unsupported file format: {name}'
+    try:
+        with open_member(archive, name) as stream:
+            track = parse_fit(stream) if file_format == 'fit' else parse_track(stream, file_format)
+    except (KeyError, OSError, EOFError, ParseError, FitError, struct.error, ValueError) as e:
+        return None, f'{name}: {e}'
+    if track is not None:
+        track['summary'] = track_summary(track)
+    return track, None
+
+
+# --- Lectura en paralelo ---
+
+_worker_archive = None
+
+
+def _open_worker_archive(path):
+    # Cada proceso abre su propio ZipFile: los objetos de fichero no se comparten entre procesos
+    global _worker_archive
+    _worker_archive = zipfile.ZipFile(path)
+
+
+def parse_in_worker(name):
+    return read_member(_worker_archive, name)
+
+
+class TrackReader:
+    """
+    Lee ficheros de un zip en este proceso (`workers=1`) o en un pool de
+    procesos. Se usa como context manager; `read(names)` devuelve los
+    `(track, error)` en el mismo orden que `names`.
+    """
+
+    def __init__(self, path, workers=1):
+        self.path = path
+        self.workers = workers
+        self.archive = None
+        self.pool = None
+
+    def __enter__(self):
+        if self.workers > 1:
+            self.pool = ProcessPoolExecutor(self.workers, initializer=_open_worker_archive, initargs=(self.path,))
+        else:
+            self.archive = zipfile.ZipFile(self.path)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+        if self.archive is not None:
+            self.archive.close()
+
+    def read(self, names):
+        if self.pool is None:
+            return [read_member(self.archive, name) for name in names]
+        chunksize = max(1, math.ceil(len(names) / (4 * self.workers)))
+        return list(self.pool.map(parse_in_worker, names, chunksize=chunksize))
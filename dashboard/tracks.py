@@ -0,0 +1,124 @@
+"""
+Trazados de actividad precalculados a varias resoluciones.
+
+En la sincronización cada `summary_polyline` se decodifica y se simplifica con
+Douglas-Peucker a varias tolerancias (una sola pasada, ver `polyline.significance`); el endpoint JSON del mapa devuelve solo
+la resolución que necesita el nivel de zoom, ya decodificada, para que el
+navegador no tenga que decodificar la polilínea completa en cada visita.
+"""
+import hashlib
+
+from .models import Activity, ActivityTrack
+from .polyline import DECODE_ERRORS, decode, encode, significance
+
+# (resolución, tolerancia en grados, zoom máximo de Leaflet en que se usa)
+RESOLUTIONS = [
+    ('low', 5e-4, 11),     # ~50 m
+    ('medium', 1e-4, 14),  # ~10 m
+    ('high', 2e-5, 16),    # ~2 m
+]
+FULL = 'full'
+
+
+def polyline_hash(polyline):
+    return hashlib.sha1((polyline or '').encode()).hexdigest()
+
+
+def resolution_for_zoom(zoom):
+    """Resolución adecuada para un nivel de zoom de Leaflet (`full` por encima del último)."""
+    for name, _, max_zoom in RESOLUTIONS:
+        if zoom <= max_zoom:
+            return name
+    return FULL
+
+
+def build_track(activity_id, polyline):
+    """Decodifica y simplifica una polilínea; devuelve un `ActivityTrack` sin guardar."""
+    points = decode(polyline)
+    track = ActivityTrack(
+        activity_id=activity_id,
+        source_hash=polyline_hash(polyline),
+        point_count=len(points),
+    )
+    if len(points):
+        track.min_lat, track.min_lng = (float(v) for v in points.min(axis=0))
+        track.max_lat, track.max_lng = (float(v) for v in points.max(axis=0))
+    # Una sola pasada de Douglas-Peucker para todas las resoluciones
+    kept = significance(points, min(tolerance for _, tolerance, _ in RESOLUTIONS))
+    for name, tolerance, _ in RESOLUTIONS:
+        setattr(track, name, encode(points[kept > tolerance]))
+    return track
+
+
+def refresh_tracks(polylines):
+    """
+    Recalcula los trazados de `{activity_id: summary_polyline}`.
+    Las actividades sin polilínea, o con una que no se puede decodificar,
+    pierden su trazado (una fila mal formada no debe tumbar el lote entero).
+    """
+    tracks, empty = [], []
+    for activity_id, polyline in polylines.items():
+        try:
+            track = build_track(activity_id, polyline) if polyline else None
+        except DECODE_ERRORS:
+            track = None
+        if track is None:
+            empty.append(activity_id)
+        else:
+            tracks.append(track)
+
+    if tracks:
+        ActivityTrack.objects.bulk_create(
+            tracks,
+            update_conflicts=True,
+            unique_fields=['activity'],
+            update_fields=['source_hash', 'point_count', 'low', 'medium', 'high',
+                           'min_lat', 'min_lng', 'max_lat', 'max_lng'],
+        )
+    if empty:
+        ActivityTrack.objects.filter(activity_id__in=empty).delete()
+
+
+def get_track(activity):
+    """Trazado de la actividad; lo construye si falta o si la polilínea cambió (datos antiguos)."""
+    track = ActivityTrack.objects.filter(activity_id=activity.id).first()
+    if activity.summary_polyline and (track is None or track.source_hash != polyline_hash(activity.summary_polyline)):
+        refresh_tracks({activity.id: activity.summary_polyline})
+        track = ActivityTrack.objects.filter(activity_id=activity.id).first()
+    return track
+
+
+def track_payload(activity, resolution):
+    """Cuerpo del endpoint JSON: puntos ya decodificados de la resolución pedida y límites."""
+    track = get_track(activity)
+    if track is None or not track.point_count:
+        return {'resolution': resolution, 'points': [], 'bounds': None}
+
+    encoded = activity.summary_polyline if resolution == FULL else getattr(track, resolution)
+    points = decode(encoded).round(5)
+    return {
+        'resolution': resolution,
+        'points': points.tolist(),
+        'bounds': [[track.min_lat, track.min_lng], [track.max_lat, track.max_lng]],
+    }
+
+
+def backfill_tracks(queryset=None, chunk_size=500):
+    """Construye los trazados de las actividades con polilínea que aún no lo tienen."""
+    queryset = queryset if queryset is not None else Activity.objects.all()
+    rows = queryset.filter(
+        summary_polyline__isnull=False, track__isnull=True
+    ).exclude(summary_polyline='').values_list('id', 'summary_polyline')
+
+    pending = {}
+    built = 0
+    for activity_id, polyline in rows.iterator(chunk_size=chunk_size):
+        pending[activity_id] = polyline
+        if len(pending) >= chunk_size:
+            refresh_tracks(pending)
+            built += len(pending)
+            pending = {}
+    if pending:
+        refresh_tracks(pending)
+        built += len(pending)
+    return built
@@ -0,0 +1,162 @@
+"""
+Carga de entrenamiento y forma física (fitness / fatigue / form).
+
+Cada actividad tiene una carga (`Activity.training_load`): el TRIMP de
+Banister con la frecuencia cardiaca media si la hay, o la duración por una
+intensidad según el tipo de actividad si no. `DailyRollup` la suma por día y
+`TrainingLoad` guarda la serie diaria del atleta:
+
+- fitness (carga crónica): media exponencial de 42 días de la carga diaria,
+- fatigue (carga aguda): media exponencial de 7 días,
+- form (balance): fitness - fatigue del día anterior.
+
+Cada día depende solo del anterior, así que una actividad nueva recalcula la
+serie desde su día en adelante partiendo de la fila guardada del día previo
+(ver `refresh_training_load`); el historial anterior no se vuelve a leer. La
+serie va del primer al último día activo; los días posteriores se extrapolan
+al leerla (sin carga, las medias solo decaen).
+"""
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import Activity, DailyRollup, TrainingLoad
+
+FITNESS_DAYS = 42
+FATIGUE_DAYS = 7
+FITNESS_DECAY = math.exp(-1 / FITNESS_DAYS)
+FATIGUE_DECAY = math.exp(-1 / FATIGUE_DAYS)
+
+# TRIMP de Banister: minutos x reserva de FC x 0.64 x e^(1.92 x reserva)
+TRIMP_WEIGHT = 0.64
+TRIMP_EXPONENT = 1.92
+
+# Carga por minuto sin frecuencia cardiaca (~ el TRIMP de un esfuerzo moderado)
+TYPE_INTENSITY = {
+    'Run': 1.5, 'TrailRun': 1.6, 'VirtualRun': 1.5,
+    'Ride': 1.1, 'VirtualRide': 1.3, 'MountainBikeRide': 1.3, 'GravelRide': 1.2, 'EBikeRide': 0.6,
+    'Swim': 1.4, 'Rowing': 1.4, 'NordicSki': 1.5, 'Hike': 0.9, 'Walk': 0.5,
+    'WeightTraining': 0.9, 'Workout': 1.0, 'Crossfit': 1.3, 'Yoga': 0.3,
+}
+DEFAULT_INTENSITY = 1.0
+
+
+def activity_load(values):
+    """Carga de una actividad a partir de `moving_time`, `average_heartrate` y `type` (dict de valores)."""
+    minutes = (values['moving_time'] or 0) / 60
+    average_heartrate = values.get('average_heartrate')
+    max_heartrate = settings.STRAVA_MAX_HEARTRATE
+    resting_heartrate = settings.STRAVA_RESTING_HEARTRATE
+    if average_heartrate and max_heartrate > resting_heartrate:
+        reserve = (average_heartrate - resting_heartrate) / (max_heartrate - resting_heartrate)
+        reserve = min(max(reserve, 0.0), 1.0)
+        return round(minutes * reserve * TRIMP_WEIGHT * math.exp(TRIMP_EXPONENT * reserve), 1)
+    return round(minutes * TYPE_INTENSITY.get(values['type'], DEFAULT_INTENSITY), 1)
+
+
+def next_day(previous, load):
+    """`(fitness, fatigue, form)` de un día a partir de los del día anterior y su carga."""
+    fitness, fatigue, _ = previous
+    return (
+        fitness * FITNESS_DECAY + load * (1 - FITNESS_DECAY),
+        fatigue * FATIGUE_DECAY + load * (1 - FATIGUE_DECAY),
+        fitness - fatigue,
+    )
+
+
+def refresh_training_load(athlete_id, from_day):
+    """
+    Recalcula la serie de `from_day` en adelante: lee la fila del día anterior
+    y las cargas diarias desde `from_day`, y reescribe solo esas filas.
+    Devuelve las filas escritas.
+    """
+    with transaction.atomic():
+        seed = TrainingLoad.objects.filter(
+            athlete_id=athlete_id, day__lt=from_day
+        ).order_by('-day').values_list('day', 'fitness', 'fatigue', 'form').first()
+
+        rows = TrainingLoad.objects.filter(athlete_id=athlete_id)
+        loads = DailyRollup.objects.filter(athlete_id=athlete_id)
+        if seed is None:
+            # Antes del primer día guardado: la serie entera, desde el primer día activo
+            start = None
+        else:
+            # Si hubo días sin actividad después de la última fila, se rellenan desde ella
+            start = seed[0] + timedelta(days=1)
+            rows = rows.filter(day__gte=start)
+            loads = loads.filter(day__gte=start)
+        rows.delete()
+
+        loads = dict(loads.values('day').annotate(total=Sum('training_load')).order_by().values_list('day', 'total'))
+        if not loads:
+            return 0
+
+        day = start or min(loads)
+        state = seed[1:] if seed else (0.0, 0.0, 0.0)
+        rows = []
+        while day <= max(loads):
+            load = loads.get(day) or 0.0
+            state = next_day(state, load)
+            fitness, fatigue, form = state
+            rows.append(TrainingLoad(
+                athlete_id=athlete_id, day=day, load=load, fitness=fitness, fatigue=fatigue, form=form,
+            ))
+            day += timedelta(days=1)
+        TrainingLoad.objects.bulk_create(rows, batch_size=500)
+        return len(rows)
+
+
+def recompute_activity_loads(athlete_id, chunk_size=500):
+    """Recalcula `Activity.training_load` de todas las actividades del atleta. Devuelve las que cambiaron."""
+    changed = []
+    rows = Activity.objects.filter(athlete_id=athlete_id).values(
+        'id', 'moving_time', 'average_heartrate', 'type', 'training_load'
+    )
+    for row in rows.iterator(chunk_size=chunk_size):
+        load = activity_load(row)
+        if load != row['training_load']:
+            changed.append(Activity(id=row['id'], training_load=load))
+    Activity.objects.bulk_update(changed, ['training_load'], batch_size=chunk_size)
+    return len(changed)
+
+
+def rebuild_training_load(athlete_id):
+    """Recalcula la serie completa del atleta (p. ej. tras cambiar la FC máxima o en reposo)."""
+    first_day = DailyRollup.objects.filter(athlete_id=athlete_id).order_by('day').values_list('day', flat=True).first()
+    if first_day is None:
+        TrainingLoad.objects.filter(athlete_id=athlete_id).delete()
+        return 0
+    return refresh_training_load(athlete_id, first_day)
+
+
+def training_series(athlete, since, today):
+    """
+    Serie diaria de `since` a `today` (incluidos), en una sola consulta si
+    hay filas guardadas en el periodo. Los días posteriores al último guardado
+    se extrapolan sin carga y los anteriores al primero no se incluyen.
+    Lista de dicts con `day`, `load`, `fitness`, `fatigue` y `form`.
+    """
+    rows = list(TrainingLoad.objects.filter(
+        athlete=athlete, day__gte=since, day__lte=today,
+    ).order_by('day').values('day', 'load', 'fitness', 'fatigue', 'form'))
+    if rows:
+        last = rows[-1]
+    else:
+        # Sin actividad en el periodo: se extrapola desde el último día guardado
+        last = TrainingLoad.objects.filter(athlete=athlete, day__lt=since).order_by('-day').values(
+            'day', 'load', 'fitness', 'fatigue', 'form'
+        ).first()
+        if last is None:
+            return rows
+
+    state = (last['fitness'], last['fatigue'], last['form'])
+    day = last['day'] + timedelta(days=1)
+    while day <= today:
+        state = next_day(state, 0.0)
+        if day >= since:
+            rows.append({'day': day, 'load': 0.0, 'fitness': state[0], 'fatigue': state[1], 'form': state[2]})
+        day += timedelta(days=1)
+    return rows
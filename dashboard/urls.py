@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     # Autenticación
@@ -10,10 +10,26 @@ urlpatterns = [
     # Vistas Principales (Asumiendo que las vistas principales de Django migran aquí)
     path('', views.index, name='index'), # Dashboard
     path('activities/', views.activities_list, name='activities'),
+    path('activities/nearby.json', views.nearby_activities_view, name='nearby_activities'),
+    path('activities/export/', views.export_activities_view, name='export_activities'),
     path('activities/<int:activity_id>/', views.activity_detail, name='activity_detail'),
+    path('activities/<int:activity_id>/track.json', views.activity_track, name='activity_track'),
     path('monthly/', views.monthly_view, name='monthly_view'),
+    path('training/', views.training_view, name='training_view'),
+    path('year-over-year/', views.year_over_year_view, name='year_over_year'),
     path('weekly/', views.weekly_view, name='weekly_view'), # Aún por implementar
+    path('heatmap/', views.heatmap_view, name='heatmap'),
+    path('heatmap/tiles/<int:version>/<int:zoom>/<int:x>/<int:y>.png', views.heatmap_tile, name='heatmap_tile'),
 
     # Tarea de sincronización
     path('refresh/', views.refresh_activities_view, name='refresh_activities'),
+    path('sync/status/', views.sync_status, name='sync_status'),
+    path('webhook/', views.strava_webhook, name='strava_webhook'),
+
+    # API JSON de solo lectura (ver dashboard/api.py)
+    path('api/v1/summary/', api.summary, name='api_summary'),
+    path('api/v1/weekly/', api.weekly, name='api_weekly'),
+    path('api/v1/monthly/', api.monthly, name='api_monthly'),
+    path('api/v1/activities/', api.activities, name='api_activities'),
+    path('api/v1/activities/<int:activity_id>/', api.activity, name='api_activity'),
 ]
\ No newline at end of file
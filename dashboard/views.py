@@ -1,16 +1,34 @@
 import requests
+import math
 import os
 from datetime import datetime, timedelta
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.urls import reverse
 from django.conf import settings
 from django.contrib import messages
 import json 
-from .models import Athlete, Activity
+from contextlib import nullcontext
+from .models import Athlete, Activity, AthleteStreak, Heatmap, SyncJob
+from .strava_api import RateLimitExceeded, get_client
+from . import rollups
+from .analysis import display_analysis, get_analysis
+from .cache import cached, evict_athlete
+from .pagination import InvalidCursor, paginate_keyset
+from .tracks import resolution_for_zoom, track_payload
+from .geo import nearby_activities
+from .routes import find_same_route
+from .heatmap import EMPTY_TILE, tile_path
+from .jobs import enqueue_sync, job_payload
+from .webhooks import enqueue_webhook_event, verify_subscription
+from .export import FORMATS, export_activities
+from .training import training_series
+from . import yearly
+from .ingest import DEFAULT_BATCH_SIZE, bulk_upsert_activities, merge_stats, new_stats
 from django.db.models import Sum, Count, F, Max
 from django.db.models.functions import ExtractYear, ExtractWeek, ExtractDay
-from django.core.paginator import Paginator
 from collections import defaultdict
+from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.db import transaction
 from django.utils import timezone # Usamos timezone de Django
@@ -19,60 +37,70 @@ from django.utils import timezone # Usamos timezone de Django
 
 def index(request):
     """Vista principal del Dashboard."""
-    athlete, access_token = get_athlete_and_token(request)
+    athlete = request.athlete
 
     if not athlete:
         return render(request, 'index.html', {'is_authenticated': False})
 
     # 1. Calcular Fechas Clave
-    today = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    today = timezone.now().date()
+
+    # 2. El contexto solo cambia tras una sincronización (o al cambiar de día)
+    context = {
+        **cached(athlete, 'index', lambda: build_index_context(athlete, today), today),
+        'athlete': athlete,
+        'is_authenticated': True,
+    }
+
+    return render(request, 'index.html', context)
+
+def build_index_context(athlete, today):
+    """Calcula las tarjetas, la meta mensual y el gráfico del dashboard."""
     start_of_week = today - timedelta(days=today.weekday())
     start_of_month = today.replace(day=1)
     
-    # 2. Agregación Base
-    def get_summary(start_date, end_date=today + timedelta(days=1)):
-        summary = Activity.objects.filter(
-            athlete=athlete,
-            start_date_local__gte=start_date,
-            start_date_local__lt=end_date
-        ).aggregate(
-            count=Count('id'),
-            distance=Sum('distance') / 1000.0,
-            elevation=Sum('total_elevation_gain'),
-            time=Sum('moving_time') / 3600.0,
-        )
-        return {k: round(v, 2) if v is not None else 0 for k, v in summary.items()}
+    # 1. Agregación Base (una sola consulta sobre los agregados diarios)
+    summaries = rollups.summarize_periods(
+        athlete,
+        {'today': today, 'this_week': start_of_week, 'this_month': start_of_month},
+        end_day=today,
+    )
 
-    # 3. Lógica para Actividades Recientes (movida desde el template)
-    recent_activities = Activity.objects.filter(athlete=athlete).order_by('-start_date_local')[:5]
+    # 2. Lógica para Actividades Recientes (movida desde el template)
+    recent_activities = list(Activity.objects.filter(athlete=athlete).order_by('-start_date_local')[:5])
 
-    # 4. Lógica para Gráfico de Distribución por Tipo de Actividad
-    activity_distribution = Activity.objects.filter(
-        athlete=athlete
-    ).values('type').annotate(
-        count=Count('id')
-    ).order_by('-count')
+    # 3. Lógica para Gráfico de Distribución por Tipo de Actividad
+    activity_distribution = rollups.type_distribution(athlete)
 
     chart_labels = [item['type'] for item in activity_distribution]
     chart_data = [item['count'] for item in activity_distribution]
 
+    # 4. Racha de actividad (estado precalculado en la sincronización)
+    streak = AthleteStreak.objects.filter(athlete=athlete).first()
+    streak_data = None
+    if streak and streak.total_days:
+        streak_data = {
+            'current_streak': streak.current_streak_on(today),
+            'longest_streak': streak.longest_streak,
+            'total_days': streak.total_days,
+        }
+
     # 5. Construir el Contexto Final
-    today_stats = get_summary(today)
-    this_week_stats = get_summary(start_of_week)
-    this_month_stats = get_summary(start_of_month)
+    today_stats = summaries['today']
+    this_week_stats = summaries['this_week']
+    this_month_stats = summaries['this_month']
 
     # Goal Logic (Default 150km)
     monthly_goal = 150.0
     current_distance = this_month_stats.get('distance', 0)
     goal_percentage = min(100, (current_distance / monthly_goal * 100)) if monthly_goal > 0 else 0
 
-    context = {
+    return {
         'today': today_stats,
         'this_week': this_week_stats,
         'this_month': this_month_stats,
-        'athlete': athlete,
-        'is_authenticated': True,
         'recent_activities': recent_activities,
+        'streak': streak_data,
         # Goal Data
         'meta_mensual': monthly_goal,
         'avance_mensual': current_distance,
@@ -82,56 +110,42 @@ def index(request):
         'chart_data': json.dumps(chart_data),
     }
 
-    return render(request, 'index.html', context)
-
 def weekly_view(request):
     """
     Muestra el progreso semanal agregado de las actividades del atleta durante el último año.
     """
-    athlete, _ = get_athlete_and_token(request)
+    athlete = request.athlete
 
     if not athlete:
         messages.warning(request, "Please log in to see your weekly progress.")
         return redirect('login')
 
     # 1. Definir el rango de tiempo (ej: último año)
-    one_year_ago = datetime.now() - timedelta(days=365)
-
-    # 2. Agregación Semanal Avanzada
-    # Usamos ExtractIsoWeek para obtener el número de semana (1-52/53) y ExtractYear para agrupar
-    weekly_summary = Activity.objects.filter(
-        athlete=athlete,
-        start_date_local__gte=one_year_ago
-    ).annotate(
-        # Creamos campos temporales para agrupar por Año y Semana ISO
-        year=ExtractYear('start_date_local'),
-        week=ExtractWeek('start_date_local')
-    ).values(
-        'year', 'week'
-    ).annotate(
-        # Calculamos las métricas agregadas
-        count=Count('id'),
-        distance=Sum(F('distance') / 1000.0), # Convertir a km en la DB
-        elevation=Sum('total_elevation_gain'),
-        time=Sum(F('moving_time') / 3600.0)    # Convertir a horas en la DB
-    ).order_by('-year', '-week') # Ordenar de la semana más reciente a la más antigua
-
-    # 3. Formatear los datos para la plantilla
-    weekly_data = []
-    for entry in weekly_summary:
-        # Formatear la clave de la semana como "YYYY - Week W"
-        week_label = f"{entry['year']} - Week {entry['week']}"
-        
-        weekly_data.append({
-            'week': week_label,
-            'data': {
-                'count': entry['count'],
-                'distance': entry['distance'] or 0.0,
-                'elevation': entry['elevation'] or 0.0,
-                'time': entry['time'] or 0.0,
-            }
-        })
-        
+    one_year_ago = timezone.now().date() - timedelta(days=365)
+
+    def build_weekly_data():
+        # 2. Agregación Semanal sobre los agregados diarios (año y semana ISO)
+        weekly_summary = rollups.weekly_summary(athlete, one_year_ago)
+
+        # 3. Formatear los datos para la plantilla
+        weekly_data = []
+        for entry in weekly_summary:
+            # Formatear la clave de la semana como "YYYY - Week W"
+            week_label = f"{entry['year']} - Week {entry['week']}"
+
+            weekly_data.append({
+                'week': week_label,
+                'data': {
+                    'count': entry['count'],
+                    'distance': entry['distance'] or 0.0,
+                    'elevation': entry['elevation'] or 0.0,
+                    'time': entry['time'] or 0.0,
+                }
+            })
+        return weekly_data
+
+    weekly_data = cached(athlete, 'weekly', build_weekly_data, one_year_ago)
+
     context = {
         'athlete': athlete,
         'weekly_data': weekly_data,
@@ -141,61 +155,136 @@ def weekly_view(request):
 
 def monthly_view(request):
     """Vista de resumen mensual."""
-    athlete, access_token = get_athlete_and_token(request)
+    athlete = request.athlete
 
     if not athlete:
         messages.warning(request, "Please log in to see the monthly view.")
         return redirect('login')
 
-    # Usamos F() expressions y anotaciones para agrupar y agregar en la DB
-    monthly_data_raw = Activity.objects.filter(
-        athlete=athlete,
-        start_date_local__gte=timezone.now() - timedelta(days=365)
-    ).extra(
-        select={'month_key': "strftime('%%Y-%%m', start_date_local)"} # SQLite formatting
-    ).values('month_key').annotate(
-        count=Count('id'),
-        distance=Sum(F('distance') / 1000.0),
-        elevation=Sum('total_elevation_gain'),
-        time=Sum(F('moving_time') / 3600.0)
-    ).order_by('-month_key')
-
-    monthly_data = [{
-        'month': item['month_key'],
-        'data': {k: item[k] for k in ['count', 'distance', 'elevation', 'time']}
-    } for item in monthly_data_raw]
+    one_year_ago = timezone.now().date() - timedelta(days=365)
+
+    def build_monthly_data():
+        # Agregamos por mes sobre los agregados diarios
+        monthly_data_raw = rollups.monthly_summary(athlete, one_year_ago)
+
+        return [{
+            'month': item['month_key'],
+            'data': {k: item[k] for k in ['count', 'distance', 'elevation', 'time']}
+        } for item in monthly_data_raw]
+
+    monthly_data = cached(athlete, 'monthly', build_monthly_data, one_year_ago)
 
     return render(request, 'monthly.html', {'monthly_data': monthly_data, 'athlete': athlete})
 
-# --- Funciones Auxiliares de API (Mejor práctica: Mover a un módulo `strava_api.py`) ---
+TRAINING_PERIODS = [90, 180, 365, 730]
 
-def get_session():
-    """Usa requests.Session para conexiones persistentes."""
-    return requests.Session()
 
-def refresh_strava_token(athlete):
-    """Refresca el token de acceso de Strava."""
-    url = f"{settings.STRAVA_OAUTH_URL}/token"
-    payload = {
-        'client_id': settings.STRAVA_CLIENT_ID,
-        'client_secret': settings.STRAVA_CLIENT_SECRET,
-        'grant_type': 'refresh_token',
-        'refresh_token': athlete.refresh_token
-    }
-    
-    with get_session() as s:
-        response = s.post(url, data=payload)
-    
-    response.raise_for_status()
-    data = response.json()
-    
-    # Actualizar el objeto Athlete en la DB
-    athlete.access_token = data['access_token']
-    athlete.refresh_token = data.get('refresh_token', athlete.refresh_token) # A veces no cambia
-    athlete.expires_at = data['expires_at']
-    athlete.save()
-    
-    return athlete
+def training_view(request):
+    """Gráfica de forma física (fitness, fatigue y form) a partir de la serie guardada."""
+    athlete = request.athlete
+
+    if not athlete:
+        messages.warning(request, "Please log in to see your training load.")
+        return redirect('login')
+
+    try:
+        days = int(request.GET.get('days', 180))
+    except ValueError:
+        days = 180
+    if days not in TRAINING_PERIODS:
+        days = 180
+    today = timezone.now().date()
+    since = today - timedelta(days=days - 1)
+
+    def build_training_data():
+        series = training_series(athlete, since, today)
+        return {
+            'labels': [row['day'].isoformat() for row in series],
+            'load': [round(row['load'], 1) for row in series],
+            'fitness': [round(row['fitness'], 1) for row in series],
+            'fatigue': [round(row['fatigue'], 1) for row in series],
+            'form': [round(row['form'], 1) for row in series],
+        }
+
+    chart = cached(athlete, 'training', build_training_data, since, today)
+    current = {key: chart[key][-1] for key in ('fitness', 'fatigue', 'form')} if chart['labels'] else None
+
+    return render(request, 'training.html', {
+        'athlete': athlete,
+        'chart_data': json.dumps(chart),
+        'current': current,
+        'days': days,
+        'periods': TRAINING_PERIODS,
+    })
+
+# Métrica -> (etiqueta, divisor para mostrarla)
+YOY_METRICS = {
+    'distance': ('Distance (km)', 1000.0),
+    'moving_time': ('Time (h)', 3600.0),
+    'elevation': ('Elevation (m)', 1.0),
+    'count': ('Activities', 1.0),
+}
+
+
+def year_over_year_view(request):
+    """Progreso acumulado de varios años superpuestos por día del año."""
+    athlete = request.athlete
+
+    if not athlete:
+        messages.warning(request, "Please log in to see the year-over-year comparison.")
+        return redirect('login')
+
+    today = timezone.now().date()
+    selected_type = request.GET.get('type', yearly.ALL_TYPES)
+    metric = request.GET.get('metric', 'distance')
+    if metric not in YOY_METRICS:
+        metric = 'distance'
+    label, divisor = YOY_METRICS[metric]
+    requested_years = sorted({
+        int(year) for value in request.GET.getlist('years') for year in value.split(',') if year.strip().isdigit()
+    }, reverse=True)
+
+    def build_yoy_data():
+        years = yearly.available_years(athlete, selected_type)
+        shown = [year for year in requested_years if year in years] or years[:3]
+        progress = yearly.cumulative_progress(athlete, shown, selected_type)
+        today_index = yearly.day_index(today)
+
+        datasets = []
+        for year in shown:
+            values = progress[year][metric] / divisor
+            if year == today.year:
+                # El año en curso se corta en hoy
+                values = values[:today_index + 1]
+            datasets.append({'label': str(year), 'data': [round(float(value), 2) for value in values]})
+
+        comparison = yearly.same_day_comparison(athlete, today, selected_type)
+        return {
+            'years': years,
+            'shown': shown,
+            'labels': [yearly.index_date(yearly.LEAP_YEAR, index).strftime('%b %d') for index in range(yearly.DAYS)],
+            'datasets': datasets,
+            'comparison': {
+                key: round(values[metric] / divisor, 1) if values else None
+                for key, values in comparison.items()
+            },
+        }
+
+    data = cached(athlete, 'yoy', build_yoy_data, today, selected_type, metric, *requested_years)
+
+    return render(request, 'year_over_year.html', {
+        'athlete': athlete,
+        'years': data['years'],
+        'shown': data['shown'],
+        'comparison': data['comparison'],
+        'chart_data': json.dumps({'labels': data['labels'], 'datasets': data['datasets']}),
+        'types': rollups.activity_types(athlete),
+        'selected_type': selected_type,
+        'metric': metric,
+        'metric_label': label,
+        'metrics': {key: value[0] for key, value in YOY_METRICS.items()},
+        'today': today,
+    })
 
 # --- Vistas de Autenticación ---
 
@@ -229,19 +318,11 @@ def strava_callback(request):
         messages.error(request, "Authorization code missing.")
         return redirect('index')
 
-    token_url = f"{settings.STRAVA_OAUTH_URL}/token"
-    payload = {
-        'client_id': settings.STRAVA_CLIENT_ID,
-        'client_secret': settings.STRAVA_CLIENT_SECRET,
-        'code': code,
-        'grant_type': 'authorization_code',
-    }
-
     try:
-        with get_session() as s:
-            response = s.post(token_url, data=payload)
-        response.raise_for_status()
-        data = response.json()
+        data = get_client().exchange_code(code)
+    except RateLimitExceeded as e:
+        messages.error(request, f"Strava is limiting requests right now. Please try again in {math.ceil(e.retry_after / 60)} minutes.")
+        return redirect('index')
     except requests.exceptions.RequestException as e:
         messages.error(request, f"Error exchanging code for token: {e}")
         return redirect('index')
@@ -267,12 +348,15 @@ def strava_callback(request):
             }
         )
     
+    evict_athlete(athlete_id)
+
     # Iniciar sesión de Django (guardar el ID del atleta en la sesión)
     request.session['athlete_id'] = athlete_id
     messages.success(request, f"Welcome back, {athlete.firstname}!")
     
-    # Iniciar la primera sincronización de datos
-    return redirect(reverse('refresh_activities'))
+    # Encolar la sincronización de datos; la página muestra el progreso
+    enqueue_sync(athlete)
+    return redirect('index')
 
 
 def logout_view(request):
@@ -282,29 +366,20 @@ def logout_view(request):
     messages.info(request, "Successfully logged out.")
     return redirect('index')
 
-def get_athlete_and_token(request):
-    """Obtiene el atleta de la sesión y refresca el token si es necesario."""
-    athlete_id = request.session.get('athlete_id')
-    if not athlete_id:
-        return None, None
-        
-    athlete = get_object_or_404(Athlete, id=athlete_id)
-    
-    if athlete.is_token_expired():
-        try:
-            athlete = refresh_strava_token(athlete)
-        except requests.exceptions.RequestException as e:
-            messages.error(request, f"Token refresh failed. Please re-login: {e}")
-            return None, None
-            
-    return athlete, athlete.access_token
-
 
-def fetch_and_sync_activities(athlete, access_token):
+def fetch_and_sync_activities(athlete, access_token, batch_size=DEFAULT_BATCH_SIZE, write_lock=None, progress=None):
     """
     Obtiene las actividades nuevas del atleta desde Strava y las sincroniza con la DB.
     Esta lógica DEBE ser reutilizada en el cron job (`daily_update.py`).
+
+    Las actividades se escriben por lotes de `batch_size` (ver `ingest.bulk_upsert_activities`).
+    Cuando varios atletas se sincronizan en paralelo, `write_lock` serializa las escrituras;
+    el límite de peticiones lo reparte el cliente compartido de `strava_api`.
+    Si se pasa `progress(page, stats)`, se llama tras cada página (ver `jobs.run_job`).
+    Devuelve un dict con las filas `inserted`, `updated` y `unchanged`.
     """
+    write_lock = write_lock or nullcontext()
+
     # 1. Determinar el punto de partida (after parameter de la API)
     # Buscamos la fecha de inicio más reciente en nuestra DB para este atleta
     last_activity = Activity.objects.filter(athlete=athlete).aggregate(Max('start_date'))
@@ -316,99 +391,69 @@ def fetch_and_sync_activities(athlete, access_token):
         after_timestamp = int(last_date.timestamp())
 
     # 2. Bucle de paginación para obtener actividades
-    activities_url = f"{settings.STRAVA_API_URL}/athlete/activities"
-    page = 1
-    new_activities_count = 0
-
-    with get_session() as s:
-        # Usamos requests.Session() para conexiones persistentes (Mejor Práctica)
-        while True:
-            params = {
-                'page': page,
-                'per_page': 50,
-                'after': after_timestamp # Solo actividades después de este timestamp
-            }
-            headers = {'Authorization': f'Bearer {access_token}'}
-
-            response = s.get(activities_url, headers=headers, params=params)
-            response.raise_for_status()
-            strava_activities = response.json()
-            
-            if not strava_activities:
-                break # No hay más actividades
-
-            # 3. Sincronizar con la DB
-            for item in strava_activities:
-                # Convertir la fecha UTC (string) a objeto datetime
-                start_date_utc = datetime.strptime(item['start_date'], '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc)
-                start_date_local = datetime.strptime(item['start_date_local'], '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc)
-
-                # Extraer datos de mapa si existen
-                map_data = item.get('map', {})
-                summary_polyline = map_data.get('summary_polyline')
-                start_latlng = item.get('start_latlng')
-                end_latlng = item.get('end_latlng')
-
-                # Crear o actualizar la actividad
-                Activity.objects.update_or_create(
-                    id=item['id'],
-                    defaults={
-                        'athlete': athlete,
-                        'name': item['name'],
-                        'distance': item['distance'],
-                        'moving_time': item['moving_time'],
-                        'elapsed_time': item['elapsed_time'],
-                        'total_elevation_gain': item['total_elevation_gain'],
-                        'type': item['type'],
-                        'sport_type': item['sport_type'],
-                        'average_speed': item['average_speed'],
-                        'max_speed': item['max_speed'],
-                        'has_heartrate': item.get('has_heartrate', False),
-                        'average_heartrate': item.get('average_heartrate'),
-                        'max_heartrate': item.get('max_heartrate'),
-                        'start_date': start_date_utc,
-                        'start_date_local': start_date_local,
-                        'timezone': item['timezone'],
-                        'summary_polyline': summary_polyline,
-                        'start_latlng': json.dumps(start_latlng) if start_latlng else None,
-                        'end_latlng': json.dumps(end_latlng) if end_latlng else None,
-                    }
-                )
-                new_activities_count += 1
-                
-            page += 1
-            # Strava tiene un límite de 200 por página, pero 50 es más seguro.
-            if len(strava_activities) < 50:
-                break # Menos del límite significa que es la última página
-
-    return new_activities_count
+    # Strava tiene un límite de 200 por página, pero 50 es más seguro.
+    stats = new_stats()
+    pending = []
+
+    for page, strava_activities in get_client().iter_activity_pages(access_token, per_page=50, after=after_timestamp):
+        # 3. Sincronizar con la DB en lotes (una transacción por lote)
+        pending.extend(strava_activities)
+        if len(pending) >= batch_size:
+            with write_lock:
+                merge_stats(stats, bulk_upsert_activities(athlete, pending, batch_size))
+            pending = []
+        if progress:
+            progress(page, stats)
+
+    if pending:
+        with write_lock:
+            merge_stats(stats, bulk_upsert_activities(athlete, pending, batch_size))
+        if progress:
+            progress(page, stats)
+
+    return stats
 
 # --- Vista para la Sincronización Manual ---
 
 def refresh_activities_view(request):
     """Endpoint de Django para la sincronización manual de datos."""
-    athlete, access_token = get_athlete_and_token(request)
+    athlete = request.athlete
 
     if not athlete:
-        return redirect('login') # Si no hay atleta o falla el refresh, redirigir al login
+        return redirect('login') # Si no hay atleta en la sesión, redirigir al login
+
+    # La sincronización la hace el worker (`run_sync_worker`); aquí solo se encola
+    job, created = enqueue_sync(athlete)
+    if created:
+        messages.info(request, "Data synchronization started. Your dashboard will update when it finishes.")
+    else:
+        messages.info(request, "A data synchronization is already in progress.")
 
-    try:
-        count = fetch_and_sync_activities(athlete, access_token)
-        messages.success(request, f"Data synchronization complete. {count} new activities added.")
-    except requests.exceptions.HTTPError as e:
-        # Manejar errores de la API (ej: 401 Unauthorized, 404 Not Found)
-        messages.error(request, f"Strava API Error during sync. Status: {e.response.status_code}. Message: {e.response.text}")
-    except Exception as e:
-        messages.error(request, f"An unexpected error occurred during sync: {e}")
-        
     return redirect('index')
 
+
+def sync_status(request):
+    """Estado de la última sincronización del atleta en JSON (lo consulta la barra de progreso)."""
+    athlete_id = request.session.get('athlete_id')
+    if not athlete_id:
+        return JsonResponse({'error': 'Not authenticated'}, status=401)
+
+    # Los eventos del webhook son instantáneos y no muestran progreso
+    job = SyncJob.objects.filter(athlete_id=athlete_id, kind=SyncJob.SYNC).first()
+    if job and job.finished_at and timezone.now() - job.finished_at < timedelta(seconds=settings.STRAVA_ATHLETE_CACHE_TIMEOUT):
+        # El worker (otro proceso) no puede expulsar el atleta de una caché local de este
+        # proceso: al terminar la sincronización la página se recarga y debe ver los datos nuevos
+        evict_athlete(athlete_id)
+    response = JsonResponse(job_payload(job))
+    response['Cache-Control'] = 'no-store'
+    return response
+
 def activities_list(request):
     """
     Lista de actividades con paginación y filtrado por tipo.
     Miga la lógica de la función 'activities()' de app.py
     """
-    athlete, access_token = get_athlete_and_token(request)
+    athlete = request.athlete
 
     if not athlete:
         messages.warning(request, "Please log in to see your activities.")
@@ -424,51 +469,28 @@ def activities_list(request):
     if selected_type:
         activities_queryset = activities_queryset.filter(type=selected_type)
 
-    # Obtener todos los tipos únicos para el dropdown de filtrado
-    activity_types = Activity.objects.filter(athlete=athlete).values_list('type', flat=True).distinct().order_by('type')
+    # Obtener todos los tipos únicos para el dropdown de filtrado (de los agregados diarios)
+    activity_types = cached(athlete, 'activity_types', lambda: rollups.activity_types(athlete))
 
+    # 4. Paginación por cursor sobre (start_date_local, id): coste constante por página
     PAGINATOR_SIZE = 20
-    paginator = Paginator(activities_queryset, PAGINATOR_SIZE)
-    
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    # activities.items -> page_obj.object_list
-    # activities.has_next -> page_obj.has_next
-    # activities.next_num -> page_obj.next_page_number
-    # activities.iter_pages() -> Lo simularemos con un loop
-    
-    # 5. Generar un rango de páginas para la plantilla (opcional, pero mejora la UX)
-    def get_page_range(current_page, num_pages):
-        """Genera un rango de números de página para mostrar en el paginador."""
-        if num_pages <= 10:
-            return range(1, num_pages + 1)
-        
-        # Muestra 3 páginas alrededor de la actual + el inicio y el fin.
-        start = max(1, current_page - 2)
-        end = min(num_pages, current_page + 2)
-        
-        pages = list(range(start, end + 1))
-        
-        if 1 not in pages:
-            pages.insert(0, 1)
-            if 2 not in pages and 1 < start - 1:
-                pages.insert(1, None) # Placeholder para "..."
-
-        if num_pages not in pages:
-            if num_pages - 1 not in pages and num_pages > end + 1:
-                pages.append(None) # Placeholder para "..."
-            pages.append(num_pages)
-            
-        return pages
+    cursor = request.GET.get('cursor')
+
+    try:
+        page_obj = cached(
+            athlete, 'activities',
+            lambda: paginate_keyset(activities_queryset, cursor, PAGINATOR_SIZE),
+            selected_type, cursor,
+        )
+    except InvalidCursor:
+        return HttpResponse("Invalid cursor", status=400, content_type='text/plain')
 
     context = {
         # Renombramos para usar un nombre de variable más claro en la plantilla
         'page_obj': page_obj, 
-        'activities': page_obj.object_list,
+        'activities': page_obj['object_list'],
         'activity_types': activity_types,
         'selected_type': selected_type,
-        'page_range': get_page_range(page_obj.number, paginator.num_pages),
         'athlete': athlete,
     }
 
@@ -478,7 +500,7 @@ def activity_detail(request, activity_id):
     """
     Muestra los detalles de una actividad específica y sus actividades similares para comparación.
     """
-    athlete, _ = get_athlete_and_token(request)
+    athlete = request.athlete
 
     if not athlete:
         messages.warning(request, "Please log in to see activity details.")
@@ -492,21 +514,194 @@ def activity_detail(request, activity_id):
         athlete=athlete
     )
 
-    # Lógica para actividades similares (mismo tipo, anteriores a la fecha actual)
-    similar_activities = Activity.objects.filter(
-        athlete=athlete,
-        type=activity.type,
-        start_date_local__lt=activity.start_date_local # Actividades con fecha anterior
-    ).exclude(
-        id=activity.id
-    ).order_by(
-        '-start_date_local' # Las más recientes primero
-    )[:5] # Limitar a las 5 más recientes para la comparación en la tabla
+    # Actividades por la misma ruta (huella del recorrido, ver dashboard/routes.py)
+    similar_activities = find_same_route(activity)
+    same_route = similar_activities is not None
+
+    # Sin mapa: mismo tipo, anteriores a la fecha actual
+    if not same_route:
+        similar_activities = Activity.objects.filter(
+            athlete=athlete,
+            type=activity.type,
+            start_date_local__lt=activity.start_date_local # Actividades con fecha anterior
+        ).exclude(
+            id=activity.id
+        ).order_by(
+            '-start_date_local' # Las más recientes primero
+        )[:5] # Limitar a las 5 más recientes para la comparación en la tabla
+
+    # Análisis de streams (mejores esfuerzos, zonas...), cacheado por actividad
+    analysis = display_analysis(get_analysis(activity))
 
     context = {
         'athlete': athlete,
         'activity': activity,
         'similar_activities': similar_activities,
+        'same_route': same_route,
+        'analysis': analysis,
     }
     
-    return render(request, 'activity_detail.html', context)
\ No newline at end of file
+    return render(request, 'activity_detail.html', context)
+
+def activity_track(request, activity_id):
+    """
+    Trazado del mapa en JSON, ya decodificado y simplificado para el zoom pedido
+    (`?zoom=`). Sin zoom se devuelve la resolución más baja, suficiente para
+    encuadrar el mapa.
+    """
+    athlete_id = request.session.get('athlete_id')
+    if not athlete_id:
+        return JsonResponse({'error': 'Not authenticated'}, status=401)
+
+    activity = get_object_or_404(
+        Activity.objects.only('id', 'athlete_id', 'summary_polyline'),
+        id=activity_id,
+        athlete_id=athlete_id,
+    )
+
+    try:
+        zoom = int(request.GET.get('zoom', 0))
+    except ValueError:
+        zoom = 0
+
+    response = JsonResponse(track_payload(activity, resolution_for_zoom(zoom)))
+    response['Cache-Control'] = 'private, max-age=3600'
+    return response
+
+
+
+def nearby_activities_view(request):
+    """
+    Actividades del atleta que empiezan a menos de `radius_km` (por defecto 5)
+    de `lat`/`lng`, ordenadas por distancia, en JSON.
+    """
+    athlete_id = request.session.get('athlete_id')
+    if not athlete_id:
+        return JsonResponse({'error': 'Not authenticated'}, status=401)
+
+    try:
+        lat = float(request.GET['lat'])
+        lng = float(request.GET['lng'])
+        radius_km = float(request.GET.get('radius_km', 5))
+        limit = int(request.GET.get('limit', 50))
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'lat and lng are required numbers'}, status=400)
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180) or not 0 < radius_km <= 500:
+        return JsonResponse({'error': 'Coordinates or radius out of range'}, status=400)
+
+    matches = nearby_activities(athlete_id, lat, lng, radius_km, limit=min(max(limit, 1), 200))
+    return JsonResponse({
+        'activities': [
+            {
+                'id': activity.id,
+                'name': activity.name,
+                'type': activity.type,
+                'start_date_local': activity.start_date_local.isoformat(),
+                'distance_km': round(activity.distance_km(), 2),
+                'start_latlng': activity.start_latlng,
+                'distance_from_point_km': round(distance, 3),
+            }
+            for distance, activity in matches
+        ],
+    })
+
+
+
+def heatmap_view(request):
+    """Mapa de calor de todas las actividades del atleta (teselas pre-renderizadas)."""
+    athlete = request.athlete
+
+    if not athlete:
+        messages.warning(request, "Please log in to see your heatmap.")
+        return redirect('login')
+
+    context = {
+        'athlete': athlete,
+        'heatmap': Heatmap.objects.filter(athlete=athlete).first(),
+        'min_zoom': settings.STRAVA_HEATMAP_MIN_ZOOM,
+        'max_zoom': settings.STRAVA_HEATMAP_MAX_ZOOM,
+    }
+    return render(request, 'heatmap.html', context)
+
+
+def heatmap_tile(request, version, zoom, x, y):
+    """
+    Sirve una tesela PNG del disco tal cual. La versión del mapa forma parte de
+    la URL y solo se sirve la publicada, así que la tesela puede cachearse
+    indefinidamente en el navegador; otra versión es un 404.
+    """
+    athlete_id = request.session.get('athlete_id')
+    if not athlete_id:
+        return HttpResponse(status=401)
+
+    heatmap = Heatmap.objects.filter(athlete_id=athlete_id).only('version', 'rendered_at').first()
+    if heatmap is None or version != heatmap.version:
+        return HttpResponse(status=404)
+
+    path = tile_path(athlete_id, version, zoom, x, y)
+    try:
+        content = path.read_bytes()
+    except (FileNotFoundError, NotADirectoryError):
+        content = EMPTY_TILE
+
+    response = HttpResponse(content, content_type='image/png')
+    if heatmap.rendered_at is None:
+        # Aún no hay ningún renderizado terminado
+        response['Cache-Control'] = 'no-store'
+    else:
+        response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
+
+
+
+# --- Webhook de Strava ---
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def strava_webhook(request):
+    """
+    Endpoint de la suscripción al webhook (ver dashboard/webhooks.py).
+    GET: handshake de validación. POST: un evento, que solo se encola;
+    Strava reintenta si no recibe un 200 en 2 segundos.
+    """
+    if request.method == 'GET':
+        challenge = verify_subscription(request.GET)
+        if challenge is None:
+            return JsonResponse({'error': 'Invalid verify token'}, status=403)
+        return JsonResponse({'hub.challenge': challenge})
+
+    try:
+        event = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    if not isinstance(event, dict):
+        return JsonResponse({'error': 'Invalid event'}, status=400)
+
+    job = enqueue_webhook_event(event)
+    return JsonResponse({'queued': job is not None})
+
+
+def export_activities_view(request):
+    """
+    Descarga del historial completo de actividades en streaming
+    (`?format=csv|ndjson|columnar`, `?fields=id,name,...`; ver dashboard/export.py).
+    """
+    athlete = request.athlete
+    if not athlete:
+        return HttpResponse(status=401)
+
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in FORMATS:
+        return HttpResponse(f"Unknown format: {export_format}", status=400, content_type='text/plain')
+    fields = [field for field in request.GET.get('fields', '').split(',') if field]
+    try:
+        stream = export_activities(athlete, export_format, fields)
+    except ValueError as e:
+        return HttpResponse(str(e), status=400, content_type='text/plain')
+
+    content_type, extension = FORMATS[export_format]
+    response = StreamingHttpResponse(stream, content_type=content_type)
+    filename = f"activities-{athlete.id}-{timezone.now():%Y%m%d}.{extension}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['Cache-Control'] = 'private, no-store'
+    return response
\ No newline at end of file
@@ -0,0 +1,98 @@
+"""
+Ingesta por eventos del webhook de Strava.
+
+Strava avisa con un POST por cada actividad creada, modificada o borrada y
+cuando un atleta retira el acceso a la aplicación. La vista responde al
+momento (Strava exige una respuesta en menos de 2 s) y solo encola un
+`SyncJob` del tipo correspondiente; el worker descarga únicamente esa
+actividad y la aplica con la misma ingesta incremental que la sincronización
+completa, así que cada cambio cuesta una petición a la API.
+"""
+import shutil
+
+import requests
+from django.conf import settings
+
+from .cache import evict_athlete
+from .heatmap import athlete_dir
+from .ingest import bulk_upsert_activities, delete_activities
+from .jobs import enqueue_event
+from .models import Athlete, SyncJob
+from .strava_api import get_client
+
+ACTIVITY_EVENTS = {
+    'create': SyncJob.ACTIVITY,
+    'update': SyncJob.ACTIVITY,
+    'delete': SyncJob.DELETE,
+}
+
+
+def verify_subscription(params):
+    """
+    Handshake al crear la suscripción: devuelve el `hub.challenge` que hay que
+    repetir, o `None` si el `hub.verify_token` no es el nuestro.
+    """
+    token = settings.STRAVA_WEBHOOK_VERIFY_TOKEN
+    if not token or params.get('hub.mode') != 'subscribe' or params.get('hub.verify_token') != token:
+        return None
+    return params.get('hub.challenge')
+
+
+def parse_event(event):
+    """
+    Evento del webhook -> `(kind, athlete_id, activity_id)`, o `None` si no nos
+    interesa (otra suscripción, un cambio del perfil del atleta...).
+    """
+    try:
+        object_type, aspect_type = event['object_type'], event['aspect_type']
+        object_id, owner_id = int(event['object_id']), int(event['owner_id'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    subscription_id = settings.STRAVA_WEBHOOK_SUBSCRIPTION_ID
+    if subscription_id and str(event.get('subscription_id')) != str(subscription_id):
+        return None
+
+    if object_type == 'activity' and aspect_type in ACTIVITY_EVENTS:
+        return ACTIVITY_EVENTS[aspect_type], owner_id, object_id
+
+    # La desautorización llega como `update` del atleta con `authorized: "false"`
+    updates = event.get('updates') or {}
+    if object_type == 'athlete' and aspect_type == 'update' and str(updates.get('authorized')).lower() == 'false':
+        return SyncJob.DEAUTHORIZE, owner_id, None
+    return None
+
+
+def enqueue_webhook_event(event):
+    """Encola el trabajo de un evento. Devuelve el `SyncJob` o `None` si el evento se ignora."""
+    parsed = parse_event(event)
+    if parsed is None:
+        return None
+    kind, athlete_id, activity_id = parsed
+    # Atletas que nunca entraron al dashboard o que ya se desautorizaron
+    if not Athlete.objects.filter(id=athlete_id).exists():
+        return None
+    return enqueue_event(athlete_id, kind, activity_id)[0]
+
+
+def apply_activity(athlete, activity_id):
+    """
+    Descarga una sola actividad y la inserta o actualiza. Si Strava ya no la
+    devuelve (borrada entre el evento y la descarga), se borra también aquí.
+    Devuelve las estadísticas de la ingesta.
+    """
+    try:
+        item = get_client().get_activity(athlete.access_token, activity_id)
+    except requests.exceptions.HTTPError as e:
+        if e.response is None or e.response.status_code != 404:
+            raise
+        return {'deleted': delete_activities(athlete, [activity_id])}
+    return bulk_upsert_activities(athlete, [item])
+
+
+def forget_athlete(athlete):
+    """Desautorización: borra el atleta con todos sus datos (trabajos incluidos) y sus teselas."""
+    athlete_id = athlete.id
+    athlete.delete()
+    evict_athlete(athlete_id)
+    shutil.rmtree(athlete_dir(athlete_id), ignore_errors=True)
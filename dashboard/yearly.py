@@ -0,0 +1,168 @@
+"""
+Comparación interanual: progreso acumulado de cada año por día del año.
+
+`YearlyProgress` guarda por atleta, año y tipo de actividad (y una fila con
+`type` vacío para todos los tipos) un array denso de 366 días por métrica:
+actividades, metros, segundos en movimiento y metros de desnivel. Se guardan
+los totales de cada día, enteros y comprimidos con zlib (~1 KB por año y
+tipo); el acumulado es su `cumsum` al leer, así que "a estas alturas del año
+pasado llevabas X km" es un índice en un array tras una consulta por clave.
+
+La sincronización no reconstruye el año: `patch_yearly_progress` sustituye
+solo los días tocados con los valores nuevos de `DailyRollup`, y el acumulado
+de los días siguientes cambia solo. Los días de todos los años se indexan por
+su día del año en un año bisiesto (el 1 de marzo es siempre el índice 60), así
+que las series de años distintos se superponen fecha a fecha.
+"""
+import zlib
+from collections import defaultdict
+from datetime import date
+
+import numpy as np
+from django.db import transaction
+
+from .models import DailyRollup, YearlyProgress
+
+METRICS = ['count', 'distance', 'moving_time', 'elevation']
+ALL_TYPES = ''
+DAYS = 366
+LEAP_YEAR = 2000
+
+
+def day_index(day):
+    """Posición del día en los arrays (0-365), la misma para una fecha en todos los años."""
+    return date(LEAP_YEAR, day.month, day.day).timetuple().tm_yday - 1
+
+
+def index_date(year, index):
+    """Fecha de la posición `index` en `year` (`None` para el 29 de febrero de un año no bisiesto)."""
+    day = date.fromordinal(date(LEAP_YEAR, 1, 1).toordinal() + index)
+    try:
+        return day.replace(year=year)
+    except ValueError:
+        return None
+
+
+def encode_days(values):
+    return zlib.compress(np.asarray(values, dtype='<i4').tobytes())
+
+
+def decode_days(blob):
+    return np.frombuffer(zlib.decompress(bytes(blob)), dtype='<i4').astype(np.int64)
+
+
+def _empty():
+    return {metric: np.zeros(DAYS, dtype=np.int64) for metric in METRICS}
+
+
+def _daily_values(row):
+    return {metric: int(round(row[metric] or 0)) for metric in METRICS}
+
+
+def _save_year(athlete_id, year, by_type):
+    """Guarda los arrays de un año (`{tipo: {métrica: array}}`) con la fila de todos los tipos."""
+    by_type = {activity_type: arrays for activity_type, arrays in by_type.items()
+               if activity_type != ALL_TYPES and arrays['count'].any()}
+    if by_type:
+        by_type[ALL_TYPES] = {metric: sum(arrays[metric] for arrays in by_type.values()) for metric in METRICS}
+
+    YearlyProgress.objects.filter(athlete_id=athlete_id, year=year).exclude(type__in=by_type).delete()
+    YearlyProgress.objects.bulk_create(
+        [
+            YearlyProgress(
+                athlete_id=athlete_id, year=year, type=activity_type,
+                **{metric: encode_days(arrays[metric]) for metric in METRICS},
+            )
+            for activity_type, arrays in by_type.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['athlete', 'year', 'type'],
+        update_fields=[*METRICS, 'updated_at'],
+    )
+
+
+def patch_yearly_progress(athlete_id, days):
+    """
+    Actualiza los días `days` con los valores actuales de `DailyRollup` (que
+    ya deben estar recalculados). Solo se leen los agregados de esos días y
+    las filas de sus años; un año sin filas guardadas se construye entero.
+    """
+    by_year = defaultdict(set)
+    for day in days:
+        by_year[day.year].add(day)
+
+    with transaction.atomic():
+        for year, year_days in by_year.items():
+            by_type = {
+                row.type: {metric: decode_days(getattr(row, metric)) for metric in METRICS}
+                for row in YearlyProgress.objects.filter(athlete_id=athlete_id, year=year).exclude(type=ALL_TYPES)
+            }
+            indexes = [day_index(day) for day in year_days]
+            for arrays in by_type.values():
+                for values in arrays.values():
+                    values[indexes] = 0
+
+            rollups = DailyRollup.objects.filter(athlete_id=athlete_id)
+            if by_type:
+                rollups = rollups.filter(day__in=year_days)
+            else:
+                # Año aún sin guardar: se lee entero para no dejar fuera los días no tocados
+                rollups = rollups.filter(day__gte=date(year, 1, 1), day__lte=date(year, 12, 31))
+            for row in rollups.values('day', 'type', *METRICS):
+                arrays = by_type.setdefault(row['type'], _empty())
+                for metric, value in _daily_values(row).items():
+                    arrays[metric][day_index(row['day'])] = value
+            _save_year(athlete_id, year, by_type)
+
+
+def rebuild_yearly_progress(athlete_id):
+    """Reconstruye todos los años del atleta desde `DailyRollup`. Devuelve los años guardados."""
+    years = defaultdict(lambda: defaultdict(_empty))
+    rows = DailyRollup.objects.filter(athlete_id=athlete_id).values('day', 'type', *METRICS)
+    for row in rows.iterator(chunk_size=2000):
+        arrays = years[row['day'].year][row['type']]
+        for metric, value in _daily_values(row).items():
+            arrays[metric][day_index(row['day'])] = value
+
+    with transaction.atomic():
+        YearlyProgress.objects.filter(athlete_id=athlete_id).exclude(year__in=years).delete()
+        for year, by_type in years.items():
+            _save_year(athlete_id, year, by_type)
+    return len(years)
+
+
+# --- Lectura ---
+
+def available_years(athlete, activity_type=ALL_TYPES):
+    return list(YearlyProgress.objects.filter(
+        athlete=athlete, type=activity_type
+    ).order_by('-year').values_list('year', flat=True))
+
+
+def cumulative_progress(athlete, years, activity_type=ALL_TYPES):
+    """
+    `{año: {métrica: array acumulado de 366 días}}` de los años pedidos en
+    una sola consulta. Los años sin actividades del tipo no aparecen.
+    """
+    rows = YearlyProgress.objects.filter(athlete=athlete, type=activity_type, year__in=years)
+    return {
+        row.year: {metric: np.cumsum(decode_days(getattr(row, metric))) for metric in METRICS}
+        for row in rows
+    }
+
+
+def same_day_comparison(athlete, day, activity_type=ALL_TYPES):
+    """
+    Acumulado del año de `day` hasta `day` y del año anterior hasta la misma
+    fecha: `{'this_year': {métrica: valor}, 'last_year': {...}}` (`None` si
+    ese año no tiene actividades). Una consulta y un índice por métrica.
+    """
+    progress = cumulative_progress(athlete, [day.year, day.year - 1], activity_type)
+    index = day_index(day)
+
+    def at(year):
+        if year not in progress:
+            return None
+        return {metric: int(progress[year][metric][index]) for metric in METRICS}
+
+    return {'this_year': at(day.year), 'last_year': at(day.year - 1)}
@@ -34,6 +34,28 @@ STRAVA_CLIENT_SECRET = os.getenv('STRAVA_CLIENT_SECRET')
 STRAVA_API_URL = 'https://www.strava.com/api/v3'
 STRAVA_OAUTH_URL = 'https://www.strava.com/oauth'
 
+# Webhook de Strava (dashboard/webhooks.py): el token que se envía al crear la suscripción
+# y el ID de la suscripción, para ignorar eventos de otras (opcional).
+STRAVA_WEBHOOK_VERIFY_TOKEN = os.getenv('STRAVA_WEBHOOK_VERIFY_TOKEN', '')
+STRAVA_WEBHOOK_SUBSCRIPTION_ID = os.getenv('STRAVA_WEBHOOK_SUBSCRIPTION_ID')
+
+# Límites de peticiones de la aplicación (15 minutos, diario). Se ajustan solos con
+# las cabeceras X-RateLimit-* que devuelve Strava.
+STRAVA_RATE_LIMIT_SHORT = int(os.getenv('STRAVA_RATE_LIMIT_SHORT', 100))
+STRAVA_RATE_LIMIT_DAILY = int(os.getenv('STRAVA_RATE_LIMIT_DAILY', 1000))
+STRAVA_API_MAX_RETRIES = 5
+
+# Referencias para las zonas del análisis de streams (dashboard/analysis.py)
+STRAVA_MAX_HEARTRATE = int(os.getenv('STRAVA_MAX_HEARTRATE', 190))
+STRAVA_FTP = int(os.getenv('STRAVA_FTP', 200))
+# Frecuencia cardiaca en reposo para el TRIMP de la carga de entrenamiento (dashboard/training.py)
+STRAVA_RESTING_HEARTRATE = int(os.getenv('STRAVA_RESTING_HEARTRATE', 60))
+
+# Teselas del mapa de calor (dashboard/heatmap.py)
+STRAVA_HEATMAP_DIR = os.getenv('STRAVA_HEATMAP_DIR', str(BASE_DIR / 'heatmaps'))
+STRAVA_HEATMAP_MIN_ZOOM = int(os.getenv('STRAVA_HEATMAP_MIN_ZOOM', 3))
+STRAVA_HEATMAP_MAX_ZOOM = int(os.getenv('STRAVA_HEATMAP_MAX_ZOOM', 14))
+
 # Configuración de sesión para manejar la expiración del token (opcional pero útil)
 SESSION_COOKIE_AGE = 60 * 60 * 24 * 7  # 1 semana (ajustar según el ciclo de refresco del token)
 
@@ -64,6 +86,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'dashboard.middleware.AthleteMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -91,10 +114,71 @@ WSGI_APPLICATION = 'strava_analytics.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+#
+# STRAVA_DB_ENGINE: 'sqlite' (strava.db, desarrollo) o 'postgresql' (producción, requiere `psycopg`).
+# En PostgreSQL las conexiones se reutilizan entre peticiones durante STRAVA_DB_CONN_MAX_AGE segundos
+# (comprobando que siguen vivas antes de usarlas). Django 5.0 no trae pool propio: para compartir
+# conexiones entre procesos se pone PgBouncer delante (modo transacción) con STRAVA_DB_PGBOUNCER=1,
+# que desactiva los cursores de servidor que usan los `.iterator()` de la exportación y la ingesta.
+
+STRAVA_DB_ENGINE = os.getenv('STRAVA_DB_ENGINE', 'sqlite')
+
+_DATABASE_BACKENDS = {
+    'sqlite': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'strava.db',
+    },
+    'postgresql': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.getenv('POSTGRES_DB', 'strava'),
+        'USER': os.getenv('POSTGRES_USER', 'strava'),
+        'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+        'HOST': os.getenv('POSTGRES_HOST', '127.0.0.1'),
+        'PORT': os.getenv('POSTGRES_PORT', '5432'),
+        'CONN_MAX_AGE': int(os.getenv('STRAVA_DB_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv('STRAVA_DB_PGBOUNCER', '') == '1',
+        'OPTIONS': {'connect_timeout': 5},
+    },
+}
+
+DATABASES = {
+    'default': _DATABASE_BACKENDS[STRAVA_DB_ENGINE],
+}
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+#
+# Las vistas del dashboard se cachean por atleta y generación de datos (ver dashboard/cache.py).
+# STRAVA_CACHE_BACKEND: 'locmem' (LRU en memoria del proceso), 'file' o 'redis'.
+
+STRAVA_CACHE_BACKEND = os.getenv('STRAVA_CACHE_BACKEND', 'locmem')
+STRAVA_CACHE_TIMEOUT = int(os.getenv('STRAVA_CACHE_TIMEOUT', 60 * 60))  # TTL en segundos
+STRAVA_CACHE_MAX_ENTRIES = int(os.getenv('STRAVA_CACHE_MAX_ENTRIES', 1000))
+# Segundos que se reutiliza el atleta de la sesión sin consultar la DB (dashboard/middleware.py)
+STRAVA_ATHLETE_CACHE_TIMEOUT = int(os.getenv('STRAVA_ATHLETE_CACHE_TIMEOUT', 30))
+
+_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'strava-dashboard',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('STRAVA_CACHE_DIR', str(BASE_DIR / 'cache')),
+    },
+    'redis': {
+        # Requiere el paquete `redis` y un servidor local (o compatible, p. ej. Valkey/KeyDB)
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_URL', 'redis://127.0.0.1:6379/1'),
+    },
+}
+
+CACHES = {
+    'default': {
+        **_CACHE_BACKENDS[STRAVA_CACHE_BACKEND],
+        'TIMEOUT': STRAVA_CACHE_TIMEOUT,
+        'OPTIONS': {'MAX_ENTRIES': STRAVA_CACHE_MAX_ENTRIES} if STRAVA_CACHE_BACKEND != 'redis' else {},
     }
 }
 